@@ -2,12 +2,13 @@
 {{ config(schema='analytics') }}
 
 WITH daily_events AS (
-  -- Page view metrics
+  -- Page view metrics; event counts are re-weighted for ingest sampling
+  -- (sample_weight = 1 / sample rate, 1 for unsampled events)
   SELECT
     DATE_TRUNC('day', timestamp) AS event_date,
     COUNT(DISTINCT session_id) AS sessions,
-    COUNT(*) AS page_views,
-    COUNT(*) / COUNT(DISTINCT session_id)::numeric AS pages_per_session
+    SUM(sample_weight) AS page_views,
+    SUM(sample_weight) / COUNT(DISTINCT session_id)::numeric AS pages_per_session
   FROM {{ ref('stg_page_views') }}
   GROUP BY DATE_TRUNC('day', timestamp)
 ),
@@ -16,9 +17,9 @@ daily_commerce AS (
   -- E-commerce metrics
   SELECT
     DATE_TRUNC('day', timestamp) AS event_date,
-    COUNT(*) FILTER (WHERE event = 'product_view') AS product_views,
-    COUNT(*) FILTER (WHERE event = 'add_to_cart') AS add_to_cart_events,
-    COUNT(*) FILTER (WHERE event = 'purchase') AS purchase_events,
+    SUM(sample_weight) FILTER (WHERE event = 'product_view') AS product_views,
+    SUM(sample_weight) FILTER (WHERE event = 'add_to_cart') AS add_to_cart_events,
+    SUM(sample_weight) FILTER (WHERE event = 'purchase') AS purchase_events,
     COUNT(DISTINCT session_id) FILTER (WHERE event = 'purchase') AS purchasing_sessions,
     SUM(value) FILTER (WHERE event = 'purchase') AS total_revenue,
     SUM(value) FILTER (WHERE event = 'purchase') / 
@@ -3,6 +3,7 @@
 
 SELECT
   id,
+  event_id,
   type,
   timestamp,
   server_timestamp,
@@ -13,6 +14,7 @@ SELECT
   url,
   path,
   properties,
+  COALESCE(sample_weight, 1) AS sample_weight,
   queue_name,
   processed_timestamp
 FROM {{ source('raw_data', 'page_views') }}
\ No newline at end of file
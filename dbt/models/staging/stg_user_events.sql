@@ -3,6 +3,7 @@
 
 SELECT
   id,
+  event_id,
   type,
   event,
   timestamp,
@@ -12,6 +13,7 @@ SELECT
   client_ip,
   user_agent,
   properties,
+  COALESCE(sample_weight, 1) AS sample_weight,
   queue_name,
   processed_timestamp,
   -- Extract common properties
@@ -17,6 +17,7 @@ CREATE SCHEMA IF NOT EXISTS analytics;
 -- Create fresh raw_data tables matching Spark output
 CREATE TABLE raw_data.page_views (
     id SERIAL PRIMARY KEY,
+    event_id VARCHAR(64),
     type VARCHAR(255),
     timestamp TIMESTAMPTZ,
     server_timestamp TIMESTAMPTZ,
@@ -27,12 +28,14 @@ CREATE TABLE raw_data.page_views (
     url TEXT,
     path TEXT,
     properties JSONB,
+    sample_weight DOUBLE PRECISION DEFAULT 1,
     queue_name VARCHAR(100),
     processed_timestamp TIMESTAMPTZ
 );
 
 CREATE TABLE raw_data.user_events (
     id SERIAL PRIMARY KEY,
+    event_id VARCHAR(64),
     type VARCHAR(255),
     event VARCHAR(255),
     timestamp TIMESTAMPTZ,
@@ -42,12 +45,14 @@ CREATE TABLE raw_data.user_events (
     client_ip VARCHAR(50),
     user_agent TEXT,
     properties JSONB,
+    sample_weight DOUBLE PRECISION DEFAULT 1,
     queue_name VARCHAR(100),
     processed_timestamp TIMESTAMPTZ
 );
 
 CREATE TABLE raw_data.ecommerce_events (
     id SERIAL PRIMARY KEY,
+    event_id VARCHAR(64),
     type VARCHAR(255),
     event VARCHAR(255),
     timestamp TIMESTAMPTZ,
@@ -57,12 +62,14 @@ CREATE TABLE raw_data.ecommerce_events (
     client_ip VARCHAR(50),
     user_agent TEXT,
     properties JSONB,
+    sample_weight DOUBLE PRECISION DEFAULT 1,
     queue_name VARCHAR(100),
     processed_timestamp TIMESTAMPTZ
 );
 
 CREATE TABLE raw_data.analytics_events (
     id SERIAL PRIMARY KEY,
+    event_id VARCHAR(64),
     type VARCHAR(255),
     event VARCHAR(255),
     timestamp TIMESTAMPTZ,
@@ -72,12 +79,14 @@ CREATE TABLE raw_data.analytics_events (
     client_ip VARCHAR(50),
     user_agent TEXT,
     properties JSONB,
+    sample_weight DOUBLE PRECISION DEFAULT 1,
     queue_name VARCHAR(100),
     processed_timestamp TIMESTAMPTZ
 );
 
 CREATE TABLE raw_data.event_queue (
     id SERIAL PRIMARY KEY,
+    event_id VARCHAR(64),
     type VARCHAR(255),
     timestamp TIMESTAMPTZ,
     server_timestamp TIMESTAMPTZ,
@@ -88,6 +97,7 @@ CREATE TABLE raw_data.event_queue (
     url TEXT,
     path TEXT,
     properties JSONB,
+    sample_weight DOUBLE PRECISION DEFAULT 1,
     queue_name VARCHAR(100),
     processed_timestamp TIMESTAMPTZ
 );
@@ -129,7 +129,11 @@ def cleanup_old_files():
             continue
 
         deleted_for_queue = 0
-        for file in queue_dir.rglob("*.json"):
+        # Per-event *.json files from older consumers, *.ndjson segments and
+        # *.parquet files
+        for file in queue_dir.rglob("*"):
+            if file.suffix not in (".json", ".ndjson", ".parquet"):
+                continue
             modified = datetime.fromtimestamp(file.stat().st_mtime)
             if modified < cutoff:
                 file.unlink()
@@ -1,5 +1,6 @@
 from pyspark.sql import SparkSession
-from pyspark.sql.functions import col, lit, to_json, to_timestamp, struct
+from pyspark.sql.types import StructType, StructField, StringType, MapType, DoubleType
+from pyspark.sql.functions import coalesce, col, lit, to_json, to_timestamp
 import os
 import shutil
 from pathlib import Path
@@ -17,17 +18,44 @@ SPARK_MASTER = os.getenv("SPARK_MASTER_URL", "spark://spark-master:7077")
 
 RAW_DIR = Path("/data")
 ARCHIVE_DIR = Path("/data/archive")
+# What the consumer leaves in /data: NDJSON segments or Parquet files
+RAW_FORMAT = os.getenv("RAW_FORMAT", "ndjson")  # ndjson | parquet
+
+# Same event schema as process_logs.py
+BASE_SCHEMA = StructType([
+    StructField("eventId", StringType(), True),
+    StructField("type", StringType(), True),
+    StructField("timestamp", StringType(), True),
+    StructField("server_timestamp", StringType(), True),
+    StructField("sessionId", StringType(), True),
+    StructField("userId", StringType(), True),
+    StructField("client_ip", StringType(), True),
+    StructField("user_agent", StringType(), True),
+    StructField("url", StringType(), True),
+    StructField("path", StringType(), True),
+    StructField("properties", MapType(StringType(), StringType()), True),
+    StructField("sample_weight", DoubleType(), True),
+    StructField("_queue", StringType(), True),
+    StructField("_processed_at", StringType(), True),
+    StructField("_corrupt_record", StringType(), True),
+])
+
+# Parquet files carry the same columns, with properties as a JSON string
+PARQUET_SCHEMA = StructType([
+    StructField(field.name, StringType(), True) if field.name == "properties" else field
+    for field in BASE_SCHEMA.fields if field.name != "_corrupt_record"
+])
 
 # ----------------------------
 # Helper Functions
 # ----------------------------
 
 
-def archive_files(queue_dir: Path):
+def archive_files(queue_dir: Path, files):
     archive_path = ARCHIVE_DIR / queue_dir.name
     archive_path.mkdir(parents=True, exist_ok=True)
 
-    for file in queue_dir.glob("**/*.json"):
+    for file in files:
         relative = file.relative_to(queue_dir)
         dest = archive_path / relative
         dest.parent.mkdir(parents=True, exist_ok=True)
@@ -37,15 +65,33 @@ def archive_files(queue_dir: Path):
 def process_page_views(spark):
     queue_name = "page_views"
     queue_dir = RAW_DIR / queue_name / "page_view"
-    json_path = str(queue_dir / "*.json")
 
     if not queue_dir.exists():
         print(f"[!] Directory {queue_dir} does not exist.")
         return 0
 
-    df = spark.read \
-        .option("mode", "PERMISSIVE") \
-        .json(json_path)
+    # Finished consumer output only; open segments and Parquet files being
+    # written are hidden until renamed
+    if RAW_FORMAT == "parquet":
+        files = sorted(queue_dir.glob("date=*/hour=*/*.parquet"))
+    else:
+        files = sorted(queue_dir.glob("*.ndjson"))
+    if not files:
+        print(f"[!] No {RAW_FORMAT} files in {queue_dir}.")
+        return 0
+
+    if RAW_FORMAT == "parquet":
+        df = spark.read \
+            .schema(PARQUET_SCHEMA) \
+            .parquet(*[str(file) for file in files])
+    else:
+        df = spark.read \
+            .option("mode", "PERMISSIVE") \
+            .option("columnNameOfCorruptRecord", "_corrupt_record") \
+            .schema(BASE_SCHEMA) \
+            .json([str(file) for file in files])
+        df = df.filter(col("_corrupt_record").isNull()).drop("_corrupt_record")
+        df = df.withColumn("properties", to_json(col("properties")))
 
     print("[DEBUG] Schema:")
     df.printSchema()
@@ -57,18 +103,22 @@ def process_page_views(spark):
         print(f"[!] No data found in {queue_dir}.")
         return 0
 
-    # Fill in missing fields for raw_data.page_views schema
-    df_transformed = df \
-        .withColumn("session_id", col("sessionId")) \
-        .withColumn("queue_name", col("_queue")) \
-        .withColumn("processed_timestamp", to_timestamp(col("_processed_at"))) \
-        .withColumn("timestamp", to_timestamp(col("timestamp"))) \
-        .withColumn("server_timestamp", lit(None).cast("timestamp")) \
-        .withColumn("user_id", lit(None).cast("string")) \
-        .withColumn("client_ip", lit(None).cast("string")) \
-        .withColumn("user_agent", lit(None).cast("string")) \
-        .withColumn("properties", to_json(struct())) \
-        .drop("sessionId", "_queue", "_processed_at")
+    # Columns of raw_data.page_views
+    df_transformed = df.select(
+        col("eventId").alias("event_id"),
+        col("type"),
+        to_timestamp(col("timestamp")).alias("timestamp"),
+        to_timestamp(col("server_timestamp")).alias("server_timestamp"),
+        col("sessionId").alias("session_id"),
+        col("userId").alias("user_id"),
+        col("client_ip"),
+        col("user_agent"),
+        col("url"),
+        col("path"),
+        col("properties"),
+        coalesce(col("sample_weight"), lit(1.0)).alias("sample_weight"),
+        coalesce(col("_queue"), lit(queue_name)).alias("queue_name"),
+        to_timestamp(col("_processed_at")).alias("processed_timestamp"))
 
     df_transformed.write \
         .format("jdbc") \
@@ -77,13 +127,14 @@ def process_page_views(spark):
         .option("user", POSTGRES_USER) \
         .option("password", POSTGRES_PASSWORD) \
         .option("driver", "org.postgresql.Driver") \
+        .option("stringtype", "unspecified") \
         .mode("append") \
         .save()
 
     row_count = df_transformed.count()
     print(f"[\u2713] Inserted {row_count} rows into raw_data.page_views.")
 
-    archive_files(queue_dir)
+    archive_files(queue_dir, files)
     return row_count
 
 # ----------------------------
@@ -1,6 +1,6 @@
 from pyspark.sql import SparkSession
-from pyspark.sql.types import StructType, StructField, StringType, MapType
-from pyspark.sql.functions import col, to_timestamp, lit, current_timestamp, to_json
+from pyspark.sql.types import StructType, StructField, StringType, MapType, DoubleType
+from pyspark.sql.functions import col, to_timestamp, lit, current_timestamp, to_json, coalesce
 import os
 import shutil
 from pathlib import Path
@@ -20,9 +20,12 @@ POSTGRES_JDBC_VERSION = os.getenv("POSTGRES_JDBC_VERSION", "42.7.2")
 RAW_DIR = Path("/data")
 ARCHIVE_DIR = Path("/data/archive")
 SPARK_MASTER = os.getenv("SPARK_MASTER_URL", "spark://spark-master:7077")
+# What the consumer leaves in /data: NDJSON segments or Parquet files
+RAW_FORMAT = os.getenv("RAW_FORMAT", "ndjson")  # ndjson | parquet
 
 # Schema
 BASE_SCHEMA = StructType([
+    StructField("eventId", StringType(), True),
     StructField("type", StringType(), True),
     StructField("timestamp", StringType(), True),
     StructField("server_timestamp", StringType(), True),
@@ -33,16 +36,32 @@ BASE_SCHEMA = StructType([
     StructField("url", StringType(), True),
     StructField("path", StringType(), True),
     StructField("properties", MapType(StringType(), StringType()), True),
+    StructField("sample_weight", DoubleType(), True),
     StructField("_queue", StringType(), True),
     StructField("_processed_at", StringType(), True),
     StructField("_corrupt_record", StringType(), True),
 ])
 
+# Parquet files carry the same columns, with properties as a JSON string
+PARQUET_SCHEMA = StructType([
+    StructField(field.name, StringType(), True) if field.name == "properties" else field
+    for field in BASE_SCHEMA.fields if field.name != "_corrupt_record"
+])
+
+
+def raw_files(queue_dir: Path):
+    # The consumer writes to hidden files and renames them when they are
+    # complete, so only finished files match
+    if RAW_FORMAT == "parquet":
+        # <event_type>/date=<d>/hour=<h>/<segment>.parquet
+        return sorted(queue_dir.glob("*/date=*/hour=*/*.parquet"))
+    return sorted(queue_dir.glob("*/*.ndjson"))
 
-def archive_files(queue_dir: Path):
+
+def archive_files(queue_dir: Path, files):
     archive_path = ARCHIVE_DIR / queue_dir.name
     archive_path.mkdir(parents=True, exist_ok=True)
-    for file in queue_dir.glob("**/*.json"):
+    for file in files:
         relative = file.relative_to(queue_dir)
         dest = archive_path / relative
         dest.parent.mkdir(parents=True, exist_ok=True)
@@ -51,21 +70,33 @@ def archive_files(queue_dir: Path):
 
 def process_queue_data(spark, queue_name):
     queue_dir = RAW_DIR / queue_name
-    json_path = str(queue_dir / "**/*.json")
 
     if not queue_dir.exists():
         print(f"[!] No directory for queue: {queue_name}")
         return 0
 
-    df = spark.read \
-        .option("mode", "PERMISSIVE") \
-        .option("columnNameOfCorruptRecord", "_corrupt_record") \
-        .schema(BASE_SCHEMA) \
-        .json(json_path)
+    # Read and later archive exactly this listing; files finished meanwhile
+    # wait for the next run
+    files = raw_files(queue_dir)
+    if not files:
+        print(f"[!] No {RAW_FORMAT} files for queue: {queue_name}")
+        return 0
 
-    df = df.filter(col("_corrupt_record").isNull())
-    if "_corrupt_record" in df.columns:
-        df = df.drop("_corrupt_record")
+    if RAW_FORMAT == "parquet":
+        df = spark.read \
+            .schema(PARQUET_SCHEMA) \
+            .parquet(*[str(file) for file in files])
+    else:
+        df = spark.read \
+            .option("mode", "PERMISSIVE") \
+            .option("columnNameOfCorruptRecord", "_corrupt_record") \
+            .schema(BASE_SCHEMA) \
+            .json([str(file) for file in files])
+
+        df = df.filter(col("_corrupt_record").isNull())
+        if "_corrupt_record" in df.columns:
+            df = df.drop("_corrupt_record")
+        df = df.withColumn("properties", to_json(col("properties")))
 
     print("[DEBUG] Schema:")
     df.printSchema()
@@ -80,7 +111,8 @@ def process_queue_data(spark, queue_name):
         .withColumn("timestamp", to_timestamp(col("timestamp"))) \
         .withColumn("server_timestamp", to_timestamp(col("server_timestamp"))) \
         .withColumn("queue_name", lit(queue_name)) \
-        .withColumn("properties", to_json(col("properties"))) \
+        .withColumn("sample_weight", coalesce(col("sample_weight"), lit(1.0))) \
+        .withColumn("event_id", col("eventId")).drop("eventId") \
         .withColumn("session_id", col("sessionId")).drop("sessionId") \
         .withColumn("user_id", col("userId")).drop("userId")
 
@@ -99,7 +131,7 @@ def process_queue_data(spark, queue_name):
           .save()
 
         print(f"[✓] Inserted {count} records to {table_name}")
-        archive_files(queue_dir)
+        archive_files(queue_dir, files)
 
     return count
 
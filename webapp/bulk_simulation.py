@@ -0,0 +1,243 @@
+import os
+import time
+import uuid
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+from event_codec import dumps
+
+# Bulk simulation configuration
+SIMULATE_MAX_SESSIONS = int(os.getenv("SIMULATE_MAX_SESSIONS", 1000000))
+SIMULATE_CHUNK_SESSIONS = int(os.getenv("SIMULATE_CHUNK_SESSIONS", 2000))
+SIMULATE_SPAN_SECONDS = float(
+    os.getenv("SIMULATE_SPAN_SECONDS", 3600))  # window session starts fall in
+
+# Median think time before each kind of event, in seconds; gaps are
+# log-normal around these, so most are short with a long tail
+GAP_MEDIANS = {
+    "category_view": 6.0,
+    "product_view": 12.0,
+    "add_to_cart": 20.0,
+    "begin_checkout": 35.0,
+    "outcome": 25.0,
+}
+GAP_SIGMA = 0.8
+
+# Same behaviour as the single-session /simulate
+BROWSE_STEPS = (2, 6)
+ADD_TO_CART_RATE = 0.7
+PURCHASE_RATE = 0.8
+QUANTITY = (1, 3)
+CHECKOUT_ERRORS = ["Payment Declined",
+                   "Shipping Address Invalid", "Item Out of Stock"]
+
+
+def _timestamps(seconds: np.ndarray) -> List[str]:
+    """Epoch seconds to the isoformat() strings the rest of the pipeline uses"""
+    micros = np.round(seconds * 1e6).astype("datetime64[us]")
+    return [s + "+00:00" for s in np.datetime_as_string(micros, unit="us")]
+
+
+def _uuids(rng: np.random.Generator, n: int) -> List[str]:
+    """Random version 4 UUIDs drawn from rng"""
+    raw = rng.bytes(16 * n)
+    return [str(uuid.UUID(bytes=raw[i:i + 16], version=4))
+            for i in range(0, 16 * n, 16)]
+
+
+class BulkSessionSimulator:
+    """Generates many simulated sessions at once.
+
+    Every random choice for a chunk of sessions (browse steps, categories,
+    products, cart additions, quantities and checkout outcomes) is drawn as
+    a NumPy array, and timestamps are accumulated from log-normal gaps, so
+    Python only runs to assemble the event dicts. Products are sampled from
+    the whole columnar catalog rather than the storefront.
+    """
+
+    def __init__(self, store, base_url: str, seed: Optional[int] = None):
+        self.store = store
+        self.base_url = base_url
+        self.rng = np.random.default_rng(seed)
+
+        # Categories with products, and their rows back to back
+        self._categories = [c for c, rows in enumerate(store.category_rows)
+                            if len(rows)]
+        self._rows = np.concatenate(
+            [store.category_rows[c] for c in self._categories])
+        sizes = np.array([len(store.category_rows[c])
+                         for c in self._categories])
+        self._sizes = sizes
+        self._offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+
+    def _gaps(self, kind: str, n: int) -> np.ndarray:
+        return self.rng.lognormal(np.log(GAP_MEDIANS[kind]), GAP_SIGMA, n)
+
+    def chunk(self, sessions: int, start_time: float) -> List[Dict[str, Any]]:
+        """Events for `sessions` sessions, grouped by session and in time order"""
+        rng = self.rng
+        store = self.store
+
+        # Per session
+        session_ids = _uuids(rng, sessions)
+        starts = start_time - rng.uniform(0, SIMULATE_SPAN_SECONDS, sessions)
+        steps = rng.integers(BROWSE_STEPS[0], BROWSE_STEPS[1] + 1, sessions)
+
+        # Per browse step
+        total = int(steps.sum())
+        step_session = np.repeat(np.arange(sessions), steps)
+        category = rng.integers(0, len(self._categories), total)
+        rows = self._rows[self._offsets[category] +
+                          rng.integers(0, self._sizes[category])]
+        added = rng.random(total) < ADD_TO_CART_RATE
+        quantity = rng.integers(QUANTITY[0], QUANTITY[1] + 1, total)
+        price = np.round(store.price[rows].astype(np.float64), 2)
+
+        # Step timing: each step starts where the previous one ended
+        category_gap = self._gaps("category_view", total)
+        product_gap = self._gaps("product_view", total)
+        cart_gap = np.where(added, self._gaps("add_to_cart", total), 0.0)
+        duration = category_gap + product_gap + cart_gap
+        ends = np.cumsum(duration)
+        first_step = np.cumsum(steps) - steps
+        before = np.concatenate([[0.0], ends])[first_step]
+        elapsed = ends - before[step_session]
+        category_time = starts[step_session] + \
+            elapsed - duration + category_gap
+        product_time = category_time + product_gap
+        cart_time = product_time + cart_gap
+
+        # Checkout, for sessions that added anything
+        items = np.bincount(step_session, weights=added, minlength=sessions)
+        totals = np.round(np.bincount(
+            step_session, weights=price * quantity * added, minlength=sessions), 2)
+        purchased = rng.random(sessions) < PURCHASE_RATE
+        errors = rng.integers(0, len(CHECKOUT_ERRORS), sessions)
+        browse_end = starts + np.bincount(
+            step_session, weights=duration, minlength=sessions)
+        checkout_time = browse_end + self._gaps("begin_checkout", sessions)
+        outcome_time = checkout_time + self._gaps("outcome", sessions)
+
+        # Convert once to Python objects for the assembly loop
+        start_ts = _timestamps(starts)
+        category_ts = _timestamps(category_time)
+        product_ts = _timestamps(product_time)
+        cart_ts = _timestamps(cart_time)
+        checkout_ts = _timestamps(checkout_time)
+        outcome_ts = _timestamps(outcome_time)
+        category_names = [store.category_names[self._categories[c]]
+                          for c in category.tolist()]
+        rows = rows.tolist()
+        names = [store.names[code] for code in store.name[rows].tolist()]
+        brands = [store.brands[code] for code in store.brand[rows].tolist()]
+        price = price.tolist()
+        added = added.tolist()
+        quantity = quantity.tolist()
+        steps = steps.tolist()
+
+        url = f"{self.base_url}/"
+        events = []
+        offset = 0
+        for s in range(sessions):
+            session_id = session_ids[s]
+            events.append({
+                "type": "page_view",
+                "url": url,
+                "path": "/",
+                "title": "GadgetGrove Shop",
+                "timestamp": start_ts[s],
+                "sessionId": session_id
+            })
+
+            cart = []
+            for step in range(offset, offset + steps[s]):
+                product = {
+                    "product_id": store.product_id(rows[step]),
+                    "name": names[step],
+                    "brand": brands[step],
+                    "category": category_names[step],
+                    "price": price[step]
+                }
+                events.append({
+                    "type": "custom_event",
+                    "event": "category_view",
+                    "properties": {"category": category_names[step]},
+                    "timestamp": category_ts[step],
+                    "sessionId": session_id
+                })
+                events.append({
+                    "type": "custom_event",
+                    "event": "product_view",
+                    "properties": product,
+                    "timestamp": product_ts[step],
+                    "sessionId": session_id
+                })
+                if added[step]:
+                    cart.append((product, quantity[step]))
+                    events.append({
+                        "type": "custom_event",
+                        "event": "add_to_cart",
+                        "properties": {
+                            **product,
+                            "quantity": quantity[step],
+                            "value": price[step] * quantity[step]
+                        },
+                        "timestamp": cart_ts[step],
+                        "sessionId": session_id
+                    })
+            offset += steps[s]
+
+            if not cart:
+                continue
+
+            total_value = float(totals[s])
+            events.append({
+                "type": "custom_event",
+                "event": "begin_checkout",
+                "properties": {
+                    "value": total_value,
+                    "items_count": int(items[s])
+                },
+                "timestamp": checkout_ts[s],
+                "sessionId": session_id
+            })
+            if purchased[s]:
+                events.append({
+                    "type": "custom_event",
+                    "event": "purchase",
+                    "properties": {
+                        "transaction_id": _uuids(rng, 1)[0],
+                        "value": total_value,
+                        "items": [{"id": p["product_id"], "name": p["name"], "quantity": q}
+                                  for p, q in cart]
+                    },
+                    "timestamp": outcome_ts[s],
+                    "sessionId": session_id
+                })
+            else:
+                events.append({
+                    "type": "custom_event",
+                    "event": "checkout_error",
+                    "properties": {
+                        "reason": CHECKOUT_ERRORS[errors[s]],
+                        "value": total_value
+                    },
+                    "timestamp": outcome_ts[s],
+                    "sessionId": session_id
+                })
+
+        # IDs the consumer deduplicates redeliveries on
+        for event, event_id in zip(events, _uuids(rng, len(events))):
+            event["eventId"] = event_id
+        return events
+
+    def chunks(self, sessions: int,
+               chunk_sessions: int = SIMULATE_CHUNK_SESSIONS) -> Iterator[List[Dict[str, Any]]]:
+        """Yield the events for `sessions` sessions a chunk at a time"""
+        start_time = time.time()
+        for first in range(0, sessions, chunk_sessions):
+            yield self.chunk(min(chunk_sessions, sessions - first), start_time)
+
+
+def to_ndjson(events: List[Dict[str, Any]]) -> bytes:
+    return b"".join(dumps(event) + b"\n" for event in events)
@@ -0,0 +1,377 @@
+import hashlib
+import json
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from search_index import SearchIndex
+
+
+def encode_json(content: Any) -> bytes:
+    """Encode content the same way FastAPI's JSONResponse does"""
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":")
+    ).encode("utf-8")
+
+
+# --- Columnar catalog store ---
+
+# Optional per-category attributes, in the order they appear in "features"
+FEATURE_FIELDS = [
+    ("storage", "storage"),
+    ("memory", "memory"),
+    ("processors", "processor"),
+    ("types", "type"),
+]
+NAME_MODELS = ["Pro", "Plus", "Max", "Ultra", "SE", "Lite", ""]
+NAME_YEARS = list(range(2020, 2025))
+SORT_FIELDS = ("price", "rating", "name")
+
+# Row numbers are scrambled into 32-bit product ids with an invertible
+# multiply/xor, so ids look random but are unique and need no lookup table
+_ID_MULTIPLIER = 0x9E3779B1
+_ID_INVERSE = pow(_ID_MULTIPLIER, -1, 1 << 32)
+_ID_MASK = 0xFFFFFFFF
+
+
+def _vocabulary(categories, key):
+    values = []
+    for cat_data in categories.values():
+        for value in cat_data.get(key, []):
+            if value not in values:
+                values.append(value)
+    return values
+
+
+def _postings(codes, size):
+    """Split row numbers by code: postings[c] holds the rows whose code is c"""
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(size + 1))
+    return [order[bounds[c]:bounds[c + 1]] for c in range(size)]
+
+
+class ColumnarCatalog:
+    """Array-backed product catalog.
+
+    Every product attribute is a NumPy column of codes or numbers, with
+    string vocabularies on the side, so a million SKUs cost tens of
+    megabytes. Sort orders and per-field row postings are built once at
+    generation time and queries combine them with array operations.
+    Product dicts are only materialized for the rows actually returned.
+    """
+
+    def __init__(self, categories: Dict[str, Dict[str, Any]], columns: Dict[str, Any],
+                 names: List[str], id_salt: int):
+        self.category_names = list(categories)
+        self.brands = _vocabulary(categories, "brands")
+        self.colors = _vocabulary(categories, "colors")
+        self.sizes = _vocabulary(categories, "sizes")
+        self.feature_vocabularies = {
+            field: _vocabulary(categories, key) for key, field in FEATURE_FIELDS}
+        self.category_specs = [categories[c].get("specs", [])
+                               for c in self.category_names]
+        self.names = names
+        self._id_salt = id_salt
+
+        self.category = columns["category"]
+        self.brand = columns["brand"]
+        self.color = columns["color"]
+        self.name = columns["name"]
+        self.price = columns["price"]
+        self.rating = columns["rating"]  # tenths of a star
+        self.in_stock = columns["in_stock"]
+        self.features = columns["features"]
+        self.specs = columns["specs"]  # bitmask over the category's specs
+        self.size = columns["size"]
+
+        # Per-field indexes
+        self._category_codes = {c: i for i, c in enumerate(self.category_names)}
+        self._brand_codes = {b: i for i, b in enumerate(self.brands)}
+        self.category_rows = _postings(self.category, len(self.category_names))
+        self.brand_rows = _postings(self.brand, len(self.brands))
+
+        # Precomputed sort orders, plus sorted values for range lookups
+        name_rank = np.empty(len(names), dtype=np.int32)
+        name_rank[np.argsort(np.array(names, dtype=object))] = np.arange(
+            len(names), dtype=np.int32)
+        self.sort_orders = {
+            "price": np.argsort(self.price, kind="stable"),
+            "rating": np.argsort(self.rating, kind="stable"),
+            "name": np.argsort(name_rank[self.name], kind="stable"),
+        }
+        self._sorted_price = self.price[self.sort_orders["price"]]
+        self._sorted_rating = self.rating[self.sort_orders["rating"]]
+
+    def __len__(self) -> int:
+        return len(self.price)
+
+    @classmethod
+    def generate(cls, categories: Dict[str, Dict[str, Any]],
+                 per_category: Optional[int] = None, seed: Optional[int] = None):
+        """Generate a catalog from the CATEGORIES definitions.
+
+        With per_category unset each category gets 3-5 products, like the
+        original demo catalog. The same seed always yields the same catalog.
+        """
+        rng = np.random.default_rng(seed)
+        category_names = list(categories)
+        brands = _vocabulary(categories, "brands")
+        colors = _vocabulary(categories, "colors")
+        sizes = _vocabulary(categories, "sizes")
+        feature_vocabularies = {
+            field: _vocabulary(categories, key) for key, field in FEATURE_FIELDS}
+
+        parts = []
+        names = []
+        for code, category in enumerate(category_names):
+            cat_data = categories[category]
+            n = per_category if per_category else int(rng.integers(3, 6))
+
+            def pick(values, vocabulary):
+                lookup = np.array([vocabulary.index(v) for v in values],
+                                  dtype=np.int16)
+                return lookup[rng.integers(0, len(values), n)]
+
+            def missing():
+                return np.full(n, -1, dtype=np.int16)
+
+            # Names are brand + prefix + suffix; every combination gets an
+            # entry in the shared name vocabulary and rows store its index
+            cat_brands = cat_data["brands"]
+            prefixes = cat_data["name_prefixes"]
+            extras = cat_data.get("specs") or cat_data.get("types") or []
+            suffixes = ([f" {e}" for e in extras]
+                        + [f" ({y})" for y in NAME_YEARS]
+                        + [f" {m}" if m else "" for m in NAME_MODELS])
+            name_offset = len(names)
+            for b in cat_brands:
+                for p in prefixes:
+                    names.extend(f"{b} {p}{s}" for s in suffixes)
+
+            brand_local = rng.integers(0, len(cat_brands), n)
+            prefix_local = rng.integers(0, len(prefixes), n)
+            use_extra = (rng.random(n) > 0.7) & bool(extras)
+            use_year = rng.random(n) > 0.5
+            suffix_local = np.where(
+                use_extra,
+                rng.integers(0, max(len(extras), 1), n),
+                np.where(use_year,
+                         len(extras) + rng.integers(0, len(NAME_YEARS), n),
+                         len(extras) + len(NAME_YEARS) + rng.integers(0, len(NAME_MODELS), n)))
+            name_code = name_offset + (
+                (brand_local * len(prefixes) + prefix_local) * len(suffixes) + suffix_local)
+
+            brand_lookup = np.array([brands.index(b) for b in cat_brands],
+                                    dtype=np.int16)
+
+            price_min, price_max = cat_data["price_range"]
+            # Realistic price points ending in 9s
+            price = np.round(rng.uniform(price_min, price_max, n) / 10) * 10 - 0.01
+
+            features = {}
+            for key, field in FEATURE_FIELDS:
+                features[field] = (pick(cat_data[key], feature_vocabularies[field])
+                                   if key in cat_data else missing())
+
+            specs = np.zeros(n, dtype=np.uint8)
+            cat_specs = cat_data.get("specs", [])
+            if cat_specs:
+                # 1-3 distinct specs per product
+                k = len(cat_specs)
+                counts = rng.integers(1, min(3, k) + 1, n)
+                ranks = rng.random((n, k)).argsort(axis=1).argsort(axis=1)
+                chosen = ranks < counts[:, None]
+                specs = (chosen * (1 << np.arange(k))).sum(axis=1).astype(np.uint8)
+
+            parts.append({
+                "category": np.full(n, code, dtype=np.int8),
+                "brand": brand_lookup[brand_local],
+                "color": pick(cat_data["colors"], colors),
+                "name": name_code.astype(np.int32),
+                "price": price,
+                "rating": np.round(rng.uniform(3.5, 5.0, n) * 10).astype(np.int8),
+                "in_stock": rng.random(n) > 0.1,
+                "features": features,
+                "specs": specs,
+                "size": pick(cat_data["sizes"], sizes) if "sizes" in cat_data else missing(),
+            })
+
+        columns = {
+            key: np.concatenate([part[key] for part in parts])
+            for key in parts[0] if key != "features"
+        }
+        columns["features"] = {
+            field: np.concatenate([part["features"][field] for part in parts])
+            for field in feature_vocabularies
+        }
+        return cls(categories, columns, names, int(rng.integers(0, 1 << 32)))
+
+    # --- Product ids ---
+
+    def product_id(self, row: int) -> str:
+        prefix = self.category_names[self.category[row]][:2].upper()
+        scrambled = ((row * _ID_MULTIPLIER) & _ID_MASK) ^ self._id_salt
+        return f"{prefix}-{scrambled:08x}"
+
+    def row_for_id(self, product_id: str) -> Optional[int]:
+        """Map a product id back to its row, or None if it is not ours"""
+        try:
+            prefix, scrambled = product_id.split("-", 1)
+            row = ((int(scrambled, 16) ^ self._id_salt) * _ID_INVERSE) & _ID_MASK
+        except (AttributeError, ValueError):
+            return None
+        if row >= len(self) or self.product_id(row) != product_id:
+            return None
+        return row
+
+    # --- Materialization ---
+
+    def product(self, row: int) -> Dict[str, Any]:
+        """Build the product dict for one row"""
+        category = int(self.category[row])
+        features = {}
+        for field, vocabulary in self.feature_vocabularies.items():
+            code = self.features[field][row]
+            if code >= 0:
+                features[field] = vocabulary[code]
+        cat_specs = self.category_specs[category]
+        if cat_specs:
+            mask = int(self.specs[row])
+            features["specs"] = [s for i, s in enumerate(cat_specs)
+                                 if mask & (1 << i)]
+        if self.size[row] >= 0:
+            features["size"] = self.sizes[self.size[row]]
+
+        return {
+            "id": self.product_id(row),
+            "name": self.names[self.name[row]],
+            "price": round(float(self.price[row]), 2),
+            "category": self.category_names[category],
+            "brand": self.brands[self.brand[row]],
+            "color": self.colors[self.color[row]],
+            "features": features,
+            "rating": int(self.rating[row]) / 10,
+            "in_stock": bool(self.in_stock[row])
+        }
+
+    def products(self, rows) -> List[Dict[str, Any]]:
+        return [self.product(int(row)) for row in rows]
+
+    def storefront(self, per_category: int) -> List[Dict[str, Any]]:
+        """Products shown in the shop UI: the top rated per category"""
+        rows = []
+        for category_rows in self.category_rows:
+            if len(category_rows) > per_category:
+                best = np.argsort(-self.rating[category_rows],
+                                  kind="stable")[:per_category]
+                category_rows = np.sort(category_rows[best])
+            rows.append(category_rows)
+        return self.products(np.concatenate(rows))
+
+    # --- Queries ---
+
+    def _range_rows(self, field: str, low, high):
+        sorted_values = self._sorted_price if field == "price" else self._sorted_rating
+        start = 0 if low is None else np.searchsorted(sorted_values, low, side="left")
+        end = len(sorted_values) if high is None else np.searchsorted(
+            sorted_values, high, side="right")
+        return self.sort_orders[field][start:end]
+
+    def query(self, category: Optional[str] = None, brand: Optional[str] = None,
+              min_price: Optional[float] = None, max_price: Optional[float] = None,
+              min_rating: Optional[float] = None, in_stock: Optional[bool] = None,
+              sort: Optional[str] = None, descending: bool = False,
+              offset: int = 0, limit: int = 50):
+        """Filter, sort and page the catalog.
+
+        Returns (total_matches, rows_for_page). Filters are combined as a
+        boolean mask built from the postings and range lookups, then applied
+        to a precomputed sort order.
+        """
+        mask = None
+
+        def restrict(rows):
+            nonlocal mask
+            row_mask = np.zeros(len(self), dtype=bool)
+            row_mask[rows] = True
+            mask = row_mask if mask is None else mask & row_mask
+
+        if category is not None:
+            code = self._category_codes.get(category)
+            restrict(self.category_rows[code] if code is not None else [])
+        if brand is not None:
+            code = self._brand_codes.get(brand)
+            restrict(self.brand_rows[code] if code is not None else [])
+        if min_price is not None or max_price is not None:
+            restrict(self._range_rows("price", min_price, max_price))
+        if min_rating is not None:
+            restrict(self._range_rows(
+                "rating", int(np.ceil(min_rating * 10 - 1e-9)), None))
+        if in_stock is not None:
+            stock_mask = self.in_stock if in_stock else ~self.in_stock
+            mask = stock_mask if mask is None else mask & stock_mask
+
+        if sort is None:
+            order = np.arange(len(self))
+        else:
+            order = self.sort_orders[sort]
+        if descending:
+            order = order[::-1]
+
+        matches = order if mask is None else order[mask[order]]
+        return len(matches), matches[offset:offset + limit]
+
+
+# --- Pre-serialized snapshots ---
+
+
+class CatalogSnapshot:
+    """Immutable, pre-serialized view of one catalog version.
+
+    Pairs the columnar store and its search index with the storefront
+    products grouped by category and the encoded /api/products response
+    bodies, so the default read path only hands out bytes. Snapshots are never mutated;
+    a reload builds a new one and swaps the reference.
+    """
+
+    def __init__(self, store: ColumnarCatalog, version: int, storefront_per_category: int):
+        self.version = version
+        self.store = store
+        self.search_index = SearchIndex(store)
+        # The shop UI and the unfiltered API serve the storefront products
+        self.products = products = store.storefront(storefront_per_category)
+
+        self.by_category: Dict[str, List[Dict[str, Any]]] = {}
+        for product in products:
+            self.by_category.setdefault(product["category"], []).append(product)
+
+        self.body = encode_json({"products": products})
+        self.category_bodies = {
+            category: encode_json({"products": category_products})
+            for category, category_products in self.by_category.items()
+        }
+        self._empty_body = encode_json({"products": []})
+
+        # Version plus a content digest, so ETags stay valid across
+        # restarts and agree between workers serving the same catalog
+        digest = hashlib.blake2b(self.body, digest_size=8).hexdigest()
+        self.etag = f'"{version}-{digest}"'
+
+    def body_for(self, category: Optional[str] = None) -> bytes:
+        if not category:
+            return self.body
+        return self.category_bodies.get(category, self._empty_body)
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """Check an If-None-Match header against this snapshot's ETag"""
+        if not if_none_match:
+            return False
+        for tag in if_none_match.split(","):
+            tag = tag.strip()
+            if tag == "*" or tag.removeprefix("W/") == self.etag:
+                return True
+        return False
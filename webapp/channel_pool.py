@@ -0,0 +1,238 @@
+import asyncio
+import json
+import os
+import time
+import zlib
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+import aio_pika
+
+# Channel pool configuration
+RABBITMQ_CHANNEL_POOL_SIZE = int(os.getenv("RABBITMQ_CHANNEL_POOL_SIZE", 8))
+RABBITMQ_CHANNEL_HEALTH_INTERVAL = float(
+    os.getenv("RABBITMQ_CHANNEL_HEALTH_INTERVAL", 10))  # seconds
+
+
+class _Slot:
+    """One pooled channel and its lease state"""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.channel = None
+        self.busy = False
+        self.leases = 0
+
+
+class ChannelPool:
+    """Fixed set of AMQP channels leased out one caller at a time.
+
+    Publishes on a single channel serialize on its frame stream, so
+    concurrent publishers each get their own channel. A queue name maps to a
+    home channel, which spreads queues across the pool and keeps a queue's
+    publishes on one channel under light load; when the home channel is
+    busy any idle channel is used instead, and only when all are busy does
+    the caller wait, for whichever channel frees up first. Channels found closed (a failed passive
+    declare, a broker-side error) are reopened on lease, by a periodic health
+    check, and after connect_robust restores the connection.
+    """
+
+    def __init__(self, connection, size: int = RABBITMQ_CHANNEL_POOL_SIZE,
+                 health_interval: float = RABBITMQ_CHANNEL_HEALTH_INTERVAL):
+        self.connection = connection
+        self.size = max(1, size)
+        self.health_interval = health_interval
+        self._slots = [_Slot(i) for i in range(self.size)]
+        self._free = asyncio.Semaphore(self.size)
+        self._health_task = None
+
+        self._leases = 0
+        self._affinity_hits = 0
+        self._waits = 0
+        self._reopened = 0
+        self._reconnects = 0
+        self._errors = 0
+
+    async def start(self):
+        """Open every channel and start the health check"""
+        await asyncio.gather(*(self._open(slot) for slot in self._slots))
+        reconnect_callbacks = getattr(self.connection, "reconnect_callbacks", None)
+        if reconnect_callbacks is not None:
+            reconnect_callbacks.add(self._on_reconnect)
+        self._health_task = asyncio.create_task(self._health_loop())
+
+    async def close(self):
+        if self._health_task:
+            self._health_task.cancel()
+            self._health_task = None
+        reconnect_callbacks = getattr(self.connection, "reconnect_callbacks", None)
+        if reconnect_callbacks is not None:
+            reconnect_callbacks.discard(self._on_reconnect)
+        for slot in self._slots:
+            if slot.channel and not slot.channel.is_closed:
+                try:
+                    await slot.channel.close()
+                except Exception:
+                    pass
+            slot.channel = None
+
+    async def _open(self, slot: _Slot):
+        slot.channel = await self.connection.channel(publisher_confirms=True)
+        return slot.channel
+
+    async def _ensure_open(self, slot: _Slot):
+        if slot.channel is None or slot.channel.is_closed:
+            if slot.channel is not None:
+                self._reopened += 1
+            await self._open(slot)
+        return slot.channel
+
+    def _home(self, queue_name: Optional[str]) -> _Slot:
+        if queue_name is None:
+            return self._slots[0]
+        return self._slots[zlib.crc32(queue_name.encode()) % self.size]
+
+    def _pick(self, queue_name: Optional[str]) -> _Slot:
+        """An idle slot; only called while holding a free-slot permit"""
+        home = self._home(queue_name)
+        if not home.busy:
+            if queue_name is not None:
+                self._affinity_hits += 1
+            return home
+        # Otherwise the least used idle channel
+        return min((slot for slot in self._slots if not slot.busy),
+                   key=lambda slot: slot.leases)
+
+    @asynccontextmanager
+    async def _lease(self, slot: _Slot):
+        slot.busy = True
+        try:
+            yield slot
+        finally:
+            slot.busy = False
+            self._free.release()
+
+    @asynccontextmanager
+    async def acquire(self, queue_name: Optional[str] = None):
+        """Lease a channel, preferring queue_name's home channel"""
+        if self._free.locked():
+            self._waits += 1
+        await self._free.acquire()
+        async with self._lease(self._pick(queue_name)) as slot:
+            slot.leases += 1
+            self._leases += 1
+            channel = await self._ensure_open(slot)
+            try:
+                yield channel
+            except Exception:
+                self._errors += 1
+                raise
+
+    async def check(self) -> int:
+        """Reopen closed idle channels; returns how many were reopened"""
+        reopened = 0
+        for slot in self._slots:
+            if slot.busy or (slot.channel is not None and not slot.channel.is_closed):
+                continue
+            await self._free.acquire()
+            if slot.busy:
+                # Leased while we waited; it is reopened on that lease
+                self._free.release()
+                continue
+            async with self._lease(slot):
+                try:
+                    await self._ensure_open(slot)
+                    reopened += 1
+                except Exception as e:
+                    print(f"Error reopening RabbitMQ channel {slot.index}: {e}")
+        return reopened
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            try:
+                await self.check()
+            except Exception as e:
+                print(f"Error checking RabbitMQ channels: {e}")
+
+    def _on_reconnect(self, *args, **kwargs):
+        # Robust channels restore themselves; anything that was closed
+        # before the outage is reopened here
+        self._reconnects += 1
+        asyncio.get_running_loop().create_task(self.check())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": self.size,
+            "open": sum(1 for slot in self._slots
+                        if slot.channel is not None and not slot.channel.is_closed),
+            "in_use": sum(1 for slot in self._slots if slot.busy),
+            "leases": self._leases,
+            "affinity_hits": self._affinity_hits,
+            "waits": self._waits,
+            "reopened": self._reopened,
+            "reconnects": self._reconnects,
+            "errors": self._errors,
+            "leases_per_channel": [slot.leases for slot in self._slots]
+        }
+
+
+async def _publish_many(channel, queue_name: str, body: bytes, count: int):
+    await asyncio.gather(*(
+        channel.default_exchange.publish(
+            aio_pika.Message(body=body, delivery_mode=aio_pika.DeliveryMode.PERSISTENT),
+            routing_key=queue_name)
+        for _ in range(count)))
+
+
+async def benchmark(url: str, messages: int = 20000, batch: int = 50,
+                    concurrency_levels: List[int] = (1, 4, 16, 64)) -> Dict[str, Any]:
+    """Publish throughput on one shared channel vs. the pool.
+
+    Run against a local broker, e.g.
+    docker run -d -p 5672:5672 rabbitmq:3 && python channel_pool.py
+    """
+    queue_name = "channel_pool_benchmark"
+    body = json.dumps({"type": "page_view", "path": "/benchmark"}).encode()
+    connection = await aio_pika.connect_robust(url)
+    results = {}
+    try:
+        setup = await connection.channel()
+        queue = await setup.declare_queue(queue_name, durable=True)
+
+        shared = await connection.channel(publisher_confirms=True)
+
+        @asynccontextmanager
+        async def shared_channel(_queue_name):
+            # The old setup: every request publishes on the one global channel
+            yield shared
+
+        pool = ChannelPool(connection)
+        await pool.start()
+
+        for concurrency in concurrency_levels:
+            for name, acquire in (("shared_channel", shared_channel), ("pool", pool.acquire)):
+                per_worker = messages // concurrency
+
+                async def worker():
+                    for _ in range(0, per_worker, batch):
+                        async with acquire(queue_name) as channel:
+                            await _publish_many(channel, queue_name, body, batch)
+
+                started = time.perf_counter()
+                await asyncio.gather(*(worker() for _ in range(concurrency)))
+                elapsed = time.perf_counter() - started
+                results.setdefault(str(concurrency), {})[name] = round(
+                    per_worker * concurrency / elapsed)
+                await queue.purge()
+
+        await pool.close()
+        await queue.delete(if_unused=False, if_empty=False)
+    finally:
+        await connection.close()
+    return {"messages_per_second": results, "batch": batch, "messages": messages}
+
+
+if __name__ == "__main__":
+    from rabbitmq_analytics import RABBITMQ_URL
+    print(json.dumps(asyncio.run(benchmark(RABBITMQ_URL)), indent=2))
@@ -0,0 +1,172 @@
+import json
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict
+
+# Journal configuration
+CHECKOUT_JOURNAL_FSYNC = os.getenv(
+    "CHECKOUT_JOURNAL_FSYNC", "interval")  # always | interval | never
+CHECKOUT_JOURNAL_FSYNC_INTERVAL = float(
+    os.getenv("CHECKOUT_JOURNAL_FSYNC_INTERVAL", 1.0))  # seconds
+CHECKOUT_JOURNAL_MAX_BYTES = int(
+    os.getenv("CHECKOUT_JOURNAL_MAX_BYTES", 50 * 1024 * 1024))
+CHECKOUT_JOURNAL_BACKUPS = int(os.getenv("CHECKOUT_JOURNAL_BACKUPS", 5))
+
+FSYNC_POLICIES = ("always", "interval", "never")
+
+
+class CheckoutJournal:
+    """Background JSONL writer with group commits.
+
+    append() only enqueues the record, so request handlers never touch the
+    disk. A writer thread drains everything queued since its last pass,
+    writes it with a single write call, and fsyncs according to the policy:
+    after every batch ("always"), at most every fsync_interval seconds
+    ("interval"), or never ("never"). The file is rotated to path.1 ..
+    path.N once it grows past max_bytes.
+    """
+
+    def __init__(self, path: Path, fsync: str = CHECKOUT_JOURNAL_FSYNC,
+                 fsync_interval: float = CHECKOUT_JOURNAL_FSYNC_INTERVAL,
+                 max_bytes: int = CHECKOUT_JOURNAL_MAX_BYTES,
+                 backups: int = CHECKOUT_JOURNAL_BACKUPS,
+                 max_batch: int = 1000, max_queue: int = 100000):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(
+                f"Unknown fsync policy {fsync!r}, expected one of {FSYNC_POLICIES}")
+        self.path = Path(path)
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.max_batch = max_batch
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._file = None
+        self._last_fsync = 0.0
+
+        self._records = 0
+        self._batches = 0
+        self._dropped = 0
+        self._rotations = 0
+        self._errors = 0
+        self._last_flush_ms = 0.0
+        self._max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    def append(self, record: Dict[str, Any]) -> bool:
+        """Queue a record for writing; returns False if the queue is full"""
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except queue.Full:
+            self._dropped += 1
+            print("Checkout journal queue full, dropping record")
+            return False
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="checkout-journal", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10):
+        """Stop the writer after draining whatever is already queued"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def _open(self):
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.path, "a", encoding="utf-8")
+        return self._file
+
+    def _rotate(self):
+        self._file.close()
+        self._file = None
+        for i in range(self.backups - 1, 0, -1):
+            older = self.path.with_name(f"{self.path.name}.{i}")
+            if older.exists():
+                os.replace(older, self.path.with_name(f"{self.path.name}.{i + 1}"))
+        if self.backups > 0:
+            os.replace(self.path, self.path.with_name(f"{self.path.name}.1"))
+        else:
+            self.path.unlink()
+        self._rotations += 1
+
+    def _write_batch(self, batch):
+        started = time.perf_counter()
+        f = self._open()
+        f.write("".join(json.dumps(record) + "\n" for record in batch))
+        f.flush()
+
+        now = time.monotonic()
+        if self.fsync == "always" or (
+                self.fsync == "interval" and now - self._last_fsync >= self.fsync_interval):
+            os.fsync(f.fileno())
+            self._last_fsync = now
+
+        if f.tell() >= self.max_bytes:
+            os.fsync(f.fileno())
+            self._rotate()
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self._records += len(batch)
+        self._batches += 1
+        self._last_flush_ms = elapsed_ms
+        self._max_flush_ms = max(self._max_flush_ms, elapsed_ms)
+        self._total_flush_ms += elapsed_ms
+
+    def _run(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                if self._stop_event.is_set():
+                    break
+                continue
+
+            # Group commit: take everything that queued up meanwhile
+            batch = [first]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                self._write_batch(batch)
+            except Exception as e:
+                self._errors += 1
+                print(f"Error writing checkout journal: {e}")
+                time.sleep(1)
+
+        if self._file:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self._queue.qsize(),
+            "records_written": self._records,
+            "batches": self._batches,
+            "avg_batch_size": round(self._records / self._batches, 2) if self._batches else 0.0,
+            "dropped": self._dropped,
+            "errors": self._errors,
+            "rotations": self._rotations,
+            "fsync_policy": self.fsync,
+            "last_flush_ms": round(self._last_flush_ms, 3),
+            "max_flush_ms": round(self._max_flush_ms, 3),
+            "avg_flush_ms": round(self._total_flush_ms / self._batches, 3) if self._batches else 0.0
+        }
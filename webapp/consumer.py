@@ -1,9 +1,18 @@
 import pika
 import os
-import json
+import time
 from datetime import datetime, UTC
 from pathlib import Path
 import logging
+from consumer_engine import CONSUMER_PREFETCH, ConsumerEngine
+from consumer_metrics import CONSUMER_METRICS_INTERVAL, ConsumerMetrics
+from dedup_filter import RollingBloomFilter
+from event_codec import dumps, loads
+from event_routing import event_name
+from message_codec import MessageCodec
+from parquet_sink import ParquetSink
+from postgres_sink import PG_SINK_BATCH_SIZE, PG_SINK_MAX_LATENCY, PostgresCopySink
+from segment_writer import SegmentWriter
 
 # Datadog tracing
 from ddtrace import patch_all
@@ -23,6 +32,49 @@ RABBITMQ_PORT = int(os.getenv("RABBITMQ_PORT", 5672))
 DEFAULT_QUEUE = os.getenv("RABBITMQ_QUEUE", "event_queue")
 RAW_DIR = Path("/data/raw")
 RAW_DIR.mkdir(parents=True, exist_ok=True)
+# How often open segments are checked for age and stats are logged
+SEGMENT_CHECK_INTERVAL = float(os.getenv("SEGMENT_CHECK_INTERVAL", 5))  # seconds
+SEGMENT_STATS_INTERVAL = float(os.getenv("SEGMENT_STATS_INTERVAL", 60))  # seconds
+# fsync segments before acking; off trades crash safety for throughput
+CONSUMER_FSYNC = os.getenv("CONSUMER_FSYNC", "true").lower() in ("1", "true", "yes")
+# ndjson leaves sealed segments for Spark; parquet compacts them into
+# hour-partitioned Parquet files (needs pyarrow)
+RAW_FORMAT = os.getenv("RAW_FORMAT", "ndjson")  # ndjson | parquet
+# files writes segments for Spark; postgres COPYs events straight into the
+# raw_data tables and acks them once committed
+CONSUMER_SINK = os.getenv("CONSUMER_SINK", "files")  # files | postgres
+# Drop redelivered events by eventId before they are written
+CONSUMER_DEDUP = os.getenv("CONSUMER_DEDUP", "true").lower() in ("1", "true", "yes")
+DEDUP_STATE_DIR = Path(os.getenv("DEDUP_STATE_DIR", str(RAW_DIR / ".dedup")))
+DEDUP_SAVE_INTERVAL = float(os.getenv("DEDUP_SAVE_INTERVAL", 60))  # seconds
+# Log one in this many events at debug level
+CONSUMER_DEBUG_SAMPLE = int(os.getenv("CONSUMER_DEBUG_SAMPLE", 1000))
+
+# Decompresses bodies published with a content-encoding
+CODEC = MessageCodec()
+
+# Rolling NDJSON segments under RAW_DIR/<queue>/<event_type>/
+PARQUET = ParquetSink(RAW_DIR) if RAW_FORMAT == "parquet" else None
+WRITER = SegmentWriter(RAW_DIR, shard=os.getenv("CONSUMER_SHARD", ""),
+                       on_seal=PARQUET.submit if PARQUET else None)
+
+# Event IDs seen recently; IDs written since the last flush stay pending,
+# with the segment they went to (None for the Postgres batch), until the
+# flush succeeds, so events requeued by a failed flush are not taken for
+# duplicates when they come back unless they were kept anyway
+DEDUP = RollingBloomFilter() if CONSUMER_DEDUP else None
+DEDUP_STATE = DEDUP_STATE_DIR / f"{WRITER.shard}.bloom"
+DEDUP_PENDING = {}
+DEDUP_COUNTS = {"duplicates": 0, "without_id": 0}
+
+# Rates, timings, lag and redeliveries; served at /metrics and logged
+METRICS = ConsumerMetrics(WRITER.shard)
+
+ENGINE = None
+POSTGRES = None
+STATS_LOGGED = [time.monotonic()]
+DEDUP_SAVED = [time.monotonic()]
+METRICS_LOGGED = [time.monotonic()]
 
 # All queues to consume from
 QUEUES = [
@@ -33,84 +85,196 @@ QUEUES = [
     DEFAULT_QUEUE  # Fallback queue
 ]
 
+# A supervised worker consumes only the queues it is given
+if os.getenv("CONSUMER_QUEUES"):
+    QUEUES = [q.strip() for q in os.getenv("CONSUMER_QUEUES").split(",") if q.strip()]
+
 
-def save_event_to_file(event, queue_name):
-    """Save an event to the appropriate directory structure"""
-    # Determine event type for directory organization
-    event_type = event.get("type", "unknown")
-    if event_type == "custom_event" and "event" in event:
-        # For custom events, use the specific event name
-        event_type = event["event"]
+def write_segment(event, queue_name):
+    """Append an event to its queue and event type's open segment; returns the segment's name"""
+    return WRITER.write(queue_name, event_name(event), dumps(event) + b"\n")
 
-    # Create directory structure
-    event_dir = RAW_DIR / queue_name / event_type
-    event_dir.mkdir(parents=True, exist_ok=True)
 
+def write_fallback(event, queue_name):
+    """Write an event of a batch Postgres rejected to its segment"""
+    segment = write_segment(event, queue_name)
+    event_id = event.get("eventId")
+    if event_id is not None and str(event_id) in DEDUP_PENDING:
+        DEDUP_PENDING[str(event_id)] = segment
+
+
+def save_event(event, queue_name):
+    """Hand an event to the Postgres batch, or to its segment; returns the segment's name"""
     # Add metadata
+    now = datetime.now(UTC)
     event["_queue"] = queue_name
-    event["_processed_at"] = datetime.now(UTC).isoformat()
+    event["_processed_at"] = now.isoformat()
+    METRICS.observe_lag(queue_name, event, now)
+
+    if POSTGRES is not None:
+        POSTGRES.add(event, queue_name)
+        return None
+    return write_segment(event, queue_name)
+
+
+def handle_message(queue_name, properties, body):
+    """Parse a message and append it to its segment, unless it is a duplicate.
 
-    # Generate filename with timestamp
-    timestamp = datetime.now(UTC).strftime("%Y%m%dT%H%M%S%f")
-    session_id = event.get("sessionId", event.get("session_id", "unknown"))
-    filename = event_dir / f"{timestamp}_{session_id}.json"
+    Raises ValueError for messages that can never be processed, so the
+    engine drops them instead of requeueing them forever. Duplicates return
+    normally and are acked without being written.
+    """
+    started = time.perf_counter()
+    event = loads(CODEC.decode(body, properties.content_encoding))
+    if not isinstance(event, dict):
+        raise ValueError("Event is not a JSON object")
+    parsed = time.perf_counter()
+    METRICS.parse.observe(parsed - started)
 
-    # Write to file
-    with open(filename, "w") as f:
-        json.dump(event, f, indent=2)
+    event_id = event.get("eventId") if DEDUP is not None else None
+    if event_id is not None:
+        event_id = str(event_id)
+        if event_id in DEDUP_PENDING or event_id in DEDUP:
+            DEDUP_COUNTS["duplicates"] += 1
+            METRICS.observe_duplicate(queue_name)
+            return
+    elif DEDUP is not None:
+        DEDUP_COUNTS["without_id"] += 1
 
-    return filename
+    segment = save_event(event, queue_name)
+    METRICS.write.observe(time.perf_counter() - parsed)
+    if event_id is not None:
+        DEDUP_PENDING[event_id] = segment
 
+    if logger.isEnabledFor(logging.DEBUG) and \
+            METRICS.messages.get(queue_name, 0) % CONSUMER_DEBUG_SAMPLE == 0:
+        logger.debug(f"Saved {event_name(event)} event {event_id} from {queue_name}")
 
-def callback(ch, method, properties, body):
-    """Process a message from RabbitMQ"""
-    queue_name = method.routing_key
 
+def flush_events():
+    """Commit the Postgres batch and make written segments durable before acking.
+
+    The engine requeues the whole batch if this raises. Events that were
+    kept anyway (committed to Postgres, or in a segment sealed before the
+    failure) are recorded as seen so their redeliveries are dropped; the
+    rest are rolled back and let through when they return.
+    """
+    if POSTGRES is not None:
+        try:
+            POSTGRES.commit()
+        except Exception:
+            # Nothing of the batch was committed
+            DEDUP_PENDING.clear()
+            raise
+    try:
+        WRITER.flush(sync=CONSUMER_FSYNC)
+    except Exception:
+        try:
+            rolled_back = WRITER.rollback()
+        except OSError as e:
+            # Unknown what was kept; prefer duplicates to losing events
+            logger.error(f"Error rolling back unflushed segments: {e}")
+            DEDUP_PENDING.clear()
+            raise
+        for event_id, segment in DEDUP_PENDING.items():
+            if segment not in rolled_back:
+                DEDUP.add(event_id)
+        DEDUP_PENDING.clear()
+        raise
+    if DEDUP_PENDING:
+        for event_id in DEDUP_PENDING:
+            DEDUP.add(event_id)
+        DEDUP_PENDING.clear()
+
+
+def save_dedup_state():
+    if DEDUP is None:
+        return
     try:
-        # Parse the message
-        event = json.loads(body)
+        DEDUP.save(DEDUP_STATE)
+    except OSError as e:
+        logger.error(f"Error saving dedup state to {DEDUP_STATE}: {e}")
 
-        # Save to file
-        filename = save_event_to_file(event, queue_name)
-        logger.info(f"Saved {filename.name} from queue {queue_name}")
 
-        # Acknowledge successful processing
-        ch.basic_ack(delivery_tag=method.delivery_tag)
-    except Exception as e:
-        logger.error(f"Failed to process message from {queue_name}: {e}")
-        # Negative acknowledgment - message will be requeued
-        ch.basic_nack(delivery_tag=method.delivery_tag)
+def check_segments():
+    """Seal idle segments by age, save dedup state and log stats and metrics; runs on the engine's tick"""
+    sealed = WRITER.roll_expired()
+    if sealed:
+        logger.info(f"Sealed {sealed} segments by age")
+    now = time.monotonic()
+    if now - DEDUP_SAVED[0] >= DEDUP_SAVE_INTERVAL:
+        DEDUP_SAVED[0] = now
+        save_dedup_state()
+    if now - METRICS_LOGGED[0] >= CONSUMER_METRICS_INTERVAL:
+        METRICS_LOGGED[0] = now
+        logger.info(f"Consumer metrics: {dumps(METRICS.snapshot()).decode()}")
+    if now - STATS_LOGGED[0] >= SEGMENT_STATS_INTERVAL:
+        STATS_LOGGED[0] = now
+        stats = WRITER.stats()
+        stats.pop("open")
+        if PARQUET is not None:
+            stats["parquet"] = PARQUET.stats()
+        if POSTGRES is not None:
+            stats["postgres"] = POSTGRES.stats()
+        if DEDUP is not None:
+            stats["dedup"] = dict(DEDUP.stats(), **DEDUP_COUNTS)
+        logger.info(f"Segment writer stats: {stats} engine: {ENGINE.stats()}")
 
 
 def main():
     """Main consumer function"""
+    global ENGINE, POSTGRES
+
+    if PARQUET is not None:
+        PARQUET.start()
+        pending = PARQUET.convert_pending(WRITER.shard)
+        if pending:
+            logger.info(f"Converting {pending} segments left by a previous run to Parquet")
+    recovered = WRITER.recover()
+    if recovered:
+        logger.info(f"Sealed {recovered} segments left open by a previous run")
+    if DEDUP is not None and DEDUP.load(DEDUP_STATE):
+        logger.info(f"Loaded dedup state from {DEDUP_STATE}: {DEDUP.stats()}")
+
+    batching = {}
+    if CONSUMER_SINK == "postgres":
+        # Batches the database rejects go to segments for Spark
+        POSTGRES = PostgresCopySink(QUEUES, fallback=write_fallback)
+        POSTGRES.start()
+        logger.info(f"Loading events into {POSTGRES.stats()['tables']} with COPY")
+        # Every flush is a COPY commit; leave room to keep receiving while
+        # a batch commits
+        batching = {"ack_batch": PG_SINK_BATCH_SIZE, "ack_interval": PG_SINK_MAX_LATENCY,
+                    "prefetch": max(CONSUMER_PREFETCH, 2 * PG_SINK_BATCH_SIZE)}
+
     logger.info(f"Connecting to RabbitMQ at {RABBITMQ_HOST}:{RABBITMQ_PORT}")
-    connection = pika.BlockingConnection(
-        pika.ConnectionParameters(host=RABBITMQ_HOST, port=RABBITMQ_PORT))
-    channel = connection.channel()
+    ENGINE = ConsumerEngine(
+        pika.ConnectionParameters(host=RABBITMQ_HOST, port=RABBITMQ_PORT),
+        QUEUES, handle_message, flush_events,
+        tick=check_segments, tick_interval=SEGMENT_CHECK_INTERVAL,
+        metrics=METRICS, **batching)
+    try:
+        METRICS.serve()
+    except OSError as e:
+        logger.error(f"Error serving consumer metrics: {e}")
 
-    # Set up queues and consume from each
-    for queue_name in QUEUES:
-        try:
-            # Declare the queue (ensure it exists)
-            channel.queue_declare(queue=queue_name, durable=True)
-
-            # Set up consumption
-            channel.basic_qos(prefetch_count=1)
-            channel.basic_consume(
-                queue=queue_name, on_message_callback=callback)
-            logger.info(f"Set up consumption from queue: {queue_name}")
-        except Exception as e:
-            logger.error(f"Error setting up queue {queue_name}: {e}")
-
-    logger.info("Starting consumption. To exit press CTRL+C")
+    logger.info(
+        f"Starting consumption from {QUEUES} ({ENGINE.mode} mode, prefetch "
+        f"{ENGINE.prefetch}). To exit press CTRL+C")
     try:
-        channel.start_consuming()
-    except KeyboardInterrupt:
-        logger.info("Stopping consumer...")
-        channel.stop_consuming()
+        ENGINE.run()
     finally:
-        connection.close()
+        WRITER.close()
+        save_dedup_state()
+        if POSTGRES is not None:
+            POSTGRES.close()
+            logger.info(f"Postgres sink stats: {POSTGRES.stats()}")
+        logger.info(f"Segment writer stats: {WRITER.stats()} engine: {ENGINE.stats()}")
+        if PARQUET is not None:
+            PARQUET.close()
+            logger.info(f"Parquet sink stats: {PARQUET.stats()}")
+        logger.info(f"Consumer metrics: {dumps(METRICS.snapshot()).decode()}")
+        METRICS.close()
 
 
 if __name__ == "__main__":
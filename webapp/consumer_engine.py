@@ -0,0 +1,348 @@
+import functools
+import logging
+import os
+import queue
+import signal
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import pika
+
+logger = logging.getLogger(__name__)
+
+# Consumer engine configuration
+CONSUMER_PREFETCH = int(os.getenv("CONSUMER_PREFETCH", 500))  # unacked messages per channel
+CONSUMER_ACK_BATCH = int(os.getenv("CONSUMER_ACK_BATCH", 250))  # messages per ack
+CONSUMER_ACK_INTERVAL = float(os.getenv("CONSUMER_ACK_INTERVAL", 0.2))  # seconds
+CONSUMER_MODE = os.getenv("CONSUMER_MODE", "thread")  # inline | thread
+CONSUMER_DRAIN_TIMEOUT = float(os.getenv("CONSUMER_DRAIN_TIMEOUT", 30))  # seconds
+
+MODES = ("inline", "thread")
+
+_STOP = object()
+
+
+class ConsumerEngine:
+    """Consumes queues with a prefetch window and batched, flush-gated acks.
+
+    handle(queue_name, properties, body) processes one message (parsing it
+    and handing it to a sink); flush() must make everything handled so far
+    durable. Messages are acked together with basic_ack(multiple=True), and
+    only after flush() returned, once ack_batch messages are pending or the
+    oldest has waited ack_interval. A ValueError from handle() means the
+    message can never be processed and it is rejected without requeue; any
+    other error requeues it. If flush() fails, every pending message is
+    requeued.
+
+    In "thread" mode parsing, sink I/O and flushes run on a worker thread and
+    acks are handed back to the connection thread, which keeps heartbeats
+    and deliveries flowing during slow flushes; "inline" runs everything on
+    the connection thread. SIGTERM and SIGINT stop consuming, finish the
+    messages already delivered, flush and ack them before closing;
+    prefetched messages not yet delivered go back to the queue.
+
+    metrics, if given, is told of every delivery (observe_delivery) and
+    every acked batch (observe_ack).
+    """
+
+    def __init__(self, parameters: pika.ConnectionParameters, queues: List[str],
+                 handle: Callable[[str, Any, bytes], None],
+                 flush: Callable[[], None],
+                 tick: Optional[Callable[[], None]] = None,
+                 tick_interval: float = 5.0,
+                 prefetch: int = CONSUMER_PREFETCH,
+                 ack_batch: int = CONSUMER_ACK_BATCH,
+                 ack_interval: float = CONSUMER_ACK_INTERVAL,
+                 mode: str = CONSUMER_MODE,
+                 drain_timeout: float = CONSUMER_DRAIN_TIMEOUT,
+                 metrics: Optional[Any] = None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown consumer mode {mode!r}, expected one of {MODES}")
+        self.parameters = parameters
+        self.queues = queues
+        self.handle = handle
+        self.flush = flush
+        self.tick = tick
+        self.tick_interval = tick_interval
+        self.prefetch = prefetch
+        self.ack_batch = max(1, min(ack_batch, prefetch))
+        self.ack_interval = ack_interval
+        self.mode = mode
+        self.drain_timeout = drain_timeout
+        self.metrics = metrics
+
+        self._connection = None
+        self._channel = None
+        self._work: "queue.Queue" = queue.Queue()
+        self._worker = None
+        self._stopping = False
+        # Set when run() gives up on the connection; nothing is acked after
+        self._abandoned = False
+
+        # Highest delivery tag handled but not yet acked, and how many
+        self._pending_tag = 0
+        self._pending = 0
+        self._oldest_pending = 0.0
+        self._last_tick = time.monotonic()
+
+        self._received = 0
+        self._acked = 0
+        self._ack_batches = 0
+        self._rejected = 0
+        self._requeued = 0
+        self._flush_errors = 0
+        self._flush_seconds = 0.0
+
+    # --- Processing (worker thread, or the connection thread inline) ---
+
+    def _settle(self, method: str, **kwargs):
+        if self._abandoned:
+            return
+        callback = functools.partial(getattr(self._channel, method), **kwargs)
+        if self.mode == "thread":
+            self._connection.add_callback_threadsafe(callback)
+        else:
+            callback()
+
+    def _process(self, method, properties, body: bytes):
+        self._received += 1
+        if self.metrics is not None:
+            self.metrics.observe_delivery(method.routing_key, method.redelivered)
+        try:
+            self.handle(method.routing_key, properties, body)
+        except ValueError as e:
+            logger.error(f"Rejecting message from {method.routing_key}: {e}")
+            self._rejected += 1
+            self._settle("basic_nack", delivery_tag=method.delivery_tag, requeue=False)
+            return
+        except Exception as e:
+            logger.error(f"Failed to process message from {method.routing_key}: {e}")
+            self._requeued += 1
+            self._settle("basic_nack", delivery_tag=method.delivery_tag, requeue=True)
+            return
+        if not self._pending:
+            self._oldest_pending = time.monotonic()
+        self._pending += 1
+        self._pending_tag = max(self._pending_tag, method.delivery_tag)
+
+    def _maybe_ack(self, force: bool = False):
+        if not self._pending:
+            return
+        if not force and self._pending < self.ack_batch and \
+                time.monotonic() - self._oldest_pending < self.ack_interval:
+            return
+        tag, count, oldest = self._pending_tag, self._pending, self._oldest_pending
+        self._pending_tag = 0
+        self._pending = 0
+        started = time.perf_counter()
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Flush failed, requeueing {count} messages: {e}")
+            self._flush_errors += 1
+            self._requeued += count
+            self._settle("basic_nack", delivery_tag=tag, multiple=True, requeue=True)
+            return
+        flush_seconds = time.perf_counter() - started
+        self._flush_seconds += flush_seconds
+        self._settle("basic_ack", delivery_tag=tag, multiple=True)
+        if self.metrics is not None:
+            self.metrics.observe_ack(flush_seconds, time.monotonic() - oldest)
+        self._acked += count
+        self._ack_batches += 1
+
+    def _maybe_tick(self):
+        if self.tick is None or time.monotonic() - self._last_tick < self.tick_interval:
+            return
+        self._last_tick = time.monotonic()
+        try:
+            self.tick()
+        except Exception as e:
+            logger.error(f"Error in consumer tick: {e}")
+
+    def _run_worker(self):
+        while True:
+            try:
+                item = self._work.get(timeout=self.ack_interval)
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                break
+            if item is not None:
+                self._process(*item)
+            self._maybe_ack()
+            self._maybe_tick()
+        if not self._abandoned:
+            self._maybe_ack(force=True)
+        elif self._pending:
+            # Nothing can be acked, but keep what was handled: it will be
+            # redelivered, and a durable copy lets the sink recognise it
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Flush failed while abandoning the connection: {e}")
+
+    # --- Connection thread ---
+
+    def _on_message(self, channel, method, properties, body):
+        if self.mode == "thread":
+            self._work.put((method, properties, body))
+        else:
+            self._process(method, properties, body)
+            self._maybe_ack()
+
+    def _on_timer(self):
+        self._maybe_ack()
+        self._maybe_tick()
+        if not self._stopping:
+            self._connection.call_later(min(self.ack_interval, self.tick_interval), self._on_timer)
+
+    def stop(self):
+        """Stop consuming and drain; safe from signal handlers and other threads"""
+        if self._stopping or self._connection is None:
+            return
+        self._stopping = True
+        self._connection.add_callback_threadsafe(self._channel.stop_consuming)
+
+    def _on_signal(self, signum, frame):
+        logger.info(f"Received signal {signum}, draining consumer")
+        self.stop()
+
+    def _drain(self):
+        if self.mode == "inline":
+            self._maybe_ack(force=True)
+            return
+        self._work.put(_STOP)
+        deadline = time.monotonic() + self.drain_timeout
+        while self._worker.is_alive() and time.monotonic() < deadline:
+            # Runs the acks the worker hands over while it finishes
+            self._connection.process_data_events(time_limit=0.1)
+        if self._worker.is_alive():
+            logger.error("Consumer worker did not drain in time; unacked messages will be redelivered")
+        self._connection.process_data_events(time_limit=0)
+
+    def run(self, install_signal_handlers: bool = True):
+        """Consume until stop() or a signal; returns after draining"""
+        self._connection = pika.BlockingConnection(self.parameters)
+        self._channel = self._connection.channel()
+        self._channel.basic_qos(prefetch_count=self.prefetch)
+        for queue_name in self.queues:
+            self._channel.queue_declare(queue=queue_name, durable=True)
+            self._channel.basic_consume(queue=queue_name, on_message_callback=self._on_message)
+
+        if install_signal_handlers and threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, self._on_signal)
+            signal.signal(signal.SIGINT, self._on_signal)
+
+        if self.mode == "thread":
+            self._worker = threading.Thread(
+                target=self._run_worker, name="consumer-worker", daemon=True)
+            self._worker.start()
+        else:
+            self._connection.call_later(min(self.ack_interval, self.tick_interval), self._on_timer)
+
+        try:
+            self._channel.start_consuming()
+            self._drain()
+        finally:
+            self._stop_worker()
+            if self._connection.is_open:
+                self._connection.close()
+
+    def _stop_worker(self):
+        """Make sure the worker thread is gone before run() returns or raises.
+
+        After a clean drain this is a no-op. If consuming failed (the
+        connection dropped), messages still queued are dropped, since the
+        broker redelivers everything unacked, and the worker flushes what it
+        handled and exits without acking, so it no longer calls
+        handle/flush/tick while the caller cleans up.
+        """
+        if self._worker is None:
+            return
+        if self._worker.is_alive():
+            self._abandoned = True
+            while True:
+                try:
+                    self._work.get_nowait()
+                except queue.Empty:
+                    break
+            self._work.put(_STOP)
+        self._worker.join(self.drain_timeout)
+        if self._worker.is_alive():
+            logger.error("Consumer worker did not stop in time")
+        self._worker = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "prefetch": self.prefetch,
+            "ack_batch": self.ack_batch,
+            "received": self._received,
+            "acked": self._acked,
+            "ack_batches": self._ack_batches,
+            "avg_ack_batch": round(self._acked / self._ack_batches, 1) if self._ack_batches else 0,
+            "pending": self._pending,
+            "queued": self._work.qsize(),
+            "rejected": self._rejected,
+            "requeued": self._requeued,
+            "flush_errors": self._flush_errors,
+            "avg_flush_ms": round(self._flush_seconds / self._ack_batches * 1000, 3) if self._ack_batches else 0
+        }
+
+
+def benchmark(parameters: pika.ConnectionParameters, messages: int = 50000,
+              prefetches=(1, 10, 100, 500, 2000), modes=MODES) -> List[Dict[str, Any]]:
+    """Messages per second for each prefetch window and mode against a live broker"""
+    bench_queue = "consumer_benchmark"
+    body = b'{"type": "page_view", "path": "/benchmark", "sessionId": "benchmark"}'
+    results = []
+    for mode in modes:
+        for prefetch in prefetches:
+            connection = pika.BlockingConnection(parameters)
+            channel = connection.channel()
+            channel.queue_declare(queue=bench_queue, durable=True)
+            channel.queue_purge(queue=bench_queue)
+            for _ in range(messages):
+                channel.basic_publish(exchange="", routing_key=bench_queue, body=body)
+            connection.close()
+
+            handled = [0]
+            engine = None
+
+            def handle(queue_name, properties, body):
+                handled[0] += 1
+                if handled[0] == messages:
+                    engine.stop()
+
+            # ack_batch=1 with prefetch=1 is the old one-ack-per-message consumer
+            engine = ConsumerEngine(parameters, [bench_queue], handle, lambda: None,
+                                    prefetch=prefetch, ack_batch=max(1, prefetch // 2),
+                                    mode=mode)
+            started = time.perf_counter()
+            engine.run(install_signal_handlers=False)
+            elapsed = time.perf_counter() - started
+            results.append({
+                "mode": mode,
+                "prefetch": prefetch,
+                "messages": handled[0],
+                "seconds": round(elapsed, 3),
+                "messages_per_second": round(handled[0] / elapsed),
+                "avg_ack_batch": engine.stats()["avg_ack_batch"]
+            })
+
+    connection = pika.BlockingConnection(parameters)
+    connection.channel().queue_delete(queue=bench_queue)
+    connection.close()
+    return results
+
+
+if __name__ == "__main__":
+    import json
+
+    logging.basicConfig(level=logging.INFO)
+    params = pika.ConnectionParameters(
+        host=os.getenv("RABBITMQ_HOST", "rabbitmq"),
+        port=int(os.getenv("RABBITMQ_PORT", 5672)))
+    print(json.dumps(benchmark(params), indent=2))
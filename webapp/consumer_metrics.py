@@ -0,0 +1,217 @@
+import bisect
+import os
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Sequence
+
+# Consumer metrics configuration
+CONSUMER_METRICS_PORT = int(os.getenv("CONSUMER_METRICS_PORT", 0))  # 0 disables /metrics
+CONSUMER_METRICS_INTERVAL = float(os.getenv("CONSUMER_METRICS_INTERVAL", 60))  # seconds
+
+# Histogram upper bounds, in seconds
+TIMING_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001,
+                  0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+LAG_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+               30.0, 60.0, 300.0, 900.0, 3600.0)
+
+
+class Histogram:
+    """Fixed-bucket histogram; observe() is a bisect and two additions"""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "avg": self.sum / self.count if self.count else None,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99)
+        }
+
+    def prometheus(self, name: str, labels: str = "") -> List[str]:
+        lines = []
+        cumulative = 0
+        prefix = labels + "," if labels else ""
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{prefix}le="{bound:g}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {self.count}')
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {self.sum:.6f}")
+        lines.append(f"{name}_count{suffix} {self.count}")
+        return lines
+
+
+def _since(server_timestamp: Any, now: datetime) -> Optional[float]:
+    if not isinstance(server_timestamp, str):
+        return None
+    try:
+        return (now - datetime.fromisoformat(server_timestamp)).total_seconds()
+    except (TypeError, ValueError):
+        # Unparseable, or without a timezone
+        return None
+
+
+class ConsumerMetrics:
+    """Counters and histograms for one consumer process.
+
+    The engine reports deliveries (with the broker's redelivered flag) and
+    ack batches; handle_message reports parse and write times, duplicates
+    and each event's lag from server_timestamp to _processed_at. Updates
+    come from a single thread and are plain additions; readers take
+    point-in-time copies. prometheus() renders the text exposition format
+    served by serve(), and snapshot() a JSON-friendly dict with per-queue
+    messages/sec since the previous snapshot.
+    """
+
+    def __init__(self, shard: str = ""):
+        self.shard = shard
+        self.started = time.monotonic()
+
+        self.messages: Dict[str, int] = {}
+        self.redelivered: Dict[str, int] = {}
+        self.duplicates: Dict[str, int] = {}
+        self.parse = Histogram(TIMING_BUCKETS)
+        self.write = Histogram(TIMING_BUCKETS)
+        self.flush = Histogram(TIMING_BUCKETS)
+        self.ack = Histogram(TIMING_BUCKETS)
+        self.lag: Dict[str, Histogram] = {}
+
+        self._last_snapshot = time.monotonic()
+        self._last_messages: Dict[str, int] = {}
+        self._server = None
+
+    # --- Recording ---
+
+    def observe_delivery(self, queue_name: str, redelivered: bool):
+        self.messages[queue_name] = self.messages.get(queue_name, 0) + 1
+        if redelivered:
+            self.redelivered[queue_name] = self.redelivered.get(queue_name, 0) + 1
+
+    def observe_duplicate(self, queue_name: str):
+        self.duplicates[queue_name] = self.duplicates.get(queue_name, 0) + 1
+
+    def observe_lag(self, queue_name: str, event: Dict[str, Any], now: datetime):
+        lag = _since(event.get("server_timestamp"), now)
+        if lag is None:
+            return
+        histogram = self.lag.get(queue_name)
+        if histogram is None:
+            histogram = self.lag[queue_name] = Histogram(LAG_BUCKETS)
+        histogram.observe(lag)
+
+    def observe_ack(self, flush_seconds: float, wait_seconds: float):
+        """A batch was flushed in flush_seconds and acked wait_seconds after its oldest message was handled"""
+        self.flush.observe(flush_seconds)
+        self.ack.observe(wait_seconds)
+
+    # --- Reading ---
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        elapsed = max(now - self._last_snapshot, 1e-9)
+        messages = dict(self.messages)
+        rates = {queue_name: round((count - self._last_messages.get(queue_name, 0)) / elapsed, 1)
+                 for queue_name, count in messages.items()}
+        self._last_snapshot = now
+        self._last_messages = messages
+        return {
+            "shard": self.shard,
+            "uptime_seconds": round(now - self.started, 1),
+            "messages_per_second": rates,
+            "messages": messages,
+            "redelivered": dict(self.redelivered),
+            "duplicates": dict(self.duplicates),
+            "parse_seconds": self.parse.summary(),
+            "write_seconds": self.write.summary(),
+            "flush_seconds": self.flush.summary(),
+            "ack_seconds": self.ack.summary(),
+            "lag_seconds": {queue_name: histogram.summary()
+                            for queue_name, histogram in list(self.lag.items())}
+        }
+
+    def prometheus(self) -> str:
+        shard = f'shard="{self.shard}"'
+        lines = [
+            "# HELP consumer_messages_total Messages delivered to this consumer",
+            "# TYPE consumer_messages_total counter",
+        ]
+        for queue_name, count in list(self.messages.items()):
+            lines.append(f'consumer_messages_total{{{shard},queue="{queue_name}"}} {count}')
+        lines += ["# HELP consumer_redelivered_total Messages the broker marked as redelivered",
+                  "# TYPE consumer_redelivered_total counter"]
+        for queue_name, count in list(self.redelivered.items()):
+            lines.append(f'consumer_redelivered_total{{{shard},queue="{queue_name}"}} {count}')
+        lines += ["# HELP consumer_duplicates_total Events dropped as already seen",
+                  "# TYPE consumer_duplicates_total counter"]
+        for queue_name, count in list(self.duplicates.items()):
+            lines.append(f'consumer_duplicates_total{{{shard},queue="{queue_name}"}} {count}')
+        for name, histogram, help_text in (
+                ("consumer_parse_seconds", self.parse, "Time to decode and parse a message"),
+                ("consumer_write_seconds", self.write, "Time to hand an event to the sink"),
+                ("consumer_flush_seconds", self.flush, "Time to make a batch durable"),
+                ("consumer_ack_seconds", self.ack,
+                 "Time from the oldest message of a batch being handled to its ack")):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+            lines += histogram.prometheus(name, shard)
+        lines += ["# HELP consumer_lag_seconds Time from server_timestamp to _processed_at",
+                  "# TYPE consumer_lag_seconds histogram"]
+        for queue_name, histogram in list(self.lag.items()):
+            lines += histogram.prometheus("consumer_lag_seconds", f'{shard},queue="{queue_name}"')
+        return "\n".join(lines) + "\n"
+
+    # --- Endpoint ---
+
+    def serve(self, port: int = CONSUMER_METRICS_PORT):
+        """Serve prometheus() at /metrics on a daemon thread; port 0 does nothing"""
+        if not port or self._server is not None:
+            return
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("", port), Handler)
+        threading.Thread(target=self._server.serve_forever,
+                         name="consumer-metrics", daemon=True).start()
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
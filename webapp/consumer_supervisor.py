@@ -0,0 +1,330 @@
+import logging
+import math
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import pika
+
+# Set up logging
+FORMAT = ('%(asctime)s %(levelname)s [%(name)s] [%(filename)s:%(lineno)d] '
+          '- %(message)s')
+logging.basicConfig(format=FORMAT)
+logger = logging.getLogger(__name__)
+logger.level = logging.INFO
+
+# Configuration
+RABBITMQ_HOST = os.getenv("RABBITMQ_HOST", "rabbitmq")
+RABBITMQ_PORT = int(os.getenv("RABBITMQ_PORT", 5672))
+DEFAULT_QUEUE = os.getenv("RABBITMQ_QUEUE", "event_queue")
+SUPERVISED_QUEUES = os.getenv(
+    "CONSUMER_SUPERVISED_QUEUES",
+    f"page_views,user_events,ecommerce_events,analytics_events,{DEFAULT_QUEUE}")
+# Workers per queue at start, e.g. "ecommerce_events=4"; others get the minimum
+CONSUMER_WORKERS = os.getenv("CONSUMER_WORKERS", "")
+CONSUMER_MIN_WORKERS = int(os.getenv("CONSUMER_MIN_WORKERS", 1))
+CONSUMER_MAX_WORKERS = int(os.getenv("CONSUMER_MAX_WORKERS", 4))
+# Workers across all queues, draining ones included; defaults to the CPU count
+CONSUMER_MAX_TOTAL_WORKERS = int(os.getenv("CONSUMER_MAX_TOTAL_WORKERS") or os.cpu_count() or 1)
+# Scale to one worker per this many ready messages; 0 turns scaling off
+CONSUMER_SCALE_DEPTH = int(os.getenv("CONSUMER_SCALE_DEPTH", 5000))
+CONSUMER_SCALE_INTERVAL = float(os.getenv("CONSUMER_SCALE_INTERVAL", 15))  # seconds
+CONSUMER_RESTART_BACKOFF_MAX = float(
+    os.getenv("CONSUMER_RESTART_BACKOFF_MAX", 30))  # seconds
+CONSUMER_STOP_TIMEOUT = float(os.getenv("CONSUMER_STOP_TIMEOUT", 45))  # seconds
+# Workers serve /metrics on consecutive ports from this one; 0 disables it
+CONSUMER_METRICS_PORT = int(os.getenv("CONSUMER_METRICS_PORT", 0))
+
+CONSUMER_SCRIPT = Path(__file__).with_name("consumer.py")
+
+
+def parse_workers(spec: str) -> Dict[str, int]:
+    """Parse "queue=count,queue=count" into a dict"""
+    workers = {}
+    for item in spec.split(","):
+        if item.strip():
+            queue_name, _, count = item.partition("=")
+            workers[queue_name.strip()] = int(count)
+    return workers
+
+
+class _Worker:
+    """One consumer process bound to a queue and a slot"""
+
+    def __init__(self, queue_name: str, slot: int, shard: str, metrics_port: int = 0):
+        self.queue_name = queue_name
+        self.slot = slot
+        self.shard = shard
+        self.metrics_port = metrics_port
+        self.process: Optional[subprocess.Popen] = None
+        self.started = 0.0
+        self.restarts = 0
+        self.backoff = 0.0
+        self.restart_at = 0.0
+        self.stopping = False
+
+    def start(self):
+        env = dict(os.environ,
+                   CONSUMER_QUEUES=self.queue_name,
+                   CONSUMER_SHARD=self.shard,
+                   CONSUMER_METRICS_PORT=str(self.metrics_port))
+        self.process = subprocess.Popen([sys.executable, str(CONSUMER_SCRIPT)], env=env)
+        self.started = time.monotonic()
+        self.stopping = False
+
+    def alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+
+class ConsumerSupervisor:
+    """Runs consumer.py processes per queue, restarts them and scales them.
+
+    Each worker consumes a single queue and writes under its own shard name
+    (<host>-<queue>-<slot>), so workers never share a segment file and a
+    restarted worker recovers exactly the segments its slot left open. A
+    worker that exits is restarted after an exponential backoff that resets
+    once it has stayed up for a minute. Every scale_interval the ready depth
+    of each queue is read with a passive declare; a queue gets one worker per
+    scale_depth messages within [min_workers, max_workers], added at once
+    but removed one per interval, by SIGTERM so the worker drains and seals
+    its segments. Workers above the minimum are only added while fewer than
+    max_total_workers run in all, the deepest queues first.
+    """
+
+    def __init__(self, queues: List[str], workers: Dict[str, int],
+                 min_workers: int = CONSUMER_MIN_WORKERS,
+                 max_workers: int = CONSUMER_MAX_WORKERS,
+                 max_total_workers: int = CONSUMER_MAX_TOTAL_WORKERS,
+                 scale_depth: int = CONSUMER_SCALE_DEPTH,
+                 scale_interval: float = CONSUMER_SCALE_INTERVAL):
+        self.queues = queues
+        self.min_workers = min_workers
+        self.max_workers = max(max_workers, min_workers)
+        # Every queue keeps its minimum, whatever the cap
+        self.max_total_workers = max(max_total_workers, min_workers * len(queues))
+        self.scale_depth = scale_depth
+        self.scale_interval = scale_interval
+        self.host = socket.gethostname()
+
+        self._workers: Dict[str, List[_Worker]] = {q: [] for q in queues}
+        self._initial = self._within_total(
+            {q: self._clamp(workers.get(q, min_workers)) for q in queues})
+        self._depths: Dict[str, Optional[int]] = {q: None for q in queues}
+        self._stopping: List[_Worker] = []
+        self._running = False
+        self._scale_events = 0
+
+    def _clamp(self, count: int) -> int:
+        return max(self.min_workers, min(self.max_workers, count))
+
+    def _within_total(self, counts: Dict[str, int]) -> Dict[str, int]:
+        """Cut counts above the minimum so their sum stays within max_total_workers"""
+        spare = self.max_total_workers - self.min_workers * len(counts)
+        limited = {}
+        for queue_name, count in counts.items():
+            extra = min(count - self.min_workers, spare)
+            limited[queue_name] = self.min_workers + extra
+            spare -= extra
+        return limited
+
+    def _total_workers(self) -> int:
+        return sum(len(workers) for workers in self._workers.values()) + len(self._stopping)
+
+    # --- Workers ---
+
+    def _add_worker(self, queue_name: str) -> bool:
+        """Start a worker in the lowest free slot; False if all max_workers slots are taken"""
+        workers = self._workers[queue_name]
+        # A draining worker keeps its slot until it exits, since a new worker
+        # on the same shard would seal its open segments on recovery
+        taken = {w.slot for w in workers + self._stopping if w.queue_name == queue_name}
+        slot = next((i for i in range(self.max_workers) if i not in taken), None)
+        if slot is None:
+            logger.info(f"No free slot for {queue_name} until a draining worker exits")
+            return False
+        # A fixed port per queue and slot, so scrape targets stay put; slots
+        # stay below max_workers, so queues never share a port
+        metrics_port = 0
+        if CONSUMER_METRICS_PORT:
+            metrics_port = CONSUMER_METRICS_PORT + \
+                self.queues.index(queue_name) * self.max_workers + slot
+        worker = _Worker(queue_name, slot, f"{self.host}-{queue_name}-{slot}", metrics_port)
+        worker.start()
+        workers.append(worker)
+        logger.info(f"Started worker {worker.shard} (pid {worker.process.pid})")
+        return True
+
+    def _remove_worker(self, queue_name: str):
+        # Highest slot first, so the remaining slots stay contiguous
+        workers = self._workers[queue_name]
+        worker = max(workers, key=lambda w: w.slot)
+        workers.remove(worker)
+        worker.stopping = True
+        if worker.alive():
+            worker.process.send_signal(signal.SIGTERM)
+        self._stopping.append(worker)
+        logger.info(f"Stopping worker {worker.shard}")
+
+    def _check_workers(self):
+        now = time.monotonic()
+        for workers in self._workers.values():
+            for worker in workers:
+                if worker.alive():
+                    if worker.backoff and now - worker.started > 60:
+                        worker.backoff = 0.0
+                    continue
+                if not worker.restart_at:
+                    worker.backoff = min(CONSUMER_RESTART_BACKOFF_MAX,
+                                         max(1.0, worker.backoff * 2))
+                    worker.restart_at = now + worker.backoff
+                    logger.error(
+                        f"Worker {worker.shard} exited with {worker.process.returncode}, "
+                        f"restarting in {worker.backoff:.0f}s")
+                elif now >= worker.restart_at:
+                    worker.restart_at = 0.0
+                    worker.restarts += 1
+                    worker.start()
+        # Reap workers that were asked to stop
+        self._stopping = [w for w in self._stopping if w.alive()]
+
+    # --- Scaling ---
+
+    def queue_depths(self) -> Dict[str, Optional[int]]:
+        """Ready messages per queue, from passive declares"""
+        depths: Dict[str, Optional[int]] = {}
+        try:
+            connection = pika.BlockingConnection(
+                pika.ConnectionParameters(host=RABBITMQ_HOST, port=RABBITMQ_PORT))
+        except Exception as e:
+            logger.error(f"Error connecting to RabbitMQ for queue depths: {e}")
+            return {q: None for q in self.queues}
+        try:
+            for queue_name in self.queues:
+                try:
+                    # A failed passive declare closes the channel
+                    channel = connection.channel()
+                    result = channel.queue_declare(queue=queue_name, passive=True)
+                    depths[queue_name] = result.method.message_count
+                    channel.close()
+                except Exception as e:
+                    logger.error(f"Error reading depth of {queue_name}: {e}")
+                    depths[queue_name] = None
+        finally:
+            connection.close()
+        return depths
+
+    def desired_workers(self, queue_name: str, depth: Optional[int]) -> int:
+        current = len(self._workers[queue_name])
+        if depth is None or self.scale_depth <= 0:
+            return current
+        target = self._clamp(math.ceil(depth / self.scale_depth))
+        # Scale up at once, down one worker per interval
+        return target if target > current else max(target, current - 1)
+
+    def _scale(self):
+        self._depths = self.queue_depths()
+        desired = {queue_name: self.desired_workers(queue_name, depth)
+                   for queue_name, depth in self._depths.items()}
+        # Scale down first, so the freed room can go to the queues scaling up
+        for queue_name, count in desired.items():
+            current = len(self._workers[queue_name])
+            if count >= current:
+                continue
+            logger.info(f"Scaling {queue_name} from {current} to {count} workers "
+                        f"(depth {self._depths[queue_name]})")
+            self._scale_events += 1
+            while len(self._workers[queue_name]) > count:
+                self._remove_worker(queue_name)
+        growing = [q for q, count in desired.items() if count > len(self._workers[q])]
+        growing.sort(key=lambda q: self._depths[q] or 0, reverse=True)
+        for queue_name in growing:
+            current = len(self._workers[queue_name])
+            room = self.max_total_workers - self._total_workers()
+            count = min(desired[queue_name], current + max(0, room))
+            if count <= current:
+                logger.info(f"Not scaling {queue_name} past {current} workers, "
+                            f"{self.max_total_workers} are running in all")
+                continue
+            logger.info(f"Scaling {queue_name} from {current} to {count} workers "
+                        f"(depth {self._depths[queue_name]})")
+            self._scale_events += 1
+            while len(self._workers[queue_name]) < count:
+                if not self._add_worker(queue_name):
+                    break
+
+    # --- Lifecycle ---
+
+    def _on_signal(self, signum, frame):
+        logger.info(f"Received signal {signum}, stopping workers")
+        self._running = False
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._on_signal)
+        signal.signal(signal.SIGINT, self._on_signal)
+        self._running = True
+        for queue_name, count in self._initial.items():
+            for _ in range(count):
+                self._add_worker(queue_name)
+
+        last_scale = time.monotonic()
+        while self._running:
+            time.sleep(1)
+            self._check_workers()
+            if time.monotonic() - last_scale >= self.scale_interval:
+                last_scale = time.monotonic()
+                self._scale()
+                logger.info(f"Supervisor stats: {self.stats()}")
+        self.stop()
+
+    def stop(self, timeout: float = CONSUMER_STOP_TIMEOUT):
+        """SIGTERM every worker, then kill those still running after timeout"""
+        workers = [w for ws in self._workers.values() for w in ws] + self._stopping
+        for worker in workers:
+            worker.stopping = True
+            if worker.alive():
+                worker.process.send_signal(signal.SIGTERM)
+        deadline = time.monotonic() + timeout
+        for worker in workers:
+            if worker.process is None:
+                continue
+            try:
+                worker.process.wait(max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                logger.error(f"Worker {worker.shard} did not drain in time, killing it")
+                worker.process.kill()
+                worker.process.wait()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queues": {
+                queue_name: {
+                    "workers": len(workers),
+                    "alive": sum(w.alive() for w in workers),
+                    "restarts": sum(w.restarts for w in workers),
+                    "depth": self._depths.get(queue_name)
+                }
+                for queue_name, workers in self._workers.items()
+            },
+            "stopping": len(self._stopping),
+            "scale_events": self._scale_events,
+            "min_workers": self.min_workers,
+            "max_workers": self.max_workers,
+            "max_total_workers": self.max_total_workers,
+            "scale_depth": self.scale_depth
+        }
+
+
+def main():
+    queues = [q.strip() for q in SUPERVISED_QUEUES.split(",") if q.strip()]
+    supervisor = ConsumerSupervisor(queues, parse_workers(CONSUMER_WORKERS))
+    logger.info(f"Supervising consumers for {queues}")
+    supervisor.run()
+
+
+if __name__ == "__main__":
+    main()
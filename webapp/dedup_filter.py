@@ -0,0 +1,205 @@
+import hashlib
+import json
+import logging
+import math
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+# Duplicate suppression configuration
+DEDUP_CAPACITY = int(os.getenv("DEDUP_CAPACITY", 1000000))  # event IDs per generation
+DEDUP_FALSE_POSITIVE_RATE = float(os.getenv("DEDUP_FALSE_POSITIVE_RATE", 0.001))
+DEDUP_WINDOW = float(os.getenv("DEDUP_WINDOW", 600))  # seconds per generation
+DEDUP_GENERATIONS = int(os.getenv("DEDUP_GENERATIONS", 3))
+
+STATE_VERSION = 1
+
+
+class _Generation:
+    def __init__(self, bits: bytearray, created: float, count: int = 0):
+        self.bits = bits
+        self.created = created
+        self.count = count
+
+
+class RollingBloomFilter:
+    """Remembers recently seen keys in a fixed amount of memory.
+
+    Keys go into the newest of up to `generations` Bloom filters, and a key
+    is seen if any generation holds it. The newest generation is replaced by
+    an empty one once it is `window` seconds old or holds `capacity` keys,
+    and the oldest is dropped, so keys are remembered for between
+    (generations - 1) and generations windows (less when more than capacity
+    keys arrive per window) and memory never grows past generations filters.
+    Each filter is sized for capacity keys at false_positive_rate /
+    generations, which keeps the chance that a new key looks seen below
+    false_positive_rate. save() and load() keep the generations across
+    restarts, with wall-clock ages.
+    """
+
+    def __init__(self, capacity: int = DEDUP_CAPACITY,
+                 false_positive_rate: float = DEDUP_FALSE_POSITIVE_RATE,
+                 window: float = DEDUP_WINDOW,
+                 generations: int = DEDUP_GENERATIONS):
+        if not 0.0 < false_positive_rate < 1.0:
+            raise ValueError("False positive rate must be between 0 and 1")
+        self.capacity = max(1, capacity)
+        self.false_positive_rate = false_positive_rate
+        self.window = window
+        self.generations = max(1, generations)
+
+        # Optimal size and hash count for one generation
+        rate = false_positive_rate / self.generations
+        bits = math.ceil(-self.capacity * math.log(rate) / math.log(2) ** 2)
+        self.num_bytes = (bits + 7) // 8
+        self.num_bits = self.num_bytes * 8
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+
+        # Newest first
+        self._generations: List[_Generation] = [self._new_generation()]
+        self._rotations = 0
+        self._added = 0
+
+    def _new_generation(self) -> _Generation:
+        return _Generation(bytearray(self.num_bytes), time.time())
+
+    def _indexes(self, key: str) -> List[int]:
+        # Double hashing: k indexes from the two halves of one digest
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        m = self.num_bits
+        return [(h1 + i * h2) % m for i in range(self.num_hashes)]
+
+    def _rotate(self):
+        newest = self._generations[0]
+        if newest.count < self.capacity and time.time() - newest.created < self.window:
+            return
+        self._generations.insert(0, self._new_generation())
+        del self._generations[self.generations:]
+        self._rotations += 1
+
+    def __contains__(self, key: str) -> bool:
+        indexes = self._indexes(key)
+        for generation in self._generations:
+            bits = generation.bits
+            if all(bits[i >> 3] & (1 << (i & 7)) for i in indexes):
+                return True
+        return False
+
+    def add(self, key: str):
+        self._rotate()
+        generation = self._generations[0]
+        bits = generation.bits
+        for i in self._indexes(key):
+            bits[i >> 3] |= 1 << (i & 7)
+        generation.count += 1
+        self._added += 1
+
+    # --- Persistence ---
+
+    def _header(self) -> Dict[str, Any]:
+        return {
+            "version": STATE_VERSION,
+            "bits": self.num_bits,
+            "hashes": self.num_hashes,
+            "generations": [{"created": g.created, "count": g.count}
+                            for g in self._generations]
+        }
+
+    def save(self, path: Path):
+        """Write the filter to path through a temporary file and a rename"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name("." + path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(json.dumps(self._header()).encode() + b"\n")
+            for generation in self._generations:
+                f.write(generation.bits)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def load(self, path: Path) -> bool:
+        """Restore generations saved by save(); False if there was nothing usable.
+
+        State saved with a different size or hash count, and generations
+        older than the filter remembers keys for, are discarded.
+        """
+        path = Path(path)
+        if not path.exists():
+            return False
+        try:
+            with open(path, "rb") as f:
+                header = json.loads(f.readline())
+                data = f.read()
+        except (OSError, ValueError) as e:
+            logger.error(f"Error reading dedup state {path}: {e}")
+            return False
+        saved = header.get("generations", [])
+        if header.get("version") != STATE_VERSION or header.get("bits") != self.num_bits \
+                or header.get("hashes") != self.num_hashes \
+                or len(data) != len(saved) * self.num_bytes:
+            logger.error(f"Dedup state {path} does not match the filter settings, ignoring it")
+            return False
+
+        oldest = time.time() - self.window * self.generations
+        generations = []
+        for index, generation in enumerate(saved[:self.generations]):
+            if generation["created"] < oldest:
+                break
+            bits = bytearray(data[index * self.num_bytes:(index + 1) * self.num_bytes])
+            generations.append(_Generation(bits, generation["created"], generation["count"]))
+        if not generations:
+            return False
+        self._generations = generations
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        return {
+            "capacity": self.capacity,
+            "false_positive_rate": self.false_positive_rate,
+            "window_seconds": self.window,
+            "generations": len(self._generations),
+            "generation_counts": [g.count for g in self._generations],
+            "oldest_generation_seconds": round(now - self._generations[-1].created, 1),
+            "hashes": self.num_hashes,
+            "memory_bytes": self.num_bytes * len(self._generations),
+            "added": self._added,
+            "rotations": self._rotations
+        }
+
+
+def benchmark(capacity: int = 200000, rates=(0.01, 0.001, 0.0001)) -> List[Dict[str, Any]]:
+    """Add and lookup cost and the measured false positive rate per target rate"""
+    import uuid
+
+    keys = [str(uuid.uuid4()) for _ in range(capacity)]
+    probes = [str(uuid.uuid4()) for _ in range(capacity)]
+    results = []
+    for rate in rates:
+        bloom = RollingBloomFilter(capacity, rate, window=3600, generations=DEDUP_GENERATIONS)
+        started = time.perf_counter()
+        for key in keys:
+            bloom.add(key)
+        add_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        false_positives = sum(key in bloom for key in probes)
+        lookup_seconds = time.perf_counter() - started
+        results.append({
+            "target_rate": rate,
+            "measured_rate": false_positives / len(probes),
+            "hashes": bloom.num_hashes,
+            "memory_bytes_per_generation": bloom.num_bytes,
+            "add_us": round(add_seconds / len(keys) * 1e6, 2),
+            "lookup_us": round(lookup_seconds / len(probes) * 1e6, 2)
+        })
+    return results
+
+
+if __name__ == "__main__":
+    print(json.dumps(benchmark(), indent=2))
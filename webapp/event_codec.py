@@ -0,0 +1,162 @@
+import json
+import os
+import time
+import typing
+from typing import Any, Dict, Tuple
+
+try:
+    import msgspec
+except ImportError:  # optional
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:  # optional
+    orjson = None
+
+# JSON library for event bodies on the ingest and publish paths. "auto"
+# picks the fastest one installed; all of them produce plain JSON, so
+# consumers are unaffected by the choice.
+EVENT_CODEC = os.getenv("EVENT_CODEC", "auto")  # auto | msgspec | orjson | json
+
+BACKENDS = ("auto", "msgspec", "orjson", "json")
+
+
+def _select_backend(name: str) -> str:
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown event codec {name!r}, expected one of {BACKENDS}")
+    if name == "auto":
+        return "orjson" if orjson else "msgspec" if msgspec else "json"
+    if (name == "orjson" and orjson is None) or (name == "msgspec" and msgspec is None):
+        print(f"{name} is not installed, encoding events with json")
+        return "json"
+    return name
+
+
+BACKEND = _select_backend(EVENT_CODEC)
+
+if BACKEND == "orjson":
+    loads = orjson.loads
+    dumps = orjson.dumps
+elif BACKEND == "msgspec":
+    _decoder = msgspec.json.Decoder()
+    _encoder = msgspec.json.Encoder()
+
+    def loads(data) -> Any:
+        try:
+            return _decoder.decode(data)
+        except msgspec.DecodeError as e:
+            # Callers handle malformed input as ValueError, as with json
+            raise ValueError(str(e)) from None
+
+    dumps = _encoder.encode
+else:
+    loads = json.loads
+
+    def dumps(obj: Any) -> bytes:
+        return json.dumps(obj, separators=(",", ":")).encode()
+
+
+class EventValidator:
+    """Type checks compiled from a pydantic model's fields.
+
+    The model stays the documented event schema; this checks a parsed dict
+    against it without building a model instance: required fields must be
+    present and every known field must have its declared type (None is
+    allowed for Optional fields). Fields the model does not list are passed
+    through, since trackers add their own (title, referrer, traits, ...).
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.required: Tuple[str, ...] = tuple(
+            name for name, field in model.model_fields.items() if field.is_required())
+        self.types: Dict[str, Tuple[type, bool]] = {}
+        for name, field in model.model_fields.items():
+            annotation = field.annotation
+            nullable = False
+            if typing.get_origin(annotation) is typing.Union:
+                args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+                nullable = len(args) < len(typing.get_args(annotation))
+                annotation = args[0] if len(args) == 1 else object
+            annotation = typing.get_origin(annotation) or annotation
+            if annotation is Any:
+                annotation = object
+            self.types[name] = (annotation, nullable)
+
+    def validate(self, event: Any) -> Dict[str, Any]:
+        """Return the event if it matches the model; raise ValueError otherwise"""
+        if not isinstance(event, dict):
+            raise ValueError("Event must be a JSON object")
+        for name in self.required:
+            if name not in event:
+                raise ValueError(f"Missing field {name!r}")
+        for name, (expected, nullable) in self.types.items():
+            value = event.get(name)
+            if value is None:
+                if nullable or name not in event:
+                    continue
+                raise ValueError(f"Field {name!r} must not be null")
+            if not isinstance(value, expected):
+                raise ValueError(
+                    f"Field {name!r} must be {expected.__name__}, got {type(value).__name__}")
+        return event
+
+
+def benchmark(iterations: int = 100000) -> Dict[str, Any]:
+    """Per-event CPU cost of parsing, validating, routing and encoding"""
+    from event_routing import route_event
+    from rabbitmq_analytics import AnalyticsEvent
+
+    body = json.dumps({
+        "type": "custom_event",
+        "event": "add_to_cart",
+        "timestamp": "2025-01-01T12:00:00.000Z",
+        "sessionId": "3f1c1a5e-8a1b-4b6e-9a55-2f1c9d1e7b10",
+        "queueName": "analytics_events",
+        "url": "http://localhost:8000/product/42",
+        "path": "/product/42",
+        "properties": {"product_id": "42", "name": "Gadget", "price": 49.99, "quantity": 1}
+    }).encode()
+    validator = EventValidator(AnalyticsEvent)
+
+    def legacy():
+        # The original path: stdlib json, list-literal routing, json.dumps
+        event = json.loads(body)
+        event["server_timestamp"] = "2025-01-01T12:00:00+00:00"
+        queue_name = event.get("queueName", "event_queue")
+        if event.get("type", "") == "page_view":
+            queue_name = "page_views"
+        elif event.get("type", "") in ["identify", "user_engagement", "logout"]:
+            queue_name = "user_events"
+        elif event.get("type", "") in ["purchase", "add_to_cart", "checkout", "product_view"]:
+            queue_name = "ecommerce_events"
+        return queue_name, json.dumps(event).encode()
+
+    def pydantic_model():
+        event = AnalyticsEvent.model_validate_json(body)
+        return event.model_dump_json(exclude_unset=True).encode()
+
+    def fast_path():
+        event = validator.validate(loads(body))
+        event["server_timestamp"] = "2025-01-01T12:00:00+00:00"
+        return route_event(event), dumps(event)
+
+    results = {"backend": BACKEND, "iterations": iterations}
+    for name, fn in (("legacy_json", legacy),
+                     ("pydantic_model", pydantic_model),
+                     ("fast_path", fast_path),
+                     ("loads", lambda: loads(body)),
+                     ("validate", lambda event=loads(body): validator.validate(event)),
+                     ("route", lambda event=loads(body): route_event(event)),
+                     ("dumps", lambda event=loads(body): dumps(event))):
+        started = time.process_time()
+        for _ in range(iterations):
+            fn()
+        results[f"{name}_us"] = round(
+            (time.process_time() - started) / iterations * 1e6, 3)
+    return results
+
+
+if __name__ == "__main__":
+    print(json.dumps(benchmark(), indent=2))
@@ -0,0 +1,40 @@
+import os
+from typing import Any, Dict
+
+# Queue for events no rule below matches (and no queueName was given for)
+DEFAULT_QUEUE = os.getenv("RABBITMQ_QUEUE", "event_queue")
+
+# The one routing table for every producer: the ingest endpoints, /simulate
+# and the Celery traffic generator. Typed events route by their type, custom
+# events by their event name (see event_name).
+EVENT_QUEUES: Dict[str, str] = {
+    "page_view": "page_views",
+    "identify": "user_events",
+    "user_engagement": "user_events",
+    "logout": "user_events",
+    "product_view": "ecommerce_events",
+    "add_to_cart": "ecommerce_events",
+    "begin_checkout": "ecommerce_events",
+    "checkout": "ecommerce_events",
+    "purchase": "ecommerce_events",
+    "checkout_error": "ecommerce_events",
+}
+
+# Queues the webapp declares and samples
+QUEUE_NAMES = [DEFAULT_QUEUE, *sorted(set(EVENT_QUEUES.values()))]
+
+
+def event_name(event: Dict[str, Any]) -> str:
+    """Type of an event; custom events are known by their event name"""
+    name = event.get("type", "unknown")
+    if name == "custom_event" and "event" in event:
+        name = event["event"]
+    return name
+
+
+def route_event(event: Dict[str, Any]) -> str:
+    """Queue an event is published to"""
+    queue_name = EVENT_QUEUES.get(event_name(event))
+    if queue_name is None:
+        queue_name = event.get("queueName") or DEFAULT_QUEUE
+    return queue_name
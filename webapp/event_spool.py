@@ -0,0 +1,446 @@
+import asyncio
+import fcntl
+import mmap
+import os
+import struct
+import time
+import zlib
+from collections import deque
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+# Spool configuration
+SPOOL_ENABLED = os.getenv("SPOOL_ENABLED", "true").lower() in ("1", "true", "yes")
+SPOOL_DIR = os.getenv("SPOOL_DIR", "/tmp/gadgetgrove_spool")
+SPOOL_SEGMENT_BYTES = int(os.getenv("SPOOL_SEGMENT_BYTES", 16 * 1024 * 1024))
+SPOOL_MAX_BYTES = int(os.getenv("SPOOL_MAX_BYTES", 1024 * 1024 * 1024))
+SPOOL_REPLAY_BATCH = int(os.getenv("SPOOL_REPLAY_BATCH", 2000))
+SPOOL_REPLAY_RATE = float(os.getenv("SPOOL_REPLAY_RATE", 10000))  # events/s
+SPOOL_FLUSH_INTERVAL = float(os.getenv("SPOOL_FLUSH_INTERVAL", 1.0))  # seconds
+
+# Record: payload length, crc32 of payload, queue name length; then the
+# queue name and the body. A zero length marks the end of a segment.
+_HEADER = struct.Struct("<IIH")
+_CURSOR_FILE = "cursor"
+_LOCK_FILE = "lock"
+
+
+class _Segment:
+    """One preallocated, memory-mapped segment file"""
+
+    def __init__(self, path: Path, seq: int, size: int, create: bool):
+        self.path = path
+        self.seq = seq
+        mode = "w+b" if create else "r+b"
+        self._file = open(path, mode)
+        if create:
+            self._file.truncate(size)
+        self.size = os.fstat(self._file.fileno()).st_size
+        self.map = mmap.mmap(self._file.fileno(), self.size)
+        self.write_pos = 0
+        self.read_pos = 0
+        self.records = 0
+        self.sealed = not create
+        if not create:
+            self.write_pos, self.records = self._scan()
+
+    def _scan(self) -> Tuple[int, int]:
+        """Find the end of the valid records left by a previous run"""
+        pos = 0
+        records = 0
+        while pos + _HEADER.size <= self.size:
+            length, crc, queue_len = _HEADER.unpack_from(self.map, pos)
+            end = pos + _HEADER.size + length
+            if length == 0 or end > self.size:
+                break
+            if zlib.crc32(self.map[pos + _HEADER.size:end]) != crc:
+                # Torn write at the tail; everything before it is good
+                break
+            pos = end
+            records += 1
+        return pos, records
+
+    def room(self) -> int:
+        return self.size - self.write_pos
+
+    def append(self, queue_name: bytes, body: bytes):
+        payload_len = len(queue_name) + len(body)
+        start = self.write_pos + _HEADER.size
+        self.map[start:start + len(queue_name)] = queue_name
+        self.map[start + len(queue_name):start + payload_len] = body
+        crc = zlib.crc32(self.map[start:start + payload_len])
+        # Header last, so a crash mid-record leaves a zero length behind
+        _HEADER.pack_into(self.map, self.write_pos, payload_len, crc, len(queue_name))
+        self.write_pos = start + payload_len
+        self.records += 1
+
+    def read(self, limit: int) -> Tuple[List[Tuple[str, bytes]], int]:
+        """Up to limit records from read_pos, and the position after them"""
+        messages = []
+        pos = self.read_pos
+        while len(messages) < limit and pos < self.write_pos:
+            length, _, queue_len = _HEADER.unpack_from(self.map, pos)
+            start = pos + _HEADER.size
+            queue_name = self.map[start:start + queue_len].decode()
+            messages.append((queue_name, self.map[start + queue_len:start + length]))
+            pos = start + length
+        return messages, pos
+
+    def flush(self):
+        self.map.flush()
+
+    def close(self):
+        self.map.close()
+        self._file.close()
+
+
+class EventSpool:
+    """Append-only overflow spool of memory-mapped segment files.
+
+    Takes events the publisher cannot hand to RabbitMQ: the broker is down,
+    a publish failed, or the in-memory buffer is full. Appending is a copy
+    into a preallocated mmap, so ingest latency stays flat while the broker
+    restarts. A replay task drains the spool oldest first, in large batches
+    at up to replay_rate events per second, once publishing works again;
+    fully replayed segments are deleted and the read position is saved in a
+    cursor file, so a restart resumes where replay stopped (replay is at
+    least once: a batch in flight during a crash is sent again).
+
+    Every process spools into its own worker-* directory under the spool
+    directory and holds an exclusive flock on it while open. A starting
+    process takes over a directory no live process holds (one left by a
+    worker that exited), and copies the pending events of any further
+    unheld directories into its own spool before removing them.
+    """
+
+    def __init__(self, directory: str = SPOOL_DIR,
+                 segment_bytes: int = SPOOL_SEGMENT_BYTES,
+                 max_bytes: int = SPOOL_MAX_BYTES,
+                 replay_batch: int = SPOOL_REPLAY_BATCH,
+                 replay_rate: float = SPOOL_REPLAY_RATE,
+                 flush_interval: float = SPOOL_FLUSH_INTERVAL):
+        self.root = Path(directory)
+        self.directory: Optional[Path] = None
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.replay_batch = replay_batch
+        self.replay_rate = replay_rate
+        self.flush_interval = flush_interval
+
+        self._segments = deque()  # oldest first; the last one takes appends
+        self._next_seq = 0
+        self._task = None
+        self._opened = False
+        self._lock = None
+
+        self._spooled = 0
+        self._replayed = 0
+        self._rejected = 0
+        self._errors = 0
+        self._recovered = 0
+        self._adopted = 0
+        self._recent = deque(maxlen=32)  # (monotonic, replayed) per batch
+
+    # --- Segments ---
+
+    def _segment_path(self, seq: int) -> Path:
+        return self.directory / f"segment-{seq:012d}.spool"
+
+    @staticmethod
+    def _try_lock(directory: Path):
+        """The directory's lock file, flocked, or None if another process holds it"""
+        try:
+            lock = open(directory / _LOCK_FILE, "a+b")
+        except OSError:
+            return None
+        try:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock.close()
+            return None
+        return lock
+
+    @staticmethod
+    def _read_cursor(directory: Path) -> Tuple[int, int]:
+        cursor_path = directory / _CURSOR_FILE
+        if cursor_path.exists():
+            try:
+                cursor_seq, cursor_pos = map(int, cursor_path.read_text().split())
+                return cursor_seq, cursor_pos
+            except ValueError:
+                pass
+        return -1, 0
+
+    def open(self):
+        """Claim a spool directory and recover what a previous run left in it"""
+        if self._opened:
+            return
+        self.root.mkdir(parents=True, exist_ok=True)
+        # Directories of exited processes, plus segments spooled straight
+        # into the root by older versions
+        unheld = []
+        for directory in [self.root] + sorted(self.root.glob("worker-*")):
+            if directory.is_dir():
+                lock = self._try_lock(directory)
+                if lock is not None:
+                    unheld.append((directory, lock))
+        own = next(((d, lock) for d, lock in unheld if d != self.root), None)
+        attempt = 0
+        while own is None:
+            # Another process starting up may lock the new directory first
+            directory = self.root / f"worker-{os.getpid()}-{attempt}"
+            attempt += 1
+            directory.mkdir(exist_ok=True)
+            lock = self._try_lock(directory)
+            if lock is not None:
+                own = (directory, lock)
+        self.directory, self._lock = own
+
+        cursor_seq, cursor_pos = self._read_cursor(self.directory)
+        for path in sorted(self.directory.glob("segment-*.spool")):
+            seq = int(path.stem.split("-")[1])
+            self._next_seq = max(self._next_seq, seq + 1)
+            if seq < cursor_seq or path.stat().st_size == 0:
+                path.unlink()
+                continue
+            segment = _Segment(path, seq, 0, create=False)
+            if seq == cursor_seq:
+                segment.read_pos = min(cursor_pos, segment.write_pos)
+            if segment.read_pos >= segment.write_pos:
+                segment.close()
+                path.unlink()
+                continue
+            self._recovered += segment.records
+            self._segments.append(segment)
+        self._opened = True
+
+        for directory, lock in unheld:
+            if directory != self.directory:
+                try:
+                    self._adopt(directory)
+                finally:
+                    lock.close()
+
+    def _adopt(self, directory: Path):
+        """Copy the pending events of an unheld directory into this spool.
+
+        What does not fit stays behind, with its cursor, for a later start.
+        """
+        cursor_seq, cursor_pos = self._read_cursor(directory)
+        for path in sorted(directory.glob("segment-*.spool")):
+            seq = int(path.stem.split("-")[1])
+            if seq < cursor_seq or path.stat().st_size == 0:
+                path.unlink()
+                continue
+            segment = _Segment(path, seq, 0, create=False)
+            if seq == cursor_seq:
+                segment.read_pos = min(cursor_pos, segment.write_pos)
+            try:
+                while segment.read_pos < segment.write_pos:
+                    messages, end = segment.read(self.replay_batch)
+                    if not self.append(messages):
+                        tmp = directory / (_CURSOR_FILE + ".tmp")
+                        tmp.write_text(f"{seq} {segment.read_pos}")
+                        os.replace(tmp, directory / _CURSOR_FILE)
+                        return
+                    segment.read_pos = end
+                    self._adopted += len(messages)
+            finally:
+                segment.close()
+            path.unlink()
+        if directory != self.root:
+            for name in (_CURSOR_FILE, _LOCK_FILE):
+                try:
+                    (directory / name).unlink()
+                except FileNotFoundError:
+                    pass
+            try:
+                directory.rmdir()
+            except OSError:
+                pass
+        else:
+            try:
+                (directory / _CURSOR_FILE).unlink()
+            except FileNotFoundError:
+                pass
+
+    def _writable(self, needed: int) -> Optional[_Segment]:
+        active = self._segments[-1] if self._segments else None
+        if active is not None and not active.sealed and active.room() >= needed:
+            return active
+        if self.size_bytes() + max(needed, self.segment_bytes) > self.max_bytes:
+            return None
+        if active is not None and not active.sealed:
+            active.sealed = True
+            active.flush()
+        segment = _Segment(self._segment_path(self._next_seq), self._next_seq,
+                           max(needed, self.segment_bytes), create=True)
+        self._next_seq += 1
+        self._segments.append(segment)
+        return segment
+
+    def _fits(self, sizes: List[int]) -> bool:
+        """Whether records of these sizes all fit, placed the way _writable() places them"""
+        active = self._segments[-1] if self._segments else None
+        room = active.room() if active is not None and not active.sealed else 0
+        total = self.size_bytes()
+        for size in sizes:
+            if size <= room:
+                room -= size
+                continue
+            segment_size = max(size, self.segment_bytes)
+            total += segment_size
+            if total > self.max_bytes:
+                return False
+            room = segment_size - size
+        return True
+
+    def append(self, messages: List[Tuple[str, bytes]]) -> bool:
+        """Spool encoded (queue_name, body) pairs; all or nothing.
+
+        Returns False, having written nothing, if the spool is not open or
+        the whole batch does not fit.
+        """
+        if not self._opened:
+            self._rejected += len(messages)
+            return False
+        records = [(queue_name.encode(), body) for queue_name, body in messages]
+        sizes = [_HEADER.size + len(q) + len(b) for q, b in records]
+        if not self._fits(sizes):
+            self._rejected += len(messages)
+            return False
+        for (queue_name, body), size in zip(records, sizes):
+            self._writable(size).append(queue_name, body)
+            self._spooled += 1
+        return True
+
+    def size_bytes(self) -> int:
+        return sum(segment.size for segment in self._segments)
+
+    def pending(self) -> bool:
+        return any(s.read_pos < s.write_pos for s in self._segments)
+
+    def _save_cursor(self, segment: _Segment):
+        tmp = self.directory / (_CURSOR_FILE + ".tmp")
+        tmp.write_text(f"{segment.seq} {segment.read_pos}")
+        os.replace(tmp, self.directory / _CURSOR_FILE)
+
+    def _retire(self, segment: _Segment):
+        self._segments.remove(segment)
+        segment.close()
+        try:
+            segment.path.unlink()
+        except FileNotFoundError:
+            pass
+
+    # --- Replay ---
+
+    async def replay_once(self, publish: Callable[[List[Tuple[str, bytes]]], Awaitable[List[Any]]]) -> int:
+        """Publish one batch from the oldest segment; returns events replayed"""
+        if not self._segments:
+            return 0
+        segment = self._segments[0]
+        messages, end = segment.read(self.replay_batch)
+        if not messages:
+            if segment.sealed or segment is not self._segments[-1]:
+                self._retire(segment)
+            return 0
+
+        outcomes = await publish(messages)
+        failed = sum(outcome is not None for outcome in outcomes)
+        if failed:
+            # Keep the batch; it is retried from the same position
+            raise RuntimeError(f"{failed} of {len(messages)} spooled events not published")
+
+        segment.read_pos = end
+        self._replayed += len(messages)
+        self._recent.append((time.monotonic(), len(messages)))
+        if segment.read_pos >= segment.write_pos and (
+                segment.sealed or segment is not self._segments[-1]):
+            self._retire(segment)
+            if self._segments:
+                self._save_cursor(self._segments[0])
+        else:
+            self._save_cursor(segment)
+        return len(messages)
+
+    async def _run(self, publish, ready: Callable[[], bool]):
+        backoff = 0.0
+        last_flush = time.monotonic()
+        while True:
+            now = time.monotonic()
+            if now - last_flush >= self.flush_interval:
+                last_flush = now
+                active = self._segments[-1] if self._segments else None
+                if active is not None and not active.sealed:
+                    await asyncio.to_thread(active.flush)
+
+            if not self.pending() or not ready():
+                await asyncio.sleep(min(self.flush_interval, 0.5))
+                continue
+
+            try:
+                replayed = await self.replay_once(publish)
+                backoff = 0.0
+            except Exception as e:
+                self._errors += 1
+                backoff = min(10.0, max(0.5, backoff * 2))
+                print(f"Error replaying spool: {e}")
+                await asyncio.sleep(backoff)
+                continue
+            # Rate limit: a batch of n events earns n / rate seconds
+            if replayed and self.replay_rate > 0:
+                await asyncio.sleep(replayed / self.replay_rate)
+
+    def start(self, publish, ready: Callable[[], bool]):
+        """Start replaying through publish whenever ready() says the broker is up"""
+        self.open()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(publish, ready))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for segment in list(self._segments):
+            segment.flush()
+            segment.close()
+        self._segments.clear()
+        self._opened = False
+        if self._lock is not None:
+            self._lock.close()
+            self._lock = None
+
+    def stats(self) -> Dict[str, Any]:
+        pending = 0
+        for segment in self._segments:
+            # Approximate for the current segment: records are not indexed
+            if segment.write_pos:
+                unread = (segment.write_pos - segment.read_pos) / segment.write_pos
+                pending += round(segment.records * unread)
+
+        replay_rate = 0.0
+        if len(self._recent) >= 2:
+            elapsed = self._recent[-1][0] - self._recent[0][0]
+            if elapsed > 0:
+                replay_rate = sum(n for _, n in list(self._recent)[1:]) / elapsed
+
+        return {
+            "segments": len(self._segments),
+            "size_bytes": self.size_bytes(),
+            "max_bytes": self.max_bytes,
+            "pending_events": pending,
+            "spooled": self._spooled,
+            "replayed": self._replayed,
+            "recovered": self._recovered,
+            "adopted": self._adopted,
+            "directory": str(self.directory) if self.directory else None,
+            "rejected": self._rejected,
+            "errors": self._errors,
+            "replay_rate": round(replay_rate, 1),
+            "replay_rate_limit": self.replay_rate
+        }
@@ -2,6 +2,7 @@
 
 # Correctly import the app instance from the celery_app module within the package
 from gadget_celery.app import app
+from event_routing import EVENT_QUEUES
 import os
 import random
 import requests
@@ -27,18 +28,8 @@ logger.level = logging.INFO
 WEBAPP_URL = os.getenv("WEBAPP_URL", "http://webapp:8000")
 MAX_WORKERS = int(os.getenv("MAX_WORKERS", 10))
 
-# RabbitMQ queues
-QUEUES = {
-    "page_view": "page_views",
-    "identify": "user_events",
-    "logout": "user_events",
-    "user_engagement": "user_events",
-    "add_to_cart": "ecommerce_events",
-    "purchase": "ecommerce_events",
-    "product_view": "ecommerce_events",
-    "checkout_error": "ecommerce_events",
-    "begin_checkout": "ecommerce_events"
-}
+# RabbitMQ queues, shared with the webapp's ingest and /simulate routing
+QUEUES = EVENT_QUEUES
 
 # ---- Traffic Generation Tasks ----
 
@@ -69,6 +60,28 @@ def generate_traffic(num_sessions=1):
     return f"Successfully generated {successful_sessions} of {num_sessions} user sessions"
 
 
+@app.task(name="traffic.generate_bulk_traffic")
+def generate_bulk_traffic(num_sessions=1000):
+    """Generate many sessions in one /simulate call for capacity tests"""
+    logger.info(f"Generating {num_sessions} simulated user sessions (bulk API)")
+
+    try:
+        response = requests.get(
+            f"{WEBAPP_URL}/simulate", params={"sessions": num_sessions})
+        data = response.json()
+        if response.status_code != 200 or data.get("status") != "simulated":
+            logger.error(f"Failed to generate bulk sessions: {response.text}")
+            return f"Failed to generate {num_sessions} user sessions"
+    except Exception as e:
+        logger.error(f"Error generating bulk traffic: {e}")
+        return f"Failed to generate {num_sessions} user sessions"
+
+    logger.info(
+        f"Published {data['published']} events for {data['sessions']} sessions "
+        f"in {data['elapsed_seconds']}s")
+    return f"Successfully generated {num_sessions} user sessions ({data['published']} events)"
+
+
 @app.task(name="traffic.simulate_browser_sessions")
 def simulate_browser_sessions(num_sessions=1):
     """Simulate browser sessions using Playwright asynchronously"""
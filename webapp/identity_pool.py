@@ -0,0 +1,212 @@
+import json
+import os
+import random
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from faker import Faker
+
+# Identity pool configuration
+IDENTITY_POOL_SIZE = int(os.getenv("IDENTITY_POOL_SIZE", 5000))
+# Identities replaced per refill pass, once that many have been handed out
+IDENTITY_POOL_REFILL_BATCH = int(os.getenv("IDENTITY_POOL_REFILL_BATCH", 250))
+# Optional file the pool is loaded from at startup and saved to on shutdown
+IDENTITY_POOL_PATH = os.getenv("IDENTITY_POOL_PATH", "")
+
+# Generated synchronously when there is nothing to load, so the first
+# sessions never wait for the background fill
+_WARM_START = 256
+
+
+def generate_identity(fake: Faker) -> Dict[str, str]:
+    """One synthetic user, as create_session used to build it inline"""
+    name = fake.name()
+    return {
+        "name": name,
+        "email": name.replace(" ", ".").lower() + "@example.com",
+        "address": fake.address(),
+        "payment_card": fake.credit_card_full()
+    }
+
+
+class IdentityPool:
+    """Pre-generated synthetic identities for new sessions.
+
+    take() picks a random slot from a fixed-size list, so it is O(1) and
+    never calls Faker. A background thread keeps the pool fresh: it fills
+    the pool up to size after startup, then overwrites the oldest slots in
+    batches as identities are handed out, so repeats stay rare without
+    Faker ever running on the request path.
+    """
+
+    def __init__(self, size: int = IDENTITY_POOL_SIZE,
+                 refill_batch: int = IDENTITY_POOL_REFILL_BATCH,
+                 path: Optional[str] = IDENTITY_POOL_PATH or None,
+                 seed: Optional[int] = None):
+        self.size = max(1, size)
+        self.refill_batch = max(1, refill_batch)
+        self.path = Path(path) if path else None
+
+        self._fake = Faker()
+        if seed is not None:
+            self._fake.seed_instance(seed)
+        self._identities: List[Dict[str, str]] = []
+        self._next_slot = 0  # oldest slot, overwritten by the next refill
+
+        self._taken_since_refill = 0
+        self._taken = 0
+        self._generated = 0
+        self._refills = 0
+        self._fallbacks = 0
+
+        self._thread = None
+        self._wakeup = threading.Event()
+        self._stop_event = threading.Event()
+
+    def take(self) -> Dict[str, str]:
+        """A random identity; the caller gets its own copy"""
+        identities = self._identities
+        if not identities:
+            # Only before start() has run
+            self._fallbacks += 1
+            return generate_identity(self._fake)
+
+        identity = identities[random.randrange(len(identities))]
+        self._taken += 1
+        self._taken_since_refill += 1
+        if self._taken_since_refill >= self.refill_batch:
+            self._wakeup.set()
+        return dict(identity)
+
+    def _generate(self, count: int) -> List[Dict[str, str]]:
+        identities = [generate_identity(self._fake) for _ in range(count)]
+        self._generated += count
+        return identities
+
+    def load(self) -> int:
+        """Load identities saved by a previous run, returning how many"""
+        if not self.path or not self.path.exists():
+            return 0
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                rows = json.load(f)
+        except Exception as e:
+            print(f"Error loading identity pool: {e}")
+            return 0
+        # Stored as [name, email, address, payment_card] rows
+        keys = ("name", "email", "address", "payment_card")
+        self._identities = [dict(zip(keys, row))
+                            for row in rows[:self.size]]
+        return len(self._identities)
+
+    def save(self):
+        if not self.path:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump([[i["name"], i["email"], i["address"], i["payment_card"]]
+                           for i in self._identities], f, separators=(",", ":"))
+            os.replace(tmp, self.path)
+        except Exception as e:
+            print(f"Error saving identity pool: {e}")
+
+    def _fill(self):
+        """Grow the pool to full size, a batch at a time"""
+        while len(self._identities) < self.size and not self._stop_event.is_set():
+            count = min(self.refill_batch, self.size - len(self._identities))
+            # Rebind rather than extend so take() always sees a complete list
+            self._identities = self._identities + self._generate(count)
+
+    def _refill(self):
+        """Overwrite the oldest batch of slots with fresh identities"""
+        self._taken_since_refill = 0
+        fresh = self._generate(min(self.refill_batch, self.size))
+        for identity in fresh:
+            self._identities[self._next_slot] = identity
+            self._next_slot = (self._next_slot + 1) % len(self._identities)
+        self._refills += 1
+
+    def _run(self):
+        try:
+            self._fill()
+        except Exception as e:
+            print(f"Error filling identity pool: {e}")
+        while not self._stop_event.is_set():
+            self._wakeup.wait(timeout=5)
+            self._wakeup.clear()
+            if self._stop_event.is_set():
+                break
+            if self._taken_since_refill >= self.refill_batch:
+                try:
+                    self._refill()
+                except Exception as e:
+                    print(f"Error refilling identity pool: {e}")
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        if not self._identities and not self.load():
+            self._identities = self._generate(min(_WARM_START, self.size))
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="identity-pool", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5):
+        self._stop_event.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+        self.save()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": len(self._identities),
+            "capacity": self.size,
+            "taken": self._taken,
+            "generated": self._generated,
+            "refills": self._refills,
+            "fallbacks": self._fallbacks,
+            "pending_refill": self._taken_since_refill
+        }
+
+
+def benchmark(iterations: int = 5000) -> Dict[str, Any]:
+    """Latency of building a session identity inline with Faker vs. from the pool"""
+    def percentiles(samples):
+        samples = sorted(samples)
+        return {
+            "p50_us": round(samples[len(samples) // 2] * 1e6, 1),
+            "p99_us": round(samples[int(len(samples) * 0.99)] * 1e6, 1),
+            "max_us": round(samples[-1] * 1e6, 1)
+        }
+
+    fake = Faker()
+    inline = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        generate_identity(fake)
+        inline.append(time.perf_counter() - started)
+
+    pool = IdentityPool(path=None)
+    pool.start()
+    while len(pool._identities) < pool.size:
+        time.sleep(0.05)
+    pooled = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        pool.take()
+        pooled.append(time.perf_counter() - started)
+    pool.stop()
+
+    return {"iterations": iterations, "faker": percentiles(inline),
+            "pool": percentiles(pooled)}
+
+
+if __name__ == "__main__":
+    print(json.dumps(benchmark(), indent=2))
@@ -0,0 +1,136 @@
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from event_routing import event_name
+
+# Ingest sampling: per-event-type keep rates, e.g.
+# "user_engagement=0.1,page_view=0.5"; unlisted types are kept at the default
+INGEST_SAMPLE_RATES = os.getenv("INGEST_SAMPLE_RATES", "")
+INGEST_DEFAULT_SAMPLE_RATE = float(os.getenv("INGEST_DEFAULT_SAMPLE_RATE", 1.0))
+# Ingest rate limiting: token bucket per session (or client IP); 0 disables it
+INGEST_RATE_LIMIT = float(os.getenv("INGEST_RATE_LIMIT", 20))  # events/s
+INGEST_RATE_BURST = float(os.getenv("INGEST_RATE_BURST", 100))  # events
+INGEST_RATE_LIMIT_KEY = os.getenv("INGEST_RATE_LIMIT_KEY", "session")  # session | ip
+INGEST_RATE_LIMIT_KEYS = int(os.getenv("INGEST_RATE_LIMIT_KEYS", 100000))  # buckets kept
+
+LIMIT_KEYS = ("session", "ip")
+
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+    """Parse "type=rate,type=rate" into a dict of rates in [0, 1]"""
+    rates = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        event_type, _, rate = item.partition("=")
+        value = float(rate)
+        if not 0.0 <= value <= 1.0:
+            raise ValueError(f"Sample rate for {event_type.strip()!r} must be in [0, 1]")
+        rates[event_type.strip()] = value
+    return rates
+
+
+def session_fraction(key: str) -> float:
+    """Stable position of a key in [0, 1), the same in every process"""
+    digest = hashlib.blake2b(key.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") / 2 ** 64
+
+
+class IngestSampler:
+    """Sampling and rate limiting applied to events before they are routed.
+
+    Sampling is deterministic per session: the session id hashes to a fixed
+    fraction, and an event is kept when that fraction is below its type's
+    rate, so a session is either fully kept or fully dropped for a type
+    (and a session kept at 0.1 is also kept at 0.5). Kept events carry
+    sample_weight = 1 / rate for the dbt models to re-weight counts.
+    Kept events then spend a token from their session's (or client IP's)
+    bucket; events over the limit are dropped without changing the weight,
+    since they are a client misbehaving rather than a sample.
+    """
+
+    def __init__(self, sample_rates: Optional[Dict[str, float]] = None,
+                 default_rate: float = INGEST_DEFAULT_SAMPLE_RATE,
+                 rate_limit: float = INGEST_RATE_LIMIT,
+                 burst: float = INGEST_RATE_BURST,
+                 limit_key: str = INGEST_RATE_LIMIT_KEY,
+                 max_keys: int = INGEST_RATE_LIMIT_KEYS):
+        if limit_key not in LIMIT_KEYS:
+            raise ValueError(
+                f"Unknown rate limit key {limit_key!r}, expected one of {LIMIT_KEYS}")
+        if sample_rates is None:
+            sample_rates = parse_sample_rates(INGEST_SAMPLE_RATES)
+        self.sample_rates = sample_rates
+        self.default_rate = default_rate
+        self.rate_limit = rate_limit
+        self.burst = max(burst, 1.0)
+        self.limit_key = limit_key
+        self.max_keys = max_keys
+
+        # key -> [tokens, last refill]; least recently seen first
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+
+        self._kept = 0
+        self._sampled_out: Dict[str, int] = {}
+        self._rate_limited = 0
+        self._evicted = 0
+
+    @staticmethod
+    def _session_key(event: Dict[str, Any]) -> str:
+        return str(event.get("sessionId") or event.get("client_ip") or "")
+
+    def _take_token(self, key: str, now: float) -> bool:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = [self.burst, now]
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+                self._evicted += 1
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate_limit)
+            bucket[1] = now
+        if bucket[0] < 1.0:
+            return False
+        bucket[0] -= 1.0
+        return True
+
+    def admit(self, event: Dict[str, Any]) -> Optional[str]:
+        """Stamp sample_weight on a kept event; otherwise return why it was dropped"""
+        event_type = event_name(event)
+        rate = self.sample_rates.get(event_type, self.default_rate)
+        if rate < 1.0:
+            if rate <= 0.0 or session_fraction(self._session_key(event)) >= rate:
+                self._sampled_out[event_type] = self._sampled_out.get(event_type, 0) + 1
+                return "sampled"
+
+        if self.rate_limit > 0:
+            if self.limit_key == "ip":
+                key = str(event.get("client_ip", ""))
+            else:
+                key = self._session_key(event)
+            if not self._take_token(key, time.monotonic()):
+                self._rate_limited += 1
+                return "rate_limited"
+
+        event["sample_weight"] = 1.0 / rate if rate < 1.0 else 1.0
+        self._kept += 1
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sample_rates": self.sample_rates,
+            "default_rate": self.default_rate,
+            "rate_limit": self.rate_limit,
+            "burst": self.burst,
+            "limit_key": self.limit_key,
+            "kept": self._kept,
+            "sampled_out": sum(self._sampled_out.values()),
+            "sampled_out_by_type": dict(self._sampled_out),
+            "rate_limited": self._rate_limited,
+            "tracked_keys": len(self._buckets),
+            "evicted_keys": self._evicted
+        }
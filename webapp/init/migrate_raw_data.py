@@ -0,0 +1,43 @@
+"""Bring raw_data tables created by older init scripts up to date.
+
+postgres/init-scripts only runs on an empty volume, so columns added since
+are added here; every statement is idempotent and runs on each start.
+"""
+import os
+
+import psycopg2
+
+POSTGRES_HOST = os.getenv("POSTGRES_HOST", "postgres-db")
+POSTGRES_PORT = os.getenv("POSTGRES_PORT", "5432")
+POSTGRES_USER = os.getenv("POSTGRES_USER", "postgres")
+POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD", "postgres")
+POSTGRES_DB = os.getenv("POSTGRES_DB", "events")
+
+TABLES = ["page_views", "user_events", "ecommerce_events", "analytics_events", "event_queue"]
+
+# Columns added after the first release of the init script
+COLUMNS = [
+    ("sample_weight", "DOUBLE PRECISION DEFAULT 1"),
+    ("event_id", "VARCHAR(64)"),
+]
+
+
+def main():
+    connection = psycopg2.connect(
+        host=POSTGRES_HOST, port=POSTGRES_PORT, user=POSTGRES_USER,
+        password=POSTGRES_PASSWORD, dbname=POSTGRES_DB)
+    try:
+        with connection.cursor() as cursor:
+            for table in TABLES:
+                for column, definition in COLUMNS:
+                    cursor.execute(
+                        f"ALTER TABLE IF EXISTS raw_data.{table} "
+                        f"ADD COLUMN IF NOT EXISTS {column} {definition}")
+        connection.commit()
+    finally:
+        connection.close()
+    print(f"raw_data tables migrated: {', '.join(TABLES)}")
+
+
+if __name__ == "__main__":
+    main()
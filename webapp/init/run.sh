@@ -24,6 +24,10 @@ for QUEUE in "$RABBITMQ_QUEUE" "page_views" "user_events" "ecommerce_events" "an
 done
 echo "RabbitMQ queues ensured."
 
+# Add columns introduced since the database volume was created
+echo "Migrating raw_data tables..."
+python3 init/migrate_raw_data.py
+
 # Prefect Deployment Setup
 echo "Ensuring Prefect process work pool '$WORK_POOL' exists..."
 if prefect work-pool inspect "$WORK_POOL" >/dev/null 2>&1; then
@@ -1,19 +1,31 @@
 from rabbitmq_analytics import analytics_router, initialize_rabbitmq, close_rabbitmq
+import rabbitmq_analytics
+from event_routing import route_event
+from bulk_simulation import BulkSessionSimulator, SIMULATE_MAX_SESSIONS, to_ndjson
+from checkout_journal import CheckoutJournal
+from identity_pool import IdentityPool
+from catalog import CatalogSnapshot, ColumnarCatalog, SORT_FIELDS
+from render_cache import ShellRenderCache, slot
+from session_store import SessionStore, SESSION_STORE_MAX_SESSIONS
+from shared_state import SQLiteSessionStore, SharedCatalog, SHARED_STATE_BACKEND, SHARED_STATE_PATH
 from pathlib import Path
 from datetime import datetime, UTC, timedelta
-from fastapi import FastAPI, Request, Form, Response, Cookie, Depends
-from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
+from fastapi import FastAPI, Request, Form, Response, Cookie, Depends, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
-from faker import Faker
+import asyncio
 import json
+import logging
 import uuid
 import random
 import secrets
 import os
+import threading
+import time
 import aio_pika
-import pika
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
 from contextlib import asynccontextmanager
@@ -23,6 +35,8 @@ from ddtrace import patch_all, tracer
 patch_all()
 tracer.set_tags({"service.name": "gadgetgrove-webapp"})
 
+logger = logging.getLogger(__name__)
+
 
 # Import the RabbitMQ analytics router
 
@@ -34,12 +48,19 @@ async def lifespan(app: FastAPI):
     # Startup
     global rabbitmq_channel
     rabbitmq_channel = await initialize_rabbitmq()
+    IDENTITY_POOL.start()
+    USER_SESSIONS.start_sweeper()
+    CHECKOUT_JOURNAL.start()
     yield
     # Shutdown
+    CHECKOUT_JOURNAL.stop()
+    IDENTITY_POOL.stop()
+    USER_SESSIONS.stop_sweeper()
     await close_rabbitmq()
 
 app = FastAPI(lifespan=lifespan)
 templates = Jinja2Templates(directory="templates")
+SHOP_RENDER_CACHE = ShellRenderCache(templates.env, "shop.html")
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 # Include the analytics router
@@ -90,12 +111,38 @@ CATEGORIES = {
     }
 }
 
+# Catalog size: unset keeps the small 3-5 products per category demo catalog
+CATALOG_PRODUCTS_PER_CATEGORY = int(
+    os.getenv("CATALOG_PRODUCTS_PER_CATEGORY", 0)) or None
+# Products per category rendered into the shop UI
+STOREFRONT_PRODUCTS_PER_CATEGORY = int(
+    os.getenv("STOREFRONT_PRODUCTS_PER_CATEGORY", 24))
+PRODUCTS_PAGE_SIZE = 50
+PRODUCTS_MAX_PAGE_SIZE = 500
+
 # Create persistent but fake databases for the session
-PRODUCT_DB = []
-USER_SESSIONS = {}  # Store active user sessions
+PRODUCT_DB = None  # ColumnarCatalog
+CATALOG_SNAPSHOT = None  # Pre-serialized view of PRODUCT_DB
+_CATALOG_LOCK = threading.Lock()
 SESSION_COOKIE_NAME = "gadgetgrove_session"
 SESSION_EXPIRY = 30  # minutes
 
+# Store active user sessions (expired entries are swept in the background).
+# With the sqlite backend, sessions and the catalog are shared by all
+# uvicorn workers on the host.
+if SHARED_STATE_BACKEND == "sqlite":
+    USER_SESSIONS = SQLiteSessionStore(
+        SHARED_STATE_PATH,
+        ttl_seconds=SESSION_EXPIRY * 60,
+        max_sessions=SESSION_STORE_MAX_SESSIONS,
+        dumps=lambda session: session.model_dump_json(),
+        loads=lambda raw: UserSession.model_validate_json(raw)
+    )
+    SHARED_CATALOG = SharedCatalog(SHARED_STATE_PATH)
+else:
+    USER_SESSIONS = SessionStore(ttl_seconds=SESSION_EXPIRY * 60)
+    SHARED_CATALOG = None
+
 # --- Data models ---
 
 
@@ -126,7 +173,8 @@ class SessionResponse(BaseModel):
 
 
 # --- Fake data generators ---
-fake = Faker()
+# Faker runs in the pool's background thread, never per request
+IDENTITY_POOL = IdentityPool()
 
 # Session management functions
 
@@ -137,16 +185,15 @@ def create_session():
     user_id = str(uuid.uuid4())
     now = datetime.now(UTC)
 
-    name = fake.name()
-    email = name.replace(" ", ".").lower() + "@example.com"
+    identity = IDENTITY_POOL.take()
 
     # Create user data
     user_data = {
         "id": user_id,
-        "name": name,
-        "email": email,
-        "address": fake.address(),
-        "payment_card": fake.credit_card_full(),
+        "name": identity["name"],
+        "email": identity["email"],
+        "address": identity["address"],
+        "payment_card": identity["payment_card"],
         "created_at": now.isoformat(),
         "last_active": now.isoformat()
     }
@@ -161,7 +208,7 @@ def create_session():
     )
 
     # Store session
-    USER_SESSIONS[session_id] = session
+    USER_SESSIONS.put(session_id, session)
 
     return session
 
@@ -170,18 +217,15 @@ def get_session(session_id: str = Cookie(None, alias=SESSION_COOKIE_NAME)):
     """Get an existing session or create a new one"""
     now = datetime.now(UTC)
 
-    if session_id and session_id in USER_SESSIONS:
-        session = USER_SESSIONS[session_id]
-
-        # Check if session is expired
-        if now > session.expires_at:
-            del USER_SESSIONS[session_id]
-            return create_session()
-
+    # The store drops expired sessions on lookup
+    session = USER_SESSIONS.get(session_id, refresh=False)
+    if session is not None:
         # Update last active time
         session.user_data["last_active"] = now.isoformat()
         session.expires_at = now + timedelta(minutes=SESSION_EXPIRY)
 
+        # Write back so the TTL slides (and other workers see the update)
+        USER_SESSIONS.put(session.session_id, session)
         return session
 
     # Create new session if no valid session exists
@@ -190,100 +234,42 @@ def get_session(session_id: str = Cookie(None, alias=SESSION_COOKIE_NAME)):
 
 def end_session(session_id: str):
     """End a user session"""
-    if session_id in USER_SESSIONS:
-        del USER_SESSIONS[session_id]
-        return True
-    return False
-
-
-def generate_product_name(category):
-    cat_data = CATEGORIES[category]
-    if "brands" in cat_data and "name_prefixes" in cat_data:
-        brand = random.choice(cat_data["brands"])
-        prefix = random.choice(cat_data["name_prefixes"])
-
-        # Add some randomness to product naming
-        if random.random() > 0.7:
-            if "specs" in cat_data:
-                spec = random.choice(cat_data["specs"])
-                return f"{brand} {prefix} {spec}"
-            elif "types" in cat_data:
-                type_ = random.choice(cat_data["types"])
-                return f"{brand} {prefix} {type_}"
-
-        # Base product name
-        if random.random() > 0.5:
-            year = random.randint(2020, 2024)
-            return f"{brand} {prefix} ({year})"
-        else:
-            model = random.choice(
-                ["Pro", "Plus", "Max", "Ultra", "SE", "Lite", ""])
-            return f"{brand} {prefix} {model}".strip()
-
-    # Fallback
-    return f"{random.choice(cat_data['brands'])} {random.choice(cat_data['name_prefixes'])}"
-
-
-def generate_product_features(category):
-    cat_data = CATEGORIES[category]
-    features = {}
+    return USER_SESSIONS.delete(session_id)
 
-    if "storage" in cat_data:
-        features["storage"] = random.choice(cat_data["storage"])
 
-    if "memory" in cat_data:
-        features["memory"] = random.choice(cat_data["memory"])
-
-    if "processors" in cat_data:
-        features["processor"] = random.choice(cat_data["processors"])
-
-    if "types" in cat_data:
-        features["type"] = random.choice(cat_data["types"])
-
-    if "specs" in cat_data:
-        # Add 1-3 specs
-        num_specs = random.randint(1, min(3, len(cat_data["specs"])))
-        features["specs"] = random.sample(cat_data["specs"], num_specs)
-
-    if "sizes" in cat_data:
-        features["size"] = random.choice(cat_data["sizes"])
-
-    return features
-
-
-def generate_product(category):
-    cat_data = CATEGORIES[category]
-    price_min, price_max = cat_data["price_range"]
-    product_id = f"{category[:2].upper()}-{str(uuid.uuid4())[:8]}"
-    brand = random.choice(cat_data["brands"])
-
-    # Generate a price point that seems realistic (ending in 9s)
-    base_price = round(random.uniform(price_min, price_max) / 10) * 10 - 0.01
+def generate_products(reload=False):
+    """Get the storefront products, generating the catalog if needed"""
+    global PRODUCT_DB, CATALOG_SNAPSHOT
+    if SHARED_CATALOG is None and CATALOG_SNAPSHOT is not None and not reload:
+        return CATALOG_SNAPSHOT.products
+
+    with _CATALOG_LOCK:
+        if SHARED_CATALOG is not None:
+            # Every worker generates the same catalog from the shared seed
+            version, seed = SHARED_CATALOG.current(reload=reload)
+        elif CATALOG_SNAPSHOT is None or reload:
+            version = CATALOG_SNAPSHOT.version + 1 if CATALOG_SNAPSHOT else 1
+            seed = secrets.randbits(63)
+        else:
+            # Another thread built the catalog while we waited on the lock
+            return CATALOG_SNAPSHOT.products
 
-    return {
-        "id": product_id,
-        "name": generate_product_name(category),
-        "price": base_price,
-        "category": category,
-        "brand": brand,
-        "color": random.choice(cat_data["colors"]),
-        "features": generate_product_features(category),
-        "rating": round(random.uniform(3.5, 5.0), 1),
-        "in_stock": random.random() > 0.1
-    }
+        if CATALOG_SNAPSHOT is None or CATALOG_SNAPSHOT.version != version:
+            store = ColumnarCatalog.generate(
+                CATEGORIES, per_category=CATALOG_PRODUCTS_PER_CATEGORY, seed=seed)
+            # Build the new snapshot before publishing either reference so
+            # readers never see a catalog without its matching snapshot
+            CATALOG_SNAPSHOT = CatalogSnapshot(
+                store, version, STOREFRONT_PRODUCTS_PER_CATEGORY)
+            PRODUCT_DB = store
 
+    return CATALOG_SNAPSHOT.products
 
-def generate_products(reload=False):
-    global PRODUCT_DB
-    if not PRODUCT_DB or reload:
-        PRODUCT_DB = []
-        # Generate a balanced number of products per category
-        for category in CATEGORIES:
-            # Create 3-5 products per category
-            for _ in range(random.randint(3, 5)):
-                PRODUCT_DB.append(generate_product(category))
 
-    return PRODUCT_DB
+def get_catalog_snapshot():
+    """Get the snapshot for the current catalog, generating it if needed"""
+    generate_products()
+    return CATALOG_SNAPSHOT
 
 # --- Routes ---
 
@@ -294,22 +280,46 @@ def home(request: Request):
     return RedirectResponse(url="/")
 
 
-@app.get("/", response_class=HTMLResponse)
-def shop_ui(request: Request, session: UserSession = Depends(get_session)):
-    """Main shop UI"""
-    products = generate_products()
-    categories = list(CATEGORIES.keys())
+def render_shop_page(session: UserSession, include_rum: bool = False):
+    """Render the shop shell for a session from the per-catalog render cache"""
+    snapshot = get_catalog_snapshot()
+
+    def build_context():
+        context = {
+            "user": {
+                "id": slot("user_id"),
+                "name": slot("user_name"),
+                "email": slot("user_email")
+            },
+            "user_initial": slot("user_initial"),
+            "products": snapshot.products,
+            "categories": list(CATEGORIES.keys()),
+            "session_id": slot("session_id"),
+            "session_short_id": slot("session_short_id")
+        }
+        if include_rum:
+            context.update({
+                "dd_rum_client_token": os.getenv("DD_RUM_CLIENT_TOKEN"),
+                "dd_rum_application_id": os.getenv("DD_RUM_APPLICATION_ID"),
+                "dd_rum_site": os.getenv("DD_RUM_SITE")
+            })
+        return context
 
-    response = templates.TemplateResponse(
-        "shop.html",
+    user = session.user_data
+    html = SHOP_RENDER_CACHE.render(
+        snapshot.version,
+        include_rum,
+        build_context,
         {
-            "request": request,
-            "user": session.user_data,
-            "products": products,
-            "categories": categories,
-            "session_id": session.session_id
+            "user_id": user["id"],
+            "user_name": user["name"],
+            "user_email": user["email"],
+            "user_initial": user["name"][0],
+            "session_id": session.session_id,
+            "session_short_id": session.session_id[:8]
         }
     )
+    response = HTMLResponse(content=html)
 
     # Set session cookie
     response.set_cookie(
@@ -323,6 +333,12 @@ def shop_ui(request: Request, session: UserSession = Depends(get_session)):
     return response
 
 
+@app.get("/", response_class=HTMLResponse)
+def shop_ui(request: Request, session: UserSession = Depends(get_session)):
+    """Main shop UI"""
+    return render_shop_page(session)
+
+
 @app.get("/analytics", response_class=HTMLResponse)
 def analytics_dashboard(request: Request):
     """Redirect to the analytics dashboard"""
@@ -330,14 +346,88 @@ def analytics_dashboard(request: Request):
 
 
 @app.get("/api/products", response_class=JSONResponse)
-def get_products(category: Optional[str] = None):
-    """Get products, optionally filtered by category"""
-    products = generate_products()
+def get_products(
+    request: Request,
+    category: Optional[str] = None,
+    brand: Optional[str] = None,
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    min_rating: Optional[float] = Query(None, ge=0, le=5),
+    in_stock: Optional[bool] = None,
+    sort: Optional[str] = Query(None, pattern=f"^({'|'.join(SORT_FIELDS)})$"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=PRODUCTS_MAX_PAGE_SIZE)
+):
+    """Get products, optionally filtered, sorted and paginated.
+
+    A plain or category-only request returns the storefront products from
+    the pre-encoded snapshot. Any other filter, sort or page parameter runs
+    a query against the full columnar catalog.
+    """
+    snapshot = get_catalog_snapshot()
+    headers = {"ETag": snapshot.etag}
+
+    if snapshot.matches(request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+
+    query = {
+        "brand": brand,
+        "min_price": min_price,
+        "max_price": max_price,
+        "min_rating": min_rating,
+        "in_stock": in_stock,
+        "sort": sort
+    }
+    if offset == 0 and limit is None and all(v is None for v in query.values()):
+        # Serve the pre-encoded body as-is
+        return Response(
+            content=snapshot.body_for(category),
+            media_type="application/json",
+            headers=headers
+        )
+
+    limit = limit or PRODUCTS_PAGE_SIZE
+    total, rows = snapshot.store.query(
+        category=category,
+        descending=order == "desc",
+        offset=offset,
+        limit=limit,
+        **query
+    )
+    return JSONResponse(
+        content={
+            "products": snapshot.store.products(rows),
+            "total": total,
+            "offset": offset,
+            "limit": limit
+        },
+        headers=headers
+    )
 
-    if category:
-        products = [p for p in products if p["category"] == category]
 
-    return {"products": products}
+@app.get("/api/search", response_class=JSONResponse)
+def search_products(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100)
+):
+    """Full-text product search, best rated first.
+
+    Matches names, brands, categories and feature values; the last word is
+    treated as a prefix for type-ahead.
+    """
+    snapshot = get_catalog_snapshot()
+    headers = {"ETag": snapshot.etag}
+
+    if snapshot.matches(request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+
+    rows = snapshot.search_index.search(q, limit)
+    return JSONResponse(
+        content={"query": q, "products": snapshot.store.products(rows)},
+        headers=headers
+    )
 
 
 @app.get("/api/session", response_class=JSONResponse)
@@ -351,6 +441,18 @@ def get_current_session(session: UserSession = Depends(get_session)):
     }
 
 
+@app.get("/api/render/stats", response_class=JSONResponse)
+def get_render_stats():
+    """Get shop shell render cache hit counts and render timings"""
+    return {"status": "success", "stats": SHOP_RENDER_CACHE.stats()}
+
+
+@app.get("/api/session/stats", response_class=JSONResponse)
+def get_session_stats():
+    """Get session store and identity pool counters"""
+    return {"status": "success", "stats": {**USER_SESSIONS.stats(), "identity_pool": IDENTITY_POOL.stats()}}
+
+
 @app.post("/api/session/end", response_class=JSONResponse)
 def end_current_session(session_id: str = Cookie(None, alias=SESSION_COOKIE_NAME)):
     """Manually end the current session"""
@@ -391,6 +493,14 @@ def refresh_session(session: UserSession = Depends(get_session)):
 
 # Make sure this path exists in your container
 CHECKOUT_LOG = Path("/app/logs/checkout_log.jsonl")
+# Checkout records are written off the event loop in group commits
+CHECKOUT_JOURNAL = CheckoutJournal(CHECKOUT_LOG)
+
+
+@app.get("/api/checkout/stats", response_class=JSONResponse)
+def get_checkout_stats():
+    """Get checkout journal queue depth and flush latency"""
+    return {"status": "success", "stats": CHECKOUT_JOURNAL.stats()}
 
 
 @app.post("/checkout")
@@ -401,8 +511,9 @@ async def checkout(request: Request, session_id: str = Cookie(None, alias=SESSIO
 
     # Get user from session
     user_data = {}
-    if session_id and session_id in USER_SESSIONS:
-        user_data = USER_SESSIONS[session_id].user_data
+    session = USER_SESSIONS.get(session_id)
+    if session is not None:
+        user_data = session.user_data
 
     # Create checkout record
     record = {
@@ -418,10 +529,8 @@ async def checkout(request: Request, session_id: str = Cookie(None, alias=SESSIO
         "success": random.random() > 0.1
     }
 
-    # Ensure the log directory exists
-    CHECKOUT_LOG.parent.mkdir(parents=True, exist_ok=True)
-    with open(CHECKOUT_LOG, "a") as f:
-        f.write(json.dumps(record) + "\n")
+    # Queue the record for the background journal writer
+    CHECKOUT_JOURNAL.append(record)
 
     # Prepare response
     if record["success"]:
@@ -461,11 +570,71 @@ async def checkout(request: Request, session_id: str = Cookie(None, alias=SESSIO
         )
 
 
+async def simulate_bulk(sessions: int, output: str):
+    """Generate many sessions at once and publish them or stream them back"""
+    snapshot = await run_in_threadpool(get_catalog_snapshot)
+    simulator = BulkSessionSimulator(
+        snapshot.store, os.getenv('WEBAPP_URL', 'http://localhost:8000'))
+    chunks = simulator.chunks(sessions)
+
+    if output == "ndjson":
+        async def stream():
+            while True:
+                events = await run_in_threadpool(next, chunks, None)
+                if events is None:
+                    break
+                yield await run_in_threadpool(to_ndjson, events)
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+    started = time.perf_counter()
+    generated = 0
+    published = 0
+    error = None
+    # Generate the next chunk in a worker thread while this one is published
+    pending = asyncio.ensure_future(run_in_threadpool(next, chunks, None))
+    while True:
+        events = await pending
+        if events is None:
+            break
+        pending = asyncio.ensure_future(run_in_threadpool(next, chunks, None))
+        generated += len(events)
+        try:
+            published += await rabbitmq_analytics.publish_batch(
+                [(route_event(event), event) for event in events])
+        except Exception as e:
+            error = str(e)
+            print(f"Error sending events to RabbitMQ: {e}")
+            pending.cancel()
+            break
+
+    result = {
+        "status": "simulated" if error is None else "error",
+        "sessions": sessions,
+        "events": generated,
+        "published": published,
+        "elapsed_seconds": round(time.perf_counter() - started, 3)
+    }
+    if error is not None:
+        result["message"] = error
+    return result
+
+
 @app.get("/simulate")
-def simulate():
-    """Simulate a user session for analytics events"""
+async def simulate(
+    sessions: int = Query(1, ge=1, le=SIMULATE_MAX_SESSIONS),
+    output: str = Query("rabbitmq", pattern="^(rabbitmq|ndjson)$")
+):
+    """Simulate user sessions for analytics events.
+
+    A single session is generated event by event as before; sessions > 1 or
+    output=ndjson switch to vectorized bulk generation.
+    """
+    if sessions > 1 or output == "ndjson":
+        return await simulate_bulk(sessions, output)
+
     session_id = str(uuid.uuid4())
-    products = generate_products()
+    # May build or load the catalog; keep it off the event loop
+    snapshot = await run_in_threadpool(get_catalog_snapshot)
     cart = []
     events = []
 
@@ -483,7 +652,7 @@ def simulate():
     for _ in range(random.randint(2, 6)):
         # Pick a random category
         category = random.choice(list(CATEGORIES.keys()))
-        category_products = [p for p in products if p["category"] == category]
+        category_products = snapshot.by_category.get(category)
 
         if not category_products:
             continue
@@ -580,48 +749,18 @@ def simulate():
                 "sessionId": session_id
             })
 
-        # Save events to legacy queue using synchronous pika
-        if events:
-            try:
-                RABBITMQ_HOST = os.getenv("RABBITMQ_HOST", "rabbitmq")
-                RABBITMQ_PORT = os.getenv("RABBITMQ_PORT", "5672")
-                connection = pika.BlockingConnection(
-                    pika.ConnectionParameters(host=RABBITMQ_HOST, port=int(RABBITMQ_PORT)))
-                channel = connection.channel()
-
-                # Ensure queues exist
-                default_queue = os.getenv("RABBITMQ_QUEUE", "event_queue")
-                channel.queue_declare(queue=default_queue, durable=True)
-                channel.queue_declare(queue="page_views", durable=True)
-                channel.queue_declare(queue="user_events", durable=True)
-                channel.queue_declare(queue="ecommerce_events", durable=True)
-
-                # Send events to appropriate queues
-                for event in events:
-                    # Determine queue based on event type
-                    queue_name = default_queue
-
-                    if event["type"] == "page_view":
-                        queue_name = "page_views"
-                    elif event["type"] == "custom_event":
-                        if event["event"] in ["identify", "user_engagement", "logout"]:
-                            queue_name = "user_events"
-                        elif event["event"] in ["product_view", "add_to_cart", "purchase", "checkout_error"]:
-                            queue_name = "ecommerce_events"
-
-                    # Send event to RabbitMQ
-                    channel.basic_publish(
-                        exchange='',
-                        routing_key=queue_name,
-                        body=json.dumps(event),
-                        properties=pika.BasicProperties(delivery_mode=2)
-                    )
-
-                connection.close()
-            except Exception as e:
-                print(f"Error sending events to RabbitMQ: {e}")
-
-        return {"status": "simulated", "session_id": session_id, "events": events}
+    # Publish the whole session as one batch on a pooled channel
+    if events:
+        try:
+            await rabbitmq_analytics.publish_batch(
+                [(route_event(event), event) for event in events])
+        except Exception as e:
+            logger.error(f"Error sending simulated events to RabbitMQ: {e}")
+            return JSONResponse(status_code=503, content={
+                "status": "error", "message": "RabbitMQ connection not available",
+                "session_id": session_id})
+
+    return {"status": "simulated", "session_id": session_id, "events": events}
 
 
 @app.get("/{full_path:path}", response_class=HTMLResponse)
@@ -632,29 +771,4 @@ def catch_all_spa_routes(full_path: str, request: Request, session: UserSession
     if full_path.startswith("api/") or full_path.startswith("static/") or '.' in full_path:
         return Response(status_code=404)
 
-    products = generate_products()
-    categories = list(CATEGORIES.keys())
-
-    response = templates.TemplateResponse(
-        "shop.html",
-        {
-            "request": request,
-            "user": session.user_data,
-            "products": products,
-            "categories": categories,
-            "session_id": session.session_id,
-            "dd_rum_client_token": os.getenv("DD_RUM_CLIENT_TOKEN"),
-            "dd_rum_application_id": os.getenv("DD_RUM_APPLICATION_ID"),
-            "dd_rum_site": os.getenv("DD_RUM_SITE")
-        }
-    )
-
-    response.set_cookie(
-        key=SESSION_COOKIE_NAME,
-        value=session.session_id,
-        max_age=SESSION_EXPIRY * 60,
-        httponly=True,
-        samesite="lax"
-    )
-
-    return response
+    return render_shop_page(session, include_rum=True)
@@ -0,0 +1,142 @@
+import gzip
+import os
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # optional: gzip is always available
+    zstandard = None
+
+# Message body compression, shared by the publishers and the consumer.
+# "none" keeps plain JSON bodies; "zstd" falls back to gzip when the
+# zstandard package is not installed.
+MESSAGE_COMPRESSION = os.getenv("MESSAGE_COMPRESSION", "none")  # none | gzip | zstd
+MESSAGE_COMPRESSION_MIN_BYTES = int(
+    os.getenv("MESSAGE_COMPRESSION_MIN_BYTES", 256))
+MESSAGE_COMPRESSION_LEVEL = int(os.getenv("MESSAGE_COMPRESSION_LEVEL", 3))
+# zstd dictionary trained on sample events (see train_dictionary); both
+# sides must load the same file
+MESSAGE_COMPRESSION_DICT = os.getenv("MESSAGE_COMPRESSION_DICT", "")
+
+ENCODINGS = ("none", "gzip", "zstd")
+
+
+class MessageCodec:
+    """Compresses AMQP message bodies and names the encoding used.
+
+    encode() returns the body to publish and the content-encoding to set
+    on the message (None when sent as is: compression off, or the body is
+    below the threshold). decode() reverses it from the message's
+    content-encoding, so compressed and plain messages can share a queue
+    and consumers can be upgraded before publishers. Small events compress
+    poorly on their own; a zstd dictionary trained on typical events
+    supplies the shared keys and values up front.
+    """
+
+    def __init__(self, compression: str = MESSAGE_COMPRESSION,
+                 min_bytes: int = MESSAGE_COMPRESSION_MIN_BYTES,
+                 level: int = MESSAGE_COMPRESSION_LEVEL,
+                 dictionary_path: Optional[str] = MESSAGE_COMPRESSION_DICT or None):
+        if compression not in ENCODINGS:
+            raise ValueError(
+                f"Unknown compression {compression!r}, expected one of {ENCODINGS}")
+        if compression == "zstd" and zstandard is None:
+            print("zstandard is not installed, compressing messages with gzip")
+            compression = "gzip"
+        self.compression = compression
+        self.min_bytes = min_bytes
+        self.level = level
+
+        self._dictionary = None
+        if dictionary_path and zstandard is not None:
+            with open(dictionary_path, "rb") as f:
+                self._dictionary = zstandard.ZstdCompressionDict(f.read())
+
+        self._compressor = None
+        self._decompressor = None
+        if zstandard is not None:
+            self._compressor = zstandard.ZstdCompressor(
+                level=level, dict_data=self._dictionary)
+            self._decompressor = zstandard.ZstdDecompressor(
+                dict_data=self._dictionary)
+
+        self._messages = 0
+        self._compressed = 0
+        self._bytes_in = 0
+        self._bytes_out = 0
+
+    def encode(self, body: bytes) -> Tuple[bytes, Optional[str]]:
+        self._messages += 1
+        self._bytes_in += len(body)
+        if self.compression == "none" or len(body) < self.min_bytes:
+            self._bytes_out += len(body)
+            return body, None
+
+        if self.compression == "zstd":
+            encoded = self._compressor.compress(body)
+        else:
+            encoded = gzip.compress(body, compresslevel=min(9, max(1, self.level)))
+
+        # Not worth it (already small, or incompressible): send as is
+        if len(encoded) >= len(body):
+            self._bytes_out += len(body)
+            return body, None
+        self._compressed += 1
+        self._bytes_out += len(encoded)
+        return encoded, self.compression
+
+    def decode(self, body: bytes, content_encoding: Optional[str]) -> bytes:
+        if not content_encoding or content_encoding in ("identity", "none"):
+            return body
+        if content_encoding == "gzip":
+            return gzip.decompress(body)
+        if content_encoding == "zstd":
+            if self._decompressor is None:
+                raise RuntimeError(
+                    "Received a zstd message but zstandard is not installed")
+            return self._decompressor.decompress(body)
+        raise ValueError(f"Unsupported content encoding {content_encoding!r}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "compression": self.compression,
+            "dictionary": self._dictionary is not None,
+            "min_bytes": self.min_bytes,
+            "messages": self._messages,
+            "compressed": self._compressed,
+            "bytes_in": self._bytes_in,
+            "bytes_out": self._bytes_out,
+            "ratio": round(self._bytes_out / self._bytes_in, 4) if self._bytes_in else 1.0
+        }
+
+
+def train_dictionary(samples: Iterable[bytes], size: int = 16 * 1024) -> bytes:
+    """Train a zstd dictionary from sample message bodies"""
+    if zstandard is None:
+        raise RuntimeError("zstandard is required to train a dictionary")
+    return zstandard.train_dictionary(size, list(samples)).as_bytes()
+
+
+if __name__ == "__main__":
+    # Train a dictionary from events the consumer has written:
+    # python message_codec.py /data/raw events.dict
+    import json
+    import sys
+    from pathlib import Path
+
+    source, target = Path(sys.argv[1]), Path(sys.argv[2])
+    samples = []
+    for path in source.rglob("*.ndjson"):
+        with open(path) as f:
+            for line in f:
+                event = json.loads(line)
+                # The consumer adds these; publishers never send them
+                event.pop("_queue", None)
+                event.pop("_processed_at", None)
+                samples.append(json.dumps(event).encode())
+                if len(samples) >= 20000:
+                    break
+        if len(samples) >= 20000:
+            break
+    target.write_bytes(train_dictionary(samples))
+    print(f"Trained {target} from {len(samples)} events")
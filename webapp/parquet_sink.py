@@ -0,0 +1,178 @@
+import logging
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional: only needed for RAW_FORMAT=parquet
+    pa = None
+    pq = None
+
+from event_codec import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+# Parquet output configuration
+PARQUET_ROW_GROUP_SIZE = int(os.getenv("PARQUET_ROW_GROUP_SIZE", 100000))  # rows
+PARQUET_COMPRESSION = os.getenv("PARQUET_COMPRESSION", "zstd")
+
+# The columns of BASE_SCHEMA in spark/jobs/process_logs.py; properties is
+# kept as a JSON string rather than a map
+STRING_COLUMNS = ["eventId", "type", "timestamp", "server_timestamp", "sessionId", "userId",
+                  "client_ip", "user_agent", "url", "path"]
+META_COLUMNS = ["_queue", "_processed_at"]
+
+
+def arrow_schema():
+    return pa.schema(
+        [pa.field(name, pa.string()) for name in STRING_COLUMNS]
+        + [pa.field("properties", pa.string()),
+           pa.field("sample_weight", pa.float64())]
+        + [pa.field(name, pa.string()) for name in META_COLUMNS])
+
+
+def _string(value: Any) -> Optional[str]:
+    if value is None or isinstance(value, str):
+        return value
+    return dumps(value).decode()
+
+
+class ParquetSink:
+    """Compacts sealed NDJSON segments into hour-partitioned Parquet files.
+
+    The segment writer stays the durable write path, so acks still follow
+    an fsync; each segment it seals is handed to a background thread that
+    reads it into Arrow columns and writes <queue>/<event_type>/date=<d>/
+    hour=<h>/<segment>.parquet (by _processed_at) through a hidden temporary
+    file and a rename, then deletes the segment. Output names come from the
+    segment name, so converting a segment again after a crash replaces its
+    files instead of duplicating rows; segments still on disk at startup are
+    converted by convert_pending().
+    """
+
+    def __init__(self, root: Path, row_group_size: int = PARQUET_ROW_GROUP_SIZE,
+                 compression: str = PARQUET_COMPRESSION):
+        if pa is None:
+            raise RuntimeError("pyarrow is required to write Parquet (RAW_FORMAT=parquet)")
+        self.root = Path(root)
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self.schema = arrow_schema()
+
+        self._segments: "queue.Queue" = queue.Queue()
+        self._thread = None
+
+        self._converted = 0
+        self._rows = 0
+        self._files = 0
+        self._bytes = 0
+        self._bad_lines = 0
+        self._errors = 0
+        self._seconds = 0.0
+
+    # --- Conversion ---
+
+    def _table(self, events: List[Dict[str, Any]]):
+        columns = {name: [_string(event.get(name)) for event in events]
+                   for name in STRING_COLUMNS + META_COLUMNS}
+        columns["properties"] = [_string(event.get("properties")) for event in events]
+        weights = []
+        for event in events:
+            weight = event.get("sample_weight")
+            weights.append(float(weight) if isinstance(weight, (int, float)) else None)
+        columns["sample_weight"] = weights
+        return pa.table(columns, schema=self.schema)
+
+    def convert(self, segment: Path) -> int:
+        """Write one sealed segment as Parquet files and delete it; returns rows"""
+        started = time.perf_counter()
+        partitions: Dict[tuple, List[Dict[str, Any]]] = {}
+        with open(segment, "rb") as f:
+            for line in f:
+                try:
+                    event = loads(line)
+                except ValueError:
+                    self._bad_lines += 1
+                    continue
+                processed_at = str(event.get("_processed_at") or "")
+                # ISO timestamps: YYYY-MM-DDTHH...
+                key = (processed_at[:10] or "unknown", processed_at[11:13] or "00")
+                partitions.setdefault(key, []).append(event)
+
+        rows = 0
+        for (date, hour), events in partitions.items():
+            directory = segment.parent / f"date={date}" / f"hour={hour}"
+            directory.mkdir(parents=True, exist_ok=True)
+            target = directory / (segment.stem + ".parquet")
+            tmp = directory / ("." + segment.stem + ".parquet.tmp")
+            pq.write_table(self._table(events), tmp,
+                           row_group_size=self.row_group_size,
+                           compression=self.compression)
+            with open(tmp, "rb") as f:
+                os.fsync(f.fileno())
+            os.replace(tmp, target)
+            rows += len(events)
+            self._files += 1
+            self._bytes += target.stat().st_size
+
+        segment.unlink()
+        self._converted += 1
+        self._rows += rows
+        self._seconds += time.perf_counter() - started
+        return rows
+
+    def _run(self):
+        while True:
+            segment = self._segments.get()
+            if segment is None:
+                break
+            try:
+                self.convert(segment)
+            except Exception as e:
+                # The segment stays on disk and is retried at the next start
+                self._errors += 1
+                logger.error(f"Error converting {segment} to Parquet: {e}")
+
+    # --- Lifecycle ---
+
+    def submit(self, segment: Path):
+        """Queue a sealed segment for conversion (the writer's on_seal hook)"""
+        self._segments.put(Path(segment))
+
+    def convert_pending(self, shard: str = "*") -> int:
+        """Queue sealed segments a previous run of shard left unconverted"""
+        pending = sorted(self.root.glob(f"*/*/*-{shard}-*.ndjson"))
+        for segment in pending:
+            self.submit(segment)
+        return len(pending)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="parquet-sink", daemon=True)
+            self._thread.start()
+
+    def close(self, timeout: float = 60):
+        """Finish queued conversions, waiting at most timeout seconds"""
+        if self._thread is not None:
+            self._segments.put(None)
+            self._thread.join(timeout)
+            self._thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "segments_converted": self._converted,
+            "segments_queued": self._segments.qsize(),
+            "rows_written": self._rows,
+            "files_written": self._files,
+            "bytes_written": self._bytes,
+            "bad_lines": self._bad_lines,
+            "errors": self._errors,
+            "compression": self.compression,
+            "avg_convert_ms": round(self._seconds / self._converted * 1000, 1) if self._converted else 0
+        }
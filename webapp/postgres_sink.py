@@ -0,0 +1,271 @@
+import io
+import logging
+import os
+import struct
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import psycopg2
+    import psycopg2.pool
+except ImportError:  # optional: only needed for CONSUMER_SINK=postgres
+    psycopg2 = None
+
+from event_codec import dumps
+
+logger = logging.getLogger(__name__)
+
+# Database connection
+POSTGRES_HOST = os.getenv("POSTGRES_HOST", "postgres-db")
+POSTGRES_PORT = os.getenv("POSTGRES_PORT", "5432")
+POSTGRES_USER = os.getenv("POSTGRES_USER", "postgres")
+POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD", "postgres")
+POSTGRES_DB = os.getenv("POSTGRES_DB", "events")
+
+# COPY batching: a batch is committed once it holds this many events or its
+# oldest event has waited this long
+PG_SINK_BATCH_SIZE = int(os.getenv("PG_SINK_BATCH_SIZE", 1000))  # events
+PG_SINK_MAX_LATENCY = float(os.getenv("PG_SINK_MAX_LATENCY", 0.2))  # seconds
+PG_SINK_SCHEMA = os.getenv("PG_SINK_SCHEMA", "raw_data")
+
+# Event field each column is filled from, where the names differ
+COLUMN_SOURCES = {
+    "event_id": "eventId",
+    "session_id": "sessionId",
+    "user_id": "userId",
+    "queue_name": "_queue",
+    "processed_timestamp": "_processed_at"
+}
+COLUMN_DEFAULTS = {"sample_weight": 1.0}
+
+# Binary COPY framing
+COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+COPY_TRAILER = struct.pack(">h", -1)
+NULL_FIELD = struct.pack(">i", -1)
+PG_EPOCH = datetime(2000, 1, 1, tzinfo=timezone.utc)
+
+
+def _text_encoder(max_length: Optional[int]) -> Callable[[Any], Optional[bytes]]:
+    def encode(value):
+        if value is None:
+            return None
+        if not isinstance(value, str):
+            value = dumps(value).decode() if isinstance(value, (dict, list)) else str(value)
+        # Postgres text cannot hold NUL
+        value = value.replace("\x00", "")
+        if max_length is not None:
+            value = value[:max_length]
+        return value.encode()
+    return encode
+
+
+def _encode_float8(value) -> Optional[bytes]:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return struct.pack(">d", value)
+
+
+def _encode_timestamptz(value) -> Optional[bytes]:
+    if not isinstance(value, str):
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        # Like Spark's to_timestamp, unparseable timestamps load as NULL
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    delta = parsed - PG_EPOCH
+    return struct.pack(">q", (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds)
+
+
+def _encode_jsonb(value) -> Optional[bytes]:
+    if value is None:
+        return None
+    # jsonb rejects \u0000 in strings; version 1 is the only binary format
+    return b"\x01" + dumps(value).replace(b"\\u0000", b"")
+
+
+def column_encoder(data_type: str, max_length: Optional[int]) -> Callable[[Any], Optional[bytes]]:
+    """Binary COPY encoder for a column of the given information_schema type"""
+    if data_type in ("text", "character varying"):
+        return _text_encoder(max_length)
+    if data_type == "double precision":
+        return _encode_float8
+    if data_type == "timestamp with time zone":
+        return _encode_timestamptz
+    if data_type == "jsonb":
+        return _encode_jsonb
+    raise ValueError(f"Unsupported column type {data_type!r}")
+
+
+class _Table:
+    def __init__(self, name: str, columns: List[Tuple[str, str, Optional[int]]]):
+        self.name = name
+        self.columns = [column for column, _, _ in columns]
+        self.sources = [COLUMN_SOURCES.get(column, column) for column in self.columns]
+        self.defaults = [COLUMN_DEFAULTS.get(column) for column in self.columns]
+        self.encoders = [column_encoder(data_type, max_length)
+                         for _, data_type, max_length in columns]
+        self.field_count = struct.pack(">h", len(self.columns))
+        self.rows = bytearray()
+        self.count = 0
+
+    def encode(self, event: Dict[str, Any]) -> bytes:
+        fields = [self.field_count]
+        for source, default, encoder in zip(self.sources, self.defaults, self.encoders):
+            value = event.get(source)
+            data = encoder(default if value is None else value)
+            if data is None:
+                fields.append(NULL_FIELD)
+            else:
+                fields.append(struct.pack(">i", len(data)))
+                fields.append(data)
+        return b"".join(fields)
+
+    def copy_sql(self) -> str:
+        columns = ", ".join(f'"{column}"' for column in self.columns)
+        return f"COPY {self.name} ({columns}) FROM STDIN WITH (FORMAT binary)"
+
+
+class PostgresCopySink:
+    """Loads events straight into the raw_data tables with binary COPY.
+
+    add() encodes an event as a binary COPY row for its queue's table
+    (raw_data.<queue>), using the table's own columns and types as read from
+    information_schema; commit() sends every table's rows with
+    COPY ... FROM STDIN in one transaction on a pooled connection and
+    commits it, so the caller can ack everything added so far once it
+    returns. If the database rejects the batch's data, the events are handed
+    to fallback (the segment writer, for Spark to load) instead, so one bad
+    event cannot requeue its batch forever; connection errors propagate and
+    the batch is retried by redelivery.
+    """
+
+    def __init__(self, queues: List[str], schema: str = PG_SINK_SCHEMA,
+                 fallback: Optional[Callable[[Dict[str, Any], str], None]] = None):
+        if psycopg2 is None:
+            raise RuntimeError("psycopg2 is required for the Postgres sink (CONSUMER_SINK=postgres)")
+        self.queues = queues
+        self.schema = schema
+        self.fallback = fallback
+        self._pool = None
+        self._tables: Dict[str, _Table] = {}
+        # Events of the current batch, kept for the fallback
+        self._events: List[Tuple[Dict[str, Any], str]] = []
+
+        self._batches = 0
+        self._rows = 0
+        self._bytes = 0
+        self._fallback_batches = 0
+        self._fallback_rows = 0
+        self._errors = 0
+        self._seconds = 0.0
+
+    def start(self):
+        """Open the pool and read the columns of every queue's table"""
+        self._pool = psycopg2.pool.SimpleConnectionPool(
+            1, 1, host=POSTGRES_HOST, port=POSTGRES_PORT, user=POSTGRES_USER,
+            password=POSTGRES_PASSWORD, dbname=POSTGRES_DB)
+        connection = self._pool.getconn()
+        try:
+            with connection.cursor() as cursor:
+                for queue_name in self.queues:
+                    table_name = queue_name.replace("-", "_")
+                    # Every column but the serial id
+                    cursor.execute(
+                        "SELECT column_name, data_type, character_maximum_length "
+                        "FROM information_schema.columns "
+                        "WHERE table_schema = %s AND table_name = %s "
+                        "AND COALESCE(column_default, '') NOT LIKE 'nextval(%%' "
+                        "ORDER BY ordinal_position",
+                        (self.schema, table_name))
+                    columns = cursor.fetchall()
+                    if not columns:
+                        raise RuntimeError(f"Table {self.schema}.{table_name} does not exist")
+                    self._tables[queue_name] = _Table(f"{self.schema}.{table_name}", columns)
+            connection.commit()
+        finally:
+            self._pool.putconn(connection)
+
+    def add(self, event: Dict[str, Any], queue_name: str):
+        table = self._tables.get(queue_name)
+        if table is None:
+            raise ValueError(f"No table for queue {queue_name!r}")
+        table.rows += table.encode(event)
+        table.count += 1
+        self._events.append((event, queue_name))
+
+    def _copy(self):
+        connection = self._pool.getconn()
+        try:
+            with connection.cursor() as cursor:
+                for table in self._tables.values():
+                    if table.count:
+                        data = COPY_HEADER + bytes(table.rows) + COPY_TRAILER
+                        cursor.copy_expert(table.copy_sql(), io.BytesIO(data))
+                        self._bytes += len(data)
+            connection.commit()
+        except psycopg2.DataError:
+            connection.rollback()
+            self._pool.putconn(connection)
+            raise
+        except Exception:
+            # The connection may be broken; the pool opens a new one
+            self._pool.putconn(connection, close=True)
+            raise
+        self._pool.putconn(connection)
+
+    def _reset(self):
+        for table in self._tables.values():
+            table.rows = bytearray()
+            table.count = 0
+        self._events = []
+
+    def commit(self):
+        """COPY everything added since the last commit and commit it"""
+        if not self._events:
+            return
+        started = time.perf_counter()
+        try:
+            self._copy()
+        except psycopg2.DataError as e:
+            if self.fallback is None:
+                self._errors += 1
+                self._reset()
+                raise
+            logger.error(f"Postgres rejected a batch of {len(self._events)} events, "
+                         f"writing it to segments instead: {e}")
+            for event, queue_name in self._events:
+                self.fallback(event, queue_name)
+            self._fallback_batches += 1
+            self._fallback_rows += len(self._events)
+            self._reset()
+            return
+        except Exception:
+            self._errors += 1
+            self._reset()
+            raise
+        self._batches += 1
+        self._rows += len(self._events)
+        self._seconds += time.perf_counter() - started
+        self._reset()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.closeall()
+            self._pool = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "tables": sorted(table.name for table in self._tables.values()),
+            "batches": self._batches,
+            "rows": self._rows,
+            "bytes": self._bytes,
+            "avg_batch_rows": round(self._rows / self._batches, 1) if self._batches else 0,
+            "avg_commit_ms": round(self._seconds / self._batches * 1000, 2) if self._batches else 0,
+            "fallback_batches": self._fallback_batches,
+            "fallback_rows": self._fallback_rows,
+            "errors": self._errors
+        }
@@ -0,0 +1,192 @@
+import asyncio
+import base64
+import json
+import os
+import time
+import urllib.parse
+import urllib.request
+from collections import deque
+from datetime import datetime, UTC
+from typing import Any, Callable, Dict, List, Optional
+
+# Queue stats sampler configuration
+QUEUE_STATS_INTERVAL = float(os.getenv("QUEUE_STATS_INTERVAL", 5))  # seconds
+QUEUE_STATS_HISTORY = int(os.getenv("QUEUE_STATS_HISTORY", 720))  # samples
+QUEUE_STATS_RATE_WINDOW = float(
+    os.getenv("QUEUE_STATS_RATE_WINDOW", 60))  # seconds
+# Broker-wide depths and rates come from the management API
+RABBITMQ_MANAGEMENT_URL = os.getenv(
+    "RABBITMQ_MANAGEMENT_URL", f"http://{os.getenv('RABBITMQ_HOST', 'rabbitmq')}:15672")
+RABBITMQ_USER = os.getenv("RABBITMQ_USER", "guest")
+RABBITMQ_PASS = os.getenv("RABBITMQ_PASS", "guest")
+RABBITMQ_VHOST = os.getenv("RABBITMQ_VHOST", "/")
+
+
+class QueueStatsSampler:
+    """Polls queue depth, consumer counts and rates in the background.
+
+    Each sample is one management API request for every queue, kept in a
+    ring buffer with this process's cumulative publish counts, so readers
+    are served from memory and never touch the broker. publish_rate and
+    consume_rate are the broker's own rates, so they count every publisher
+    and consumer (other uvicorn workers, Celery, the consumers). If the
+    management API cannot be reached, the sample falls back to passive
+    declares, which give depths but no broker rates. worker_publish_rate is
+    what this process alone published over the rate window, and
+    drain_seconds extrapolates the depth trend across the window.
+    """
+
+    def __init__(self, pool, queue_names: List[str],
+                 published_counts: Callable[[], Dict[str, int]],
+                 interval: float = QUEUE_STATS_INTERVAL,
+                 history: int = QUEUE_STATS_HISTORY,
+                 rate_window: float = QUEUE_STATS_RATE_WINDOW,
+                 management_url: str = RABBITMQ_MANAGEMENT_URL):
+        self.pool = pool
+        self.management_url = management_url.rstrip("/")
+        self.queue_names = queue_names
+        self.published_counts = published_counts
+        self.interval = interval
+        self.rate_window = rate_window
+        self._samples = deque(maxlen=history)
+        self._task = None
+        self._errors = 0
+        self._management_errors = 0
+
+    def _fetch_management(self) -> Dict[str, Dict[str, Any]]:
+        vhost = urllib.parse.quote(RABBITMQ_VHOST, safe="")
+        columns = "name,messages_ready,messages_unacknowledged,consumers,message_stats"
+        request = urllib.request.Request(
+            f"{self.management_url}/api/queues/{vhost}?columns={columns}")
+        credentials = base64.b64encode(f"{RABBITMQ_USER}:{RABBITMQ_PASS}".encode()).decode()
+        request.add_header("Authorization", f"Basic {credentials}")
+        with urllib.request.urlopen(request, timeout=self.interval) as response:
+            listing = json.loads(response.read())
+
+        queues = {}
+        for queue in listing:
+            message_stats = queue.get("message_stats") or {}
+            queues[queue["name"]] = {
+                "message_count": queue.get("messages_ready", 0),
+                "unacked_count": queue.get("messages_unacknowledged", 0),
+                "consumer_count": queue.get("consumers", 0),
+                "publish_rate": round(
+                    message_stats.get("publish_details", {}).get("rate", 0.0), 2),
+                "consume_rate": round(
+                    message_stats.get("deliver_get_details", {}).get("rate", 0.0), 2)
+            }
+        return queues
+
+    async def _declare(self, queue_name: str) -> Dict[str, Any]:
+        try:
+            # A failed passive declare closes the channel; the pool reopens it
+            async with self.pool.acquire(queue_name) as channel:
+                queue = await channel.declare_queue(queue_name, passive=True)
+            return {
+                "message_count": queue.declaration_result.message_count,
+                "consumer_count": queue.declaration_result.consumer_count
+            }
+        except Exception as e:
+            self._errors += 1
+            return {"error": str(e)}
+
+    async def sample(self) -> Dict[str, Any]:
+        """Take one sample and add it to the ring buffer"""
+        try:
+            listing = await asyncio.to_thread(self._fetch_management)
+            results = [listing.get(queue_name, {"error": "queue not found"})
+                       for queue_name in self.queue_names]
+        except Exception:
+            self._management_errors += 1
+            results = await asyncio.gather(
+                *(self._declare(queue_name) for queue_name in self.queue_names))
+        published = self.published_counts()
+        queues = {}
+        for queue_name, result in zip(self.queue_names, results):
+            result["published"] = published.get(queue_name, 0)
+            queues[queue_name] = result
+        sample = {"time": time.time(), "queues": queues}
+        self._samples.append(sample)
+        return sample
+
+    async def _run(self):
+        while True:
+            try:
+                await self.sample()
+            except Exception as e:
+                self._errors += 1
+                print(f"Error sampling queue stats: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _rates(self, queue_name: str, window: List[Dict[str, Any]]) -> Dict[str, Any]:
+        # Only samples where the declare succeeded carry a depth
+        points = [s for s in window if "message_count" in s["queues"][queue_name]]
+        latest = window[-1]["queues"][queue_name]
+        # Broker rates, when the latest sample came from the management API
+        rates = {"publish_rate": latest.get("publish_rate"),
+                 "consume_rate": latest.get("consume_rate")}
+        if len(points) < 2:
+            return {**rates, "worker_publish_rate": None, "drain_seconds": None}
+
+        first, last = points[0], points[-1]
+        elapsed = last["time"] - first["time"]
+        if elapsed <= 0:
+            return {**rates, "worker_publish_rate": None, "drain_seconds": None}
+        start, end = first["queues"][queue_name], last["queues"][queue_name]
+        worker_publish_rate = (end["published"] - start["published"]) / elapsed
+        depth_rate = (end["message_count"] - start["message_count"]) / elapsed
+
+        # Time to empty at the current net drain rate; None while it is growing
+        drain_seconds = None
+        if end["message_count"] == 0:
+            drain_seconds = 0.0
+        elif depth_rate < 0:
+            drain_seconds = round(end["message_count"] / -depth_rate, 1)
+
+        return {
+            **rates,
+            "worker_publish_rate": round(worker_publish_rate, 2),
+            "drain_seconds": drain_seconds
+        }
+
+    def stats(self, history_seconds: Optional[float] = None) -> Dict[str, Any]:
+        """Latest sample with derived rates, plus samples from the last history_seconds"""
+        if not self._samples:
+            return {"queues": {}, "timestamp": None, "samples": 0,
+                    "interval_seconds": self.interval, "errors": self._errors}
+
+        latest = self._samples[-1]
+        window = [s for s in self._samples
+                  if s["time"] >= latest["time"] - self.rate_window]
+        queues = {}
+        for queue_name, current in latest["queues"].items():
+            queues[queue_name] = {**current, **self._rates(queue_name, window)}
+
+        stats = {
+            "queues": queues,
+            "timestamp": datetime.fromtimestamp(latest["time"], UTC).isoformat(),
+            "samples": len(self._samples),
+            "interval_seconds": self.interval,
+            "rate_window_seconds": self.rate_window,
+            "errors": self._errors,
+            "management_errors": self._management_errors
+        }
+        if history_seconds:
+            stats["history"] = [
+                {"timestamp": datetime.fromtimestamp(s["time"], UTC).isoformat(),
+                 "queues": s["queues"]}
+                for s in self._samples if s["time"] >= latest["time"] - history_seconds]
+        return stats
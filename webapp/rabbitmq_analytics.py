@@ -1,10 +1,23 @@
-import json
+import asyncio
+import math
 import os
+import re
+import time
+import uuid
+from collections import deque
 import aio_pika
+from channel_pool import ChannelPool
+from event_codec import EventValidator, dumps, loads
+from event_routing import QUEUE_NAMES, route_event
+from event_spool import EventSpool, SPOOL_ENABLED
+from ingest_sampling import IngestSampler
+from message_codec import MessageCodec
+from queue_stats import QueueStatsSampler
 from datetime import datetime, UTC
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, Query, Request
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel, Field
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 
 # Create API router for analytics endpoints
 analytics_router = APIRouter()
@@ -16,13 +29,31 @@ RABBITMQ_USER = os.getenv("RABBITMQ_USER", "guest")
 RABBITMQ_PASS = os.getenv("RABBITMQ_PASS", "guest")
 RABBITMQ_VHOST = os.getenv("RABBITMQ_VHOST", "/")
 RABBITMQ_URL = f"amqp://{RABBITMQ_USER}:{RABBITMQ_PASS}@{RABBITMQ_HOST}:{RABBITMQ_PORT}/{RABBITMQ_VHOST}"
+# Longest wait between attempts when the broker is down at startup
+RABBITMQ_CONNECT_RETRY_MAX = float(
+    os.getenv("RABBITMQ_CONNECT_RETRY_MAX", 30))  # seconds
 
-# Default RabbitMQ queue
-DEFAULT_QUEUE = os.getenv("RABBITMQ_QUEUE", "event_queue")
+# Largest number of events accepted by /api/analytics/batch
+ANALYTICS_BATCH_MAX_EVENTS = int(os.getenv("ANALYTICS_BATCH_MAX_EVENTS", 1000))
+
+# Micro-batching publisher used by the ingest endpoints
+PUBLISHER_BUFFER_SIZE = int(os.getenv("PUBLISHER_BUFFER_SIZE", 20000))
+PUBLISHER_BATCH_SIZE = int(os.getenv("PUBLISHER_BATCH_SIZE", 500))
+PUBLISHER_FLUSH_INTERVAL = float(
+    os.getenv("PUBLISHER_FLUSH_INTERVAL", 0.05))  # seconds
+PUBLISHER_MAX_IN_FLIGHT = int(os.getenv("PUBLISHER_MAX_IN_FLIGHT", 4))
 
 # RabbitMQ connection
 rabbitmq_connection = None
-rabbitmq_channel = None
+rabbitmq_channel_pool = None
+queue_sampler = None
+rabbitmq_connect_task = None
+
+# Optional body compression for everything published from the webapp
+codec = MessageCodec()
+
+# Events this process has published, per queue (feeds the sampler's rates)
+published_by_queue: Dict[str, int] = {}
 
 # Analytics event model
 
@@ -30,50 +61,424 @@ rabbitmq_channel = None
 class AnalyticsEvent(BaseModel):
     type: str
     timestamp: str
+    event: Optional[str] = None
+    eventId: Optional[str] = None
     sessionId: Optional[str] = None
     queueName: Optional[str] = None
     userId: Optional[str] = None
     properties: Optional[Dict[str, Any]] = Field(default_factory=dict)
 
+
+# Checks ingested events against AnalyticsEvent without building models
+validator = EventValidator(AnalyticsEvent)
+
+
+# Client event IDs are kept only if they are UUIDs (and so fit event_id)
+_EVENT_ID_RE = re.compile(r"[0-9a-fA-F]{8}-(?:[0-9a-fA-F]{4}-){3}[0-9a-fA-F]{12}")
+
+
+def assign_event_id(event: Dict[str, Any]):
+    """Give an event the eventId the consumer deduplicates on.
+
+    A UUID sent by the client is kept, so its retries are recognised too;
+    anything else is replaced.
+    """
+    event_id = event.get("eventId")
+    if not isinstance(event_id, str) or not _EVENT_ID_RE.fullmatch(event_id):
+        event["eventId"] = str(uuid.uuid4())
+
 # Initialize RabbitMQ connection
 
 
-async def initialize_rabbitmq(rabbitmq_url: str = RABBITMQ_URL):
-    global rabbitmq_connection, rabbitmq_channel
+async def _connect(rabbitmq_url: str):
+    global rabbitmq_connection, rabbitmq_channel_pool, queue_sampler
 
+    # Connect to RabbitMQ
+    connection = await aio_pika.connect_robust(rabbitmq_url)
     try:
-        # Connect to RabbitMQ
-        rabbitmq_connection = await aio_pika.connect_robust(rabbitmq_url)
-        rabbitmq_channel = await rabbitmq_connection.channel()
+        # Every publish and stats call leases a channel from the pool
+        pool = ChannelPool(connection)
+        await pool.start()
 
         # Declare queues that we'll use
-        await rabbitmq_channel.declare_queue(DEFAULT_QUEUE, durable=True)
-        await rabbitmq_channel.declare_queue("page_views", durable=True)
-        await rabbitmq_channel.declare_queue("user_events", durable=True)
-        await rabbitmq_channel.declare_queue("ecommerce_events", durable=True)
+        async with pool.acquire() as channel:
+            for queue_name in QUEUE_NAMES:
+                await channel.declare_queue(queue_name, durable=True)
+    except Exception:
+        await connection.close()
+        raise
+
+    rabbitmq_connection = connection
+    rabbitmq_channel_pool = pool
+    publisher.start()
+
+    queue_sampler = QueueStatsSampler(
+        pool, QUEUE_NAMES, lambda: dict(published_by_queue))
+    queue_sampler.start()
 
-        print(
-            f"RabbitMQ connection established to {RABBITMQ_HOST}:{RABBITMQ_PORT}")
+    print(
+        f"RabbitMQ connection established to {RABBITMQ_HOST}:{RABBITMQ_PORT}")
+
+
+async def _connect_with_retry(rabbitmq_url: str):
+    """Retry the first connection with exponential backoff until it succeeds"""
+    delay = 1.0
+    while True:
+        await asyncio.sleep(delay)
+        try:
+            await _connect(rabbitmq_url)
+            return
+        except Exception as e:
+            delay = min(delay * 2, RABBITMQ_CONNECT_RETRY_MAX)
+            print(f"Error connecting to RabbitMQ, retrying in {delay:.0f}s: {e}")
+
+
+async def initialize_rabbitmq(rabbitmq_url: str = RABBITMQ_URL):
+    global rabbitmq_connect_task
+
+    # The spool takes events even if the broker is not reachable yet, and
+    # replays them once the pool is set
+    if spool is not None:
+        spool.start(publish_messages, lambda: rabbitmq_channel_pool is not None)
+
+    try:
+        await _connect(rabbitmq_url)
         return True
     except Exception as e:
-        print(f"Error connecting to RabbitMQ: {e}")
+        print(f"Error connecting to RabbitMQ, retrying in the background: {e}")
+        rabbitmq_connect_task = asyncio.create_task(_connect_with_retry(rabbitmq_url))
         return False
 
 # Close RabbitMQ connection
 
 
 async def close_rabbitmq():
+    if rabbitmq_connect_task is not None and not rabbitmq_connect_task.done():
+        rabbitmq_connect_task.cancel()
+        try:
+            await rabbitmq_connect_task
+        except asyncio.CancelledError:
+            pass
+    if queue_sampler:
+        await queue_sampler.stop()
+    await publisher.stop()
+    if spool is not None:
+        await spool.stop()
+    if rabbitmq_channel_pool:
+        await rabbitmq_channel_pool.close()
     if rabbitmq_connection:
         await rabbitmq_connection.close()
         print("RabbitMQ connection closed")
 
+
+def _message(body: bytes) -> aio_pika.Message:
+    body, content_encoding = codec.encode(body)
+    return aio_pika.Message(
+        body=body,
+        content_type="application/json",
+        content_encoding=content_encoding,
+        delivery_mode=aio_pika.DeliveryMode.PERSISTENT
+    )
+
+
+async def publish_messages(messages: List[Tuple[str, bytes]]) -> List[Optional[Exception]]:
+    """Publish encoded (queue_name, body) pairs, one pooled channel per queue.
+
+    Each queue's publishes go out pipelined on a channel leased for that
+    queue, and the queues are published concurrently. Returns None or the
+    exception for every message, in order.
+    """
+    if not rabbitmq_channel_pool:
+        raise RuntimeError("RabbitMQ connection not available")
+
+    groups: Dict[str, List[int]] = {}
+    for index, (queue_name, _) in enumerate(messages):
+        groups.setdefault(queue_name, []).append(index)
+
+    outcomes: List[Optional[Exception]] = [None] * len(messages)
+
+    async def publish_group(queue_name, indexes):
+        try:
+            async with rabbitmq_channel_pool.acquire(queue_name) as channel:
+                results = await asyncio.gather(*(
+                    channel.default_exchange.publish(
+                        _message(messages[index][1]),
+                        routing_key=queue_name
+                    )
+                    for index in indexes
+                ), return_exceptions=True)
+        except Exception as e:
+            results = [e] * len(indexes)
+        published = 0
+        for index, result in zip(indexes, results):
+            if isinstance(result, Exception):
+                outcomes[index] = result
+            else:
+                published += 1
+        published_by_queue[queue_name] = published_by_queue.get(
+            queue_name, 0) + published
+
+    await asyncio.gather(*(publish_group(queue_name, indexes)
+                           for queue_name, indexes in groups.items()))
+    return outcomes
+
+
+async def publish_batch(messages: List[Tuple[str, Dict[str, Any]]]) -> int:
+    """Publish (queue_name, event) pairs and wait for the broker's confirms.
+
+    Raises the first error if any event was not published. Returns the
+    number of events published.
+    """
+    for _, event in messages:
+        assign_event_id(event)
+    outcomes = await publish_messages(
+        [(queue_name, dumps(event)) for queue_name, event in messages])
+    errors = [outcome for outcome in outcomes if outcome is not None]
+    if errors:
+        raise errors[0]
+    return len(messages)
+
+
+class EventPublisher:
+    """Micro-batching publisher with publisher confirms and backpressure.
+
+    submit() only appends the encoded event to a bounded buffer, so ingest
+    latency does not depend on the broker. A flusher task publishes up to
+    batch_size events at a time, as soon as a batch is full or flush_interval
+    after the first event arrived, with the publishes of a batch pipelined
+    per queue on pooled confirm-mode channels and up to max_in_flight batches
+    outstanding.
+    Events that cannot be published (no broker, failed or nacked publishes)
+    or that do not fit in the buffer go to the disk spool, which replays
+    them later; without a spool, failures go back to the front of the
+    buffer and a full buffer makes submit() refuse, so callers answer 429.
+    """
+
+    def __init__(self, buffer_size: int = PUBLISHER_BUFFER_SIZE,
+                 batch_size: int = PUBLISHER_BATCH_SIZE,
+                 flush_interval: float = PUBLISHER_FLUSH_INTERVAL,
+                 max_in_flight: int = PUBLISHER_MAX_IN_FLIGHT,
+                 spool: Optional[EventSpool] = None):
+        self.buffer_size = buffer_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_in_flight = max_in_flight
+        self.spool = spool
+
+        self._buffer = deque()  # (queue_name, body)
+        self._wakeup = asyncio.Event()
+        self._batch_full = asyncio.Event()
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._in_flight = set()
+        self._in_flight_events = 0
+        self._task = None
+        self._closing = False
+        self._backoff = 0.0
+
+        self._accepted = 0
+        self._rejected = 0
+        self._spooled = 0
+        self._published = 0
+        self._nacked = 0
+        self._errors = 0
+        self._batches = 0
+        self._confirm_ms = deque(maxlen=1024)
+        self._recent = deque(maxlen=64)  # (monotonic, published) per batch
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def free(self) -> int:
+        # In-flight events count against the buffer: failures come back to it
+        return self.buffer_size - len(self._buffer) - self._in_flight_events
+
+    def submit(self, messages: List[Tuple[str, Dict[str, Any]]]) -> bool:
+        """Buffer (queue_name, event) pairs; all or nothing.
+
+        Without a running flusher, or when they do not fit, they go to the
+        spool instead. Returns False when neither can take them.
+        """
+        encoded = [(queue_name, dumps(event)) for queue_name, event in messages]
+        if not self.running or len(messages) > self.free():
+            if self.spool is not None and self.spool.append(encoded):
+                self._spooled += len(messages)
+                self._accepted += len(messages)
+                return True
+            self._rejected += len(messages)
+            return False
+        self._buffer.extend(encoded)
+        self._accepted += len(messages)
+        self._wakeup.set()
+        if len(self._buffer) >= self.batch_size:
+            self._batch_full.set()
+        return True
+
+    def retry_after(self) -> int:
+        """Seconds until the buffer has likely drained, for Retry-After"""
+        if len(self._recent) >= 2:
+            elapsed = self._recent[-1][0] - self._recent[0][0]
+            published = sum(count for _, count in list(self._recent)[1:])
+            if elapsed > 0 and published:
+                rate = published / elapsed
+                return min(30, max(1, math.ceil(len(self._buffer) / rate)))
+        return max(1, math.ceil(self._backoff))
+
+    def start(self):
+        if self._task is None:
+            self._closing = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 10):
+        """Flush what is buffered, then stop"""
+        if self._task is None:
+            return
+        self._closing = True
+        self._wakeup.set()
+        self._batch_full.set()
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            self._task.cancel()
+            print(f"Publisher stopped with {len(self._buffer)} events unsent")
+        self._task = None
+
+    async def _run(self):
+        while True:
+            if not self._buffer:
+                if self._closing:
+                    if not self._in_flight:
+                        break
+                    # Failed events from these may still come back
+                    await asyncio.gather(*self._in_flight, return_exceptions=True)
+                    continue
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            # Give a partial batch up to flush_interval to fill up
+            if len(self._buffer) < self.batch_size and not self._closing:
+                self._batch_full.clear()
+                try:
+                    await asyncio.wait_for(self._batch_full.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+            await self._slots.acquire()
+            batch = [self._buffer.popleft()
+                     for _ in range(min(self.batch_size, len(self._buffer)))]
+            if not batch:
+                self._slots.release()
+                continue
+            self._in_flight_events += len(batch)
+            task = asyncio.create_task(self._flush(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+            if self._backoff:
+                await asyncio.sleep(self._backoff)
+
+    async def _flush(self, batch):
+        try:
+            started = time.perf_counter()
+            try:
+                outcomes = await publish_messages(batch)
+            except Exception as e:
+                outcomes = [e] * len(batch)
+
+            failed = [message for message, outcome in zip(batch, outcomes)
+                      if outcome is not None]
+            published = len(batch) - len(failed)
+            self._batches += 1
+            self._published += published
+            if published:
+                self._confirm_ms.append((time.perf_counter() - started) * 1000)
+                self._recent.append((time.monotonic(), published))
+
+            if failed:
+                nacks = sum(isinstance(o, aio_pika.exceptions.DeliveryError)
+                            for o in outcomes)
+                self._nacked += nacks
+                self._errors += len(failed) - nacks
+                if self.spool is not None and self.spool.append(failed):
+                    # Replayed from disk once publishing works again
+                    self._spooled += len(failed)
+                else:
+                    # Retry in order ahead of newer events
+                    self._buffer.extendleft(reversed(failed))
+                    self._wakeup.set()
+                first_error = next(o for o in outcomes if o is not None)
+                print(f"Error publishing {len(failed)} events to RabbitMQ: {first_error!r}")
+
+            # Back off while nothing gets through (broker down or blocked)
+            if published:
+                self._backoff = 0.0
+            else:
+                self._backoff = min(5.0, max(0.1, self._backoff * 2))
+        finally:
+            self._in_flight_events -= len(batch)
+            self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        confirm_ms = sorted(self._confirm_ms)
+
+        def percentile(p):
+            if not confirm_ms:
+                return 0.0
+            return round(confirm_ms[min(len(confirm_ms) - 1, int(len(confirm_ms) * p))], 3)
+
+        return {
+            "buffer_depth": len(self._buffer),
+            "buffer_size": self.buffer_size,
+            "buffer_fill": round(len(self._buffer) / self.buffer_size, 4),
+            "in_flight_batches": len(self._in_flight),
+            "in_flight_events": self._in_flight_events,
+            "accepted": self._accepted,
+            "rejected": self._rejected,
+            "spooled": self._spooled,
+            "published": self._published,
+            "nacked": self._nacked,
+            "errors": self._errors,
+            "batches": self._batches,
+            "avg_batch_size": round(self._published / self._batches, 2) if self._batches else 0.0,
+            "confirm_latency_ms": {
+                "p50": percentile(0.5),
+                "p99": percentile(0.99),
+                "max": round(confirm_ms[-1], 3) if confirm_ms else 0.0
+            },
+            "backoff_seconds": self._backoff
+        }
+
+
+# Overflow spool for broker outages and overload
+spool = EventSpool() if SPOOL_ENABLED else None
+publisher = EventPublisher(spool=spool)
+
+# Sampling and per-session rate limiting ahead of routing
+sampler = IngestSampler()
+
+
+def _backpressure_response() -> JSONResponse:
+    retry_after = publisher.retry_after()
+    return JSONResponse(
+        status_code=429,
+        headers={"Retry-After": str(retry_after)},
+        content={"status": "error", "message": "Analytics buffer full, retry later"})
+
+
 # Analytics endpoint to receive events
 
 
 @analytics_router.post("/api/analytics")
 async def receive_analytics_event(request: Request):
-    # Parse the event data
-    event_data = await request.json()
+    # Parse and validate the event data
+    try:
+        event_data = validator.validate(loads(await request.body()))
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={
+            "status": "error", "message": f"Invalid event: {e}"})
+
+    assign_event_id(event_data)
 
     # Add server timestamp
     event_data["server_timestamp"] = datetime.now(UTC).isoformat()
@@ -84,63 +489,161 @@ async def receive_analytics_event(request: Request):
     # Add user agent
     event_data["user_agent"] = request.headers.get("user-agent", "")
 
+    # Sampled-out and rate-limited events are acknowledged but not published
+    reason = sampler.admit(event_data)
+    if reason is not None:
+        return {"status": "dropped", "reason": reason}
+
     # Determine the appropriate queue based on the event type
-    queue_name = event_data.get("queueName", DEFAULT_QUEUE)
-
-    # Route specific event types to appropriate queues
-    event_type = event_data.get("type", "")
-    if event_type == "page_view":
-        queue_name = "page_views"
-    elif event_type in ["identify", "user_engagement", "logout"]:
-        queue_name = "user_events"
-    elif event_type in ["purchase", "add_to_cart", "checkout", "product_view"]:
-        queue_name = "ecommerce_events"
-
-    # Send the event to RabbitMQ
-    if rabbitmq_channel:
-        try:
-            await rabbitmq_channel.default_exchange.publish(
-                aio_pika.Message(
-                    body=json.dumps(event_data).encode(),
-                    delivery_mode=aio_pika.DeliveryMode.PERSISTENT
-                ),
-                routing_key=queue_name
-            )
-            return {"status": "success", "queue": queue_name}
-        except Exception as e:
-            print(f"Error sending event to RabbitMQ: {e}")
-            return {"status": "error", "message": f"RabbitMQ error: {str(e)}"}
+    queue_name = route_event(event_data)
+
+    # Buffer the event; the publisher sends it with the next batch, or the
+    # spool keeps it until the broker is back
+    if publisher.running or spool is not None:
+        if not publisher.submit([(queue_name, event_data)]):
+            return _backpressure_response()
+        return {"status": "success", "queue": queue_name}
     else:
         # If RabbitMQ is not connected, return an error
         return {"status": "error", "message": "RabbitMQ connection not available"}
 
-# Endpoint to get analytics stats (for admin/debugging)
 
+def _parse_line(line: bytes) -> Any:
+    try:
+        return loads(line)
+    except ValueError:
+        return None
 
-@analytics_router.get("/api/analytics/stats")
-async def get_analytics_stats():
-    """Get statistics about the analytics system"""
-    if not rabbitmq_channel:
-        return {"status": "error", "message": "RabbitMQ connection not available"}
 
-    # Get queue information
-    queues = [DEFAULT_QUEUE, "page_views", "user_events", "ecommerce_events"]
-    queue_stats = {}
+async def _read_batch(request: Request) -> Any:
+    """Parse a JSON array body, or an NDJSON body line by line as it streams in.
+
+    NDJSON lines that are not valid JSON come back as None so they can be
+    reported individually.
+    """
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        items = []
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            items.extend(_parse_line(line) for line in lines if line.strip())
+            if len(items) > ANALYTICS_BATCH_MAX_EVENTS:
+                return items
+        if buffer.strip():
+            items.append(_parse_line(buffer))
+        return items
+
+    body = await request.body()
+    if body.lstrip()[:1] == b"[":
+        return loads(body)
+    # Beacons sent without a content type may still carry NDJSON
+    return [_parse_line(line) for line in body.split(b"\n") if line.strip()]
+
 
-    for queue_name in queues:
+@analytics_router.post("/api/analytics/batch")
+async def receive_analytics_batch(request: Request):
+    """Receive many events in one request, as a JSON array or NDJSON.
+
+    Events are enriched once per request, sampled and rate limited, routed,
+    and handed to the publisher together, grouped by queue; the whole batch
+    is refused with a 429 if it does not fit in the buffer. The response
+    carries a status per event, in request order.
+    """
+    try:
+        items = await _read_batch(request)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={
+            "status": "error", "message": f"Invalid batch: {e}"})
+    if not isinstance(items, list):
+        return JSONResponse(status_code=400, content={
+            "status": "error", "message": "Batch must be a JSON array or NDJSON"})
+    if len(items) > ANALYTICS_BATCH_MAX_EVENTS:
+        return JSONResponse(status_code=413, content={
+            "status": "error",
+            "message": f"Batch exceeds {ANALYTICS_BATCH_MAX_EVENTS} events"})
+
+    # Same enrichment as /api/analytics, computed once for the whole batch
+    enrichment = {
+        "server_timestamp": datetime.now(UTC).isoformat(),
+        "client_ip": request.client.host,
+        "user_agent": request.headers.get("user-agent", "")
+    }
+
+    results: List[Dict[str, Any]] = [None] * len(items)
+    dropped = 0
+    groups: Dict[str, List[Tuple[int, Dict[str, Any]]]] = {}
+    for index, event_data in enumerate(items):
+        if event_data is None:
+            results[index] = {"status": "error", "message": "Invalid event: not valid JSON"}
+            continue
         try:
-            queue = await rabbitmq_channel.declare_queue(queue_name, passive=True)
-            queue_stats[queue_name] = {
-                "message_count": queue.declaration_result.message_count,
-                "consumer_count": queue.declaration_result.consumer_count
-            }
-        except Exception as e:
-            queue_stats[queue_name] = {"error": str(e)}
+            validator.validate(event_data)
+        except ValueError as e:
+            results[index] = {"status": "error", "message": f"Invalid event: {e}"}
+            continue
+        event_data.update(enrichment)
+        assign_event_id(event_data)
+        reason = sampler.admit(event_data)
+        if reason is not None:
+            results[index] = {"status": "dropped", "reason": reason}
+            dropped += 1
+            continue
+        groups.setdefault(route_event(event_data), []).append((index, event_data))
+
+    if not publisher.running and spool is None:
+        error = {"status": "error", "message": "RabbitMQ connection not available"}
+        for group in groups.values():
+            for index, _ in group:
+                results[index] = error
+        return {"status": "error", "received": len(items), "accepted": 0,
+                "dropped": dropped, "results": results}
+
+    messages = [(queue_name, event_data)
+                for queue_name, group in groups.items() for _, event_data in group]
+    if not publisher.submit(messages):
+        return _backpressure_response()
+
+    for queue_name, group in groups.items():
+        result = {"status": "success", "queue": queue_name}
+        for index, _ in group:
+            results[index] = result
+
+    return {"status": "success" if len(messages) == len(items) else "partial",
+            "received": len(items), "accepted": len(messages), "dropped": dropped,
+            "results": results}
+
+
+@analytics_router.get("/api/analytics/publisher/stats")
+async def get_publisher_stats():
+    """Get buffer fill, confirm latency and nack counters for the publisher"""
+    stats = publisher.stats()
+    if spool is not None:
+        stats["spool"] = spool.stats()
+    stats["sampling"] = sampler.stats()
+    return {"status": "success", "stats": stats}
+
+# Endpoint to get analytics stats (for admin/debugging)
+
+
+@analytics_router.get("/api/analytics/stats")
+async def get_analytics_stats(
+    history: Optional[float] = Query(None, ge=0, le=86400,
+                                     description="Also return samples from the last N seconds")
+):
+    """Get statistics about the analytics system.
+
+    Served from the background sampler, so polling this adds no broker load.
+    """
+    if not queue_sampler:
+        return {"status": "error", "message": "RabbitMQ connection not available"}
 
     return {
         "status": "success",
         "stats": {
-            "queues": queue_stats,
-            "timestamp": datetime.now(UTC).isoformat()
+            **queue_sampler.stats(history),
+            "channel_pool": rabbitmq_channel_pool.stats(),
+            "compression": codec.stats()
         }
     }
@@ -0,0 +1,92 @@
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable
+
+from markupsafe import escape
+
+# Slot markers use private-use code points, which never occur in the
+# template or the catalog and pass through HTML escaping untouched
+_SLOT_START = "\ue000"
+_SLOT_END = "\ue001"
+_SLOT_RE = re.compile(f"{_SLOT_START}(\\w+){_SLOT_END}")
+
+
+def slot(name: str) -> str:
+    """Marker to put in the template context where a per-request value goes"""
+    return f"{_SLOT_START}{name}{_SLOT_END}"
+
+
+class ShellRenderCache:
+    """Cache of a template pre-rendered once per catalog version.
+
+    The catalog-dependent markup is rendered with slot markers in place of
+    the per-session values and split into literal chunks. A request then
+    only escapes and interleaves its own values. Only entries for the
+    latest version are kept.
+    """
+
+    def __init__(self, env, template_name: str):
+        self.env = env
+        self.template_name = template_name
+        self._lock = threading.Lock()
+        self._entries: Dict[Hashable, list] = {}
+        self._version = None
+
+        self._renders = 0
+        self._render_seconds = 0.0
+        self._hits = 0
+        self._fill_seconds = 0.0
+
+    def _compile(self, context: Dict[str, Any]) -> list:
+        started = time.perf_counter()
+        html = self.env.get_template(self.template_name).render(context)
+        self._render_seconds += time.perf_counter() - started
+        self._renders += 1
+
+        # Alternating [literal, slot name, literal, slot name, ..., literal]
+        return _SLOT_RE.split(html)
+
+    def render(self, version: Hashable, variant: Hashable,
+               build_context: Callable[[], Dict[str, Any]],
+               values: Dict[str, Any]) -> str:
+        """Render the template for one request.
+
+        build_context is only called on a cache miss and must return the
+        same context for a given (version, variant), with slot() markers
+        wherever per-request values go. values fills those slots and is
+        HTML-escaped on insertion.
+        """
+        key = (version, variant)
+        parts = self._entries.get(key)
+        if parts is None:
+            with self._lock:
+                parts = self._entries.get(key)
+                if parts is None:
+                    if version != self._version:
+                        # Drop shells for superseded catalog versions
+                        self._entries = {}
+                        self._version = version
+                    parts = self._compile(build_context())
+                    self._entries[key] = parts
+        else:
+            self._hits += 1
+
+        started = time.perf_counter()
+        chunks = []
+        for i, part in enumerate(parts):
+            chunks.append(part if i % 2 == 0 else str(escape(values[part])))
+        html = "".join(chunks)
+        self._fill_seconds += time.perf_counter() - started
+        return html
+
+    def stats(self) -> Dict[str, Any]:
+        served = self._hits + self._renders
+        return {
+            "catalog_version": self._version,
+            "cached_shells": len(self._entries),
+            "full_renders": self._renders,
+            "cache_hits": self._hits,
+            "avg_full_render_ms": round(1000 * self._render_seconds / self._renders, 3) if self._renders else 0.0,
+            "avg_fill_ms": round(1000 * self._fill_seconds / served, 3) if served else 0.0
+        }
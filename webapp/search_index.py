@@ -0,0 +1,207 @@
+import bisect
+import re
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# Rows scanned per step when walking the catalog in rating order
+SCAN_CHUNK = 8192
+# Terms matching at most this many rows are answered from their postings
+GATHER_LIMIT = 20000
+# Resolved query terms kept per index
+RESOLVE_CACHE_SIZE = 4096
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+class SearchIndex:
+    """Inverted index over a ColumnarCatalog.
+
+    Searchable text (names, brands, categories, feature values and specs)
+    lives in the catalog's small vocabularies rather than in the rows, so
+    the index maps each token to the vocabulary entries containing it and
+    each entry to its rows. A query resolves every term to per-field lookup
+    tables, then either gathers the rows of its most selective term or walks
+    the catalog in rating order until enough rows match, whichever touches
+    fewer rows. Results come back best rated first.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        n = len(store)
+
+        # Columns searched by vocabulary code, with the vocabulary for each
+        self._columns = {
+            "name": (store.name, store.names),
+            "brand": (store.brand, store.brands),
+            "category": (store.category, store.category_names),
+            "size": (store.size, store.sizes),
+        }
+        for field, vocabulary in store.feature_vocabularies.items():
+            self._columns[field] = (store.features[field], vocabulary)
+
+        # token -> [(field, code)]; specs use ("specs", (category, bit))
+        self._entries: Dict[str, List[Tuple[str, object]]] = {}
+        for field, (_, vocabulary) in self._columns.items():
+            self._add_vocabulary(field, enumerate(vocabulary))
+        for category, specs in enumerate(store.category_specs):
+            self._add_vocabulary(
+                "specs", (((category, bit), spec) for bit, spec in enumerate(specs)))
+        self._tokens = sorted(self._entries)
+
+        # Best rated first, ties in catalog order; rank[row] is the position
+        self.rating_order = np.argsort(-store.rating.astype(np.int16), kind="stable")
+        self.rank = np.empty(n, dtype=np.int64)
+        self.rank[self.rating_order] = np.arange(n)
+        self._all_ranks = np.arange(n)
+
+        # (token, prefix) -> resolved term; per instance, so a replaced
+        # index is freed along with its cache
+        self._resolved: "OrderedDict[tuple, tuple]" = OrderedDict()
+
+        # Postings per field code, stored as sorted ranks so every list is
+        # already in result order
+        self._postings = {}
+        self._counts = {}
+        for field, (column, vocabulary) in self._columns.items():
+            self._postings[field] = self._split(
+                column[self.rating_order], len(vocabulary))
+            self._counts[field] = np.array([len(p) for p in self._postings[field]])
+        self._spec_postings = {}
+        for category, specs in enumerate(store.category_specs):
+            ranks = np.sort(self.rank[store.category_rows[category]])
+            spec_bits = store.specs[self.rating_order[ranks]]
+            for bit in range(len(specs)):
+                self._spec_postings[(category, bit)] = ranks[
+                    (spec_bits & (1 << bit)) != 0]
+
+    def _add_vocabulary(self, field, items):
+        for code, text in items:
+            for token in set(tokenize(str(text))):
+                self._entries.setdefault(token, []).append((field, code))
+
+    @staticmethod
+    def _split(column, size):
+        valid = np.flatnonzero(column >= 0)
+        order = valid[np.argsort(column[valid], kind="stable")]
+        bounds = np.searchsorted(column[order], np.arange(size + 1))
+        return [order[bounds[c]:bounds[c + 1]] for c in range(size)]
+
+    def _lookup(self, token: str, prefix: bool) -> List[Tuple[str, object]]:
+        if not prefix:
+            return self._entries.get(token, [])
+        start = bisect.bisect_left(self._tokens, token)
+        entries = []
+        for candidate in self._tokens[start:]:
+            if not candidate.startswith(token):
+                break
+            entries.extend(self._entries[candidate])
+        return entries
+
+    def _resolve(self, token: str, prefix: bool):
+        """Turn one query term into lookup tables and its posting size.
+
+        Cached: the index never changes once built.
+        """
+        key = (token, prefix)
+        term = self._resolved.get(key)
+        if term is not None:
+            self._resolved.move_to_end(key)
+            return term
+        term = self._build_term(token, prefix)
+        self._resolved[key] = term
+        if len(self._resolved) > RESOLVE_CACHE_SIZE:
+            self._resolved.popitem(last=False)
+        return term
+
+    def _build_term(self, token: str, prefix: bool):
+        tables = {}
+        spec_table = None
+        size = 0
+        for field, code in self._lookup(token, prefix):
+            if field == "specs":
+                category, bit = code
+                if spec_table is None:
+                    spec_table = np.zeros(
+                        len(self.store.category_names), dtype=np.uint8)
+                spec_table[category] |= 1 << bit
+                size += len(self._spec_postings[code])
+            else:
+                if field not in tables:
+                    tables[field] = np.zeros(
+                        len(self._columns[field][1]), dtype=bool)
+                tables[field][code] = True
+                size += int(self._counts[field][code])
+        return tables, spec_table, size
+
+    def _matches(self, term, rows):
+        tables, spec_table, _ = term
+        match = np.zeros(len(rows), dtype=bool)
+        for field, table in tables.items():
+            codes = self._columns[field][0][rows]
+            # -1 marks attributes the category does not have
+            match |= (codes >= 0) & table[codes]
+        if spec_table is not None:
+            specs = self.store.specs[rows]
+            match |= (specs & spec_table[self.store.category[rows]]) != 0
+        return match
+
+    def _gather(self, term):
+        """Ranks of every row matching a term, best rated first"""
+        tables, spec_table, _ = term
+        parts = [self._postings[field][code]
+                 for field, table in tables.items()
+                 for code in np.flatnonzero(table)]
+        if spec_table is not None:
+            parts.extend(ranks for (category, bit), ranks in self._spec_postings.items()
+                         if spec_table[category] & (1 << bit))
+        if len(parts) == 1:
+            return parts[0]
+        ranks = np.concatenate(parts)
+        # A row can match through several fields or several specs
+        if len(tables) > 1 or spec_table is not None:
+            return np.unique(ranks)
+        return np.sort(ranks)
+
+    def _collect(self, candidates, terms, limit):
+        """Filter rating-ordered ranks by terms in chunks until limit rows match"""
+        found = []
+        remaining = limit
+        start = 0
+        chunk = SCAN_CHUNK
+        while start < len(candidates) and remaining > 0:
+            rows = self.rating_order[candidates[start:start + chunk]]
+            # Most selective term first; later terms only see survivors
+            for term in terms:
+                rows = rows[self._matches(term, rows)]
+            hits = rows[:remaining]
+            found.append(hits)
+            remaining -= len(hits)
+            start += chunk
+            # Rare matches: widen the window rather than iterate in small steps
+            chunk *= 2
+        return np.concatenate(found) if found else np.empty(0, dtype=np.int64)
+
+    def search(self, query: str, limit: int = 20) -> np.ndarray:
+        """Rows matching every query term, best rated first.
+
+        The last term is matched as a prefix to support type-ahead.
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return np.empty(0, dtype=np.int64)
+
+        terms = [self._resolve(token, prefix=i == len(tokens) - 1)
+                 for i, token in enumerate(tokens)]
+        if any(term[2] == 0 for term in terms):
+            return np.empty(0, dtype=np.int64)
+
+        terms.sort(key=lambda term: term[2])
+        if terms[0][2] <= GATHER_LIMIT:
+            return self._collect(self._gather(terms[0]), terms[1:], limit)
+        return self._collect(self._all_ranks, terms, limit)
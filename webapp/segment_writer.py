@@ -0,0 +1,237 @@
+import os
+import re
+import socket
+import time
+from collections import OrderedDict
+from datetime import datetime, UTC
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set
+
+# Segment writer configuration
+SEGMENT_MAX_BYTES = int(os.getenv("SEGMENT_MAX_BYTES", 64 * 1024 * 1024))
+SEGMENT_MAX_AGE = float(os.getenv("SEGMENT_MAX_AGE", 30))  # seconds
+SEGMENT_MAX_OPEN = int(os.getenv("SEGMENT_MAX_OPEN", 256))  # open segment files
+SEGMENT_BUFFER_BYTES = int(os.getenv("SEGMENT_BUFFER_BYTES", 256 * 1024))
+
+# Sealed segments end in .ndjson; open ones are hidden dotfiles, which Spark
+# and the archive globs skip
+SEGMENT_SUFFIX = ".ndjson"
+OPEN_SUFFIX = ".open"
+
+_UNSAFE = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+def safe_name(name: str) -> str:
+    """Directory name for a queue or event type taken from an event"""
+    name = _UNSAFE.sub("_", str(name)).lstrip(".")
+    return name[:100] or "unknown"
+
+
+class _OpenSegment:
+    def __init__(self, directory: Path, name: str, buffer_bytes: int):
+        self.name = name
+        self.final_path = directory / (name + SEGMENT_SUFFIX)
+        self.path = directory / ("." + name + SEGMENT_SUFFIX + OPEN_SUFFIX)
+        self.file = open(self.path, "ab", buffering=buffer_bytes)
+        self.opened = time.monotonic()
+        self.bytes = 0
+        self.events = 0
+        self.dirty = False
+        # Size and events as of the last successful flush()
+        self.flushed_bytes = 0
+        self.flushed_events = 0
+
+
+class SegmentWriter:
+    """Appends events to rolling NDJSON segments, one per queue and event type.
+
+    Each (queue, event type) pair has one open segment at a time, a hidden
+    file under <root>/<queue>/<event_type>/. A segment is sealed when it
+    reaches max_bytes, when it is older than max_age (checked on every write
+    and by roll_expired()), or on close: the file is flushed, fsynced and
+    renamed to its final .ndjson name, so readers listing *.ndjson only ever
+    see complete segments. If flush() fails, rollback() truncates the open
+    segments back to what the last successful flush() left. Open segments
+    left by a crash are trimmed to their last complete line and sealed by
+    recover(). on_seal, if given, is called with the path of every sealed
+    segment.
+    """
+
+    def __init__(self, root: Path, max_bytes: int = SEGMENT_MAX_BYTES,
+                 max_age: float = SEGMENT_MAX_AGE,
+                 max_open: int = SEGMENT_MAX_OPEN,
+                 buffer_bytes: int = SEGMENT_BUFFER_BYTES,
+                 shard: str = "",
+                 on_seal: Optional[Callable[[Path], None]] = None):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.max_open = max_open
+        self.buffer_bytes = buffer_bytes
+        self.on_seal = on_seal
+        # Keeps names unique across processes writing to the same root, and
+        # must be stable across restarts for recover() to find its segments
+        self.shard = safe_name(shard or socket.gethostname())
+
+        # (queue, event_type) -> open segment; least recently written first
+        self._open: "OrderedDict[tuple, _OpenSegment]" = OrderedDict()
+        self._seq = 0
+
+        self._events = 0
+        self._bytes = 0
+        self._sealed = 0
+        self._sealed_events = 0
+        self._sealed_bytes = 0
+        self._sealed_by: Dict[str, int] = {}
+        self._recovered = 0
+        self._rolled_back = 0
+        self._last_sealed: Optional[str] = None
+
+    # --- Writing ---
+
+    def _new_segment(self, queue_name: str, event_type: str) -> _OpenSegment:
+        directory = self.root / queue_name / event_type
+        directory.mkdir(parents=True, exist_ok=True)
+        self._seq += 1
+        stamp = datetime.now(UTC).strftime("%Y%m%dT%H%M%S%f")
+        name = f"{stamp}-{self.shard}-{self._seq:06d}"
+        return _OpenSegment(directory, name, self.buffer_bytes)
+
+    def write(self, queue_name: str, event_type: str, line: bytes) -> str:
+        """Append one NDJSON line (including its newline); returns the segment's name"""
+        key = (safe_name(queue_name), safe_name(event_type))
+        segment = self._open.get(key)
+        if segment is not None and time.monotonic() - segment.opened >= self.max_age:
+            self._seal(key, "age")
+            segment = None
+        if segment is None:
+            if len(self._open) >= self.max_open:
+                self._seal(next(iter(self._open)), "evicted")
+            segment = self._new_segment(*key)
+            self._open[key] = segment
+        else:
+            self._open.move_to_end(key)
+
+        segment.file.write(line)
+        segment.dirty = True
+        segment.bytes += len(line)
+        segment.events += 1
+        self._events += 1
+        self._bytes += len(line)
+        if segment.bytes >= self.max_bytes:
+            self._seal(key, "size")
+        return segment.name
+
+    def flush(self, sync: bool = False):
+        """Hand buffered lines to the OS, and fsync them if sync is set"""
+        for segment in self._open.values():
+            if segment.dirty:
+                segment.file.flush()
+                if sync:
+                    os.fsync(segment.file.fileno())
+                segment.dirty = False
+            segment.flushed_bytes = segment.bytes
+            segment.flushed_events = segment.events
+
+    def rollback(self) -> Set[str]:
+        """Drop the lines written to open segments since the last successful flush().
+
+        Returns the names of the segments that lost lines. Lines in segments
+        sealed since then are complete and stay.
+        """
+        rolled_back = set()
+        for segment in self._open.values():
+            if segment.bytes == segment.flushed_bytes:
+                continue
+            try:
+                segment.file.close()
+            except OSError:
+                # Whatever the buffer still held is cut off below
+                pass
+            os.truncate(segment.path, segment.flushed_bytes)
+            segment.file = open(segment.path, "ab", buffering=self.buffer_bytes)
+            self._events -= segment.events - segment.flushed_events
+            self._bytes -= segment.bytes - segment.flushed_bytes
+            segment.events = segment.flushed_events
+            segment.bytes = segment.flushed_bytes
+            segment.dirty = False
+            rolled_back.add(segment.name)
+        self._rolled_back += len(rolled_back)
+        return rolled_back
+
+    # --- Sealing ---
+
+    def _seal(self, key: tuple, reason: str):
+        segment = self._open.pop(key)
+        segment.file.flush()
+        os.fsync(segment.file.fileno())
+        segment.file.close()
+        os.rename(segment.path, segment.final_path)
+        self._sealed += 1
+        self._sealed_events += segment.events
+        self._sealed_bytes += segment.bytes
+        self._sealed_by[reason] = self._sealed_by.get(reason, 0) + 1
+        self._last_sealed = str(segment.final_path)
+        if self.on_seal is not None:
+            self.on_seal(segment.final_path)
+
+    def roll_expired(self) -> int:
+        """Seal segments older than max_age; returns how many were sealed"""
+        now = time.monotonic()
+        expired = [key for key, segment in self._open.items()
+                   if now - segment.opened >= self.max_age]
+        for key in expired:
+            self._seal(key, "age")
+        return len(expired)
+
+    def close(self):
+        """Seal every open segment"""
+        for key in list(self._open):
+            self._seal(key, "close")
+
+    def recover(self) -> int:
+        """Seal open segments a previous run of this shard left behind"""
+        recovered = 0
+        pattern = f"*/*/.*-{self.shard}-*{SEGMENT_SUFFIX}{OPEN_SUFFIX}"
+        for path in self.root.glob(pattern):
+            with open(path, "r+b") as f:
+                data = f.read()
+                # A crash can leave a partial last line
+                end = data.rfind(b"\n") + 1
+                if end < len(data):
+                    f.truncate(end)
+                f.flush()
+                os.fsync(f.fileno())
+            if end == 0:
+                path.unlink()
+                continue
+            final_path = path.with_name(path.name[1:-len(OPEN_SUFFIX)])
+            os.rename(path, final_path)
+            recovered += 1
+            if self.on_seal is not None:
+                self.on_seal(final_path)
+        self._recovered += recovered
+        return recovered
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        open_segments: List[Dict[str, Any]] = [
+            {"queue": key[0], "event_type": key[1], "events": segment.events,
+             "bytes": segment.bytes, "age_seconds": round(now - segment.opened, 1)}
+            for key, segment in self._open.items()
+        ]
+        return {
+            "open_segments": len(open_segments),
+            "open": open_segments,
+            "events_written": self._events,
+            "bytes_written": self._bytes,
+            "sealed_segments": self._sealed,
+            "sealed_by": dict(self._sealed_by),
+            "avg_sealed_events": round(self._sealed_events / self._sealed, 1) if self._sealed else 0,
+            "avg_sealed_bytes": round(self._sealed_bytes / self._sealed) if self._sealed else 0,
+            "recovered_segments": self._recovered,
+            "rolled_back_segments": self._rolled_back,
+            "last_sealed": self._last_sealed,
+            "max_bytes": self.max_bytes,
+            "max_age_seconds": self.max_age
+        }
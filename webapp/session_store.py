@@ -0,0 +1,184 @@
+import heapq
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+# Session store configuration
+SESSION_STORE_SHARDS = int(os.getenv("SESSION_STORE_SHARDS", 16))
+SESSION_STORE_MAX_SESSIONS = int(os.getenv("SESSION_STORE_MAX_SESSIONS", 50000))
+SESSION_STORE_SWEEP_INTERVAL = float(
+    os.getenv("SESSION_STORE_SWEEP_INTERVAL", 30))  # seconds
+
+
+class _Shard:
+    """One lock-striped slice of the store.
+
+    Entries live in an OrderedDict kept in LRU order (oldest first) and a
+    min-heap of (expires_at, key) drives the expiry sweep.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> [value, expires_at]
+        self.expiry_heap = []
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+
+
+class SessionStore:
+    """Sharded in-memory session store with TTL expiry and LRU eviction"""
+
+    def __init__(self, ttl_seconds: float, max_sessions: int = SESSION_STORE_MAX_SESSIONS,
+                 num_shards: int = SESSION_STORE_SHARDS,
+                 sweep_interval: float = SESSION_STORE_SWEEP_INTERVAL):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.sweep_interval = sweep_interval
+        self._shards = [_Shard() for _ in range(num_shards)]
+        self._shard_capacity = max(1, max_sessions // num_shards)
+
+        self._sweeper = None
+        self._stop_event = threading.Event()
+
+    def _shard_for(self, key: str) -> _Shard:
+        return self._shards[zlib.crc32(key.encode()) % len(self._shards)]
+
+    def get(self, key: str, refresh: bool = True) -> Optional[Any]:
+        """Return the value for key, or None if missing or expired.
+
+        A hit moves the entry to the most-recently-used position and, when
+        refresh is set, slides its expiry forward by the TTL.
+        """
+        if not key:
+            return None
+
+        shard = self._shard_for(key)
+        now = time.monotonic()
+        with shard.lock:
+            entry = shard.entries.get(key)
+            if entry is None:
+                shard.misses += 1
+                return None
+
+            if entry[1] <= now:
+                del shard.entries[key]
+                shard.expired += 1
+                shard.misses += 1
+                return None
+
+            shard.entries.move_to_end(key)
+            if refresh:
+                # The heap entry is left alone; the sweeper re-queues it
+                # with the new deadline when it comes up
+                entry[1] = now + self.ttl_seconds
+            shard.hits += 1
+            return entry[0]
+
+    def put(self, key: str, value: Any):
+        """Insert or replace a value, evicting the LRU entry if the shard is full"""
+        shard = self._shard_for(key)
+        expires_at = time.monotonic() + self.ttl_seconds
+        with shard.lock:
+            entry = shard.entries.get(key)
+            if entry is not None:
+                entry[0] = value
+                entry[1] = expires_at
+                shard.entries.move_to_end(key)
+                return
+
+            while len(shard.entries) >= self._shard_capacity:
+                shard.entries.popitem(last=False)
+                shard.evicted += 1
+
+            shard.entries[key] = [value, expires_at]
+            heapq.heappush(shard.expiry_heap, (expires_at, key))
+
+            # Deleted and evicted keys leave stale heap entries behind;
+            # rebuild the heap once they dominate it
+            if len(shard.expiry_heap) > 2 * self._shard_capacity:
+                shard.expiry_heap = [(e[1], k)
+                                     for k, e in shard.entries.items()]
+                heapq.heapify(shard.expiry_heap)
+
+    def delete(self, key: str) -> bool:
+        """Remove a key, returning True if it was present"""
+        if not key:
+            return False
+        shard = self._shard_for(key)
+        with shard.lock:
+            return shard.entries.pop(key, None) is not None
+
+    def __contains__(self, key: str) -> bool:
+        if not key:
+            return False
+        shard = self._shard_for(key)
+        with shard.lock:
+            entry = shard.entries.get(key)
+            return entry is not None and entry[1] > time.monotonic()
+
+    def __len__(self) -> int:
+        return sum(len(shard.entries) for shard in self._shards)
+
+    def sweep(self) -> int:
+        """Drop every expired entry and return how many were removed"""
+        removed = 0
+        now = time.monotonic()
+        for shard in self._shards:
+            with shard.lock:
+                heap = shard.expiry_heap
+                while heap and heap[0][0] <= now:
+                    _, key = heapq.heappop(heap)
+                    entry = shard.entries.get(key)
+                    if entry is None:
+                        continue
+                    if entry[1] <= now:
+                        del shard.entries[key]
+                        shard.expired += 1
+                        removed += 1
+                    else:
+                        # Entry was refreshed since it was queued
+                        heapq.heappush(heap, (entry[1], key))
+        return removed
+
+    def _sweep_loop(self):
+        while not self._stop_event.wait(self.sweep_interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Error sweeping session store: {e}")
+
+    def start_sweeper(self):
+        """Start the background expiry thread (idempotent)"""
+        if self._sweeper and self._sweeper.is_alive():
+            return
+        self._stop_event.clear()
+        self._sweeper = threading.Thread(
+            target=self._sweep_loop, name="session-store-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def stop_sweeper(self):
+        self._stop_event.set()
+        if self._sweeper:
+            self._sweeper.join(timeout=self.sweep_interval)
+            self._sweeper = None
+
+    def stats(self) -> Dict[str, Any]:
+        hits = sum(shard.hits for shard in self._shards)
+        misses = sum(shard.misses for shard in self._shards)
+        lookups = hits + misses
+        return {
+            "backend": "memory",
+            "size": len(self),
+            "max_sessions": self.max_sessions,
+            "shards": len(self._shards),
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "expired": sum(shard.expired for shard in self._shards),
+            "evicted": sum(shard.evicted for shard in self._shards)
+        }
@@ -0,0 +1,246 @@
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# Shared state configuration. "memory" keeps everything in-process (single
+# uvicorn worker); "sqlite" shares sessions and the catalog between workers
+# on the same host through a WAL-mode SQLite file.
+SHARED_STATE_BACKEND = os.getenv("SHARED_STATE_BACKEND", "memory")
+SHARED_STATE_PATH = os.getenv(
+    "SHARED_STATE_PATH", "/tmp/gadgetgrove_state.db")
+
+# Enforce the session cap every N inserts rather than on every write
+_TRIM_EVERY = 256
+
+
+class _SQLiteState:
+    """Per-thread SQLite connections to one WAL database file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10,
+                                   isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=10000")
+            self._local.conn = conn
+        return conn
+
+
+class SQLiteSessionStore(_SQLiteState):
+    """Session store shared by every worker process on the host.
+
+    Mirrors the SessionStore interface. Values are serialized with the
+    dumps/loads callables; expiry uses wall-clock time so all processes
+    agree on it, and the cap is enforced by evicting least recently used rows.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float, max_sessions: int,
+                 dumps: Callable[[Any], str], loads: Callable[[str], Any],
+                 sweep_interval: float = 30):
+        super().__init__(path)
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.sweep_interval = sweep_interval
+        self._dumps = dumps
+        self._loads = loads
+
+        # Counters are per process; size is shared
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._expired = 0
+        self._evicted = 0
+        self._puts = 0
+
+        self._sweeper = None
+        self._stop_event = threading.Event()
+
+        self._connect().execute(
+            """CREATE TABLE IF NOT EXISTS sessions (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )""")
+        self._connect().execute(
+            "CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at)")
+        self._connect().execute(
+            "CREATE INDEX IF NOT EXISTS sessions_last_access ON sessions (last_access)")
+
+    def _count(self, counter: str, amount: int = 1):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def get(self, key: str, refresh: bool = True) -> Optional[Any]:
+        if not key:
+            return None
+
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute(
+            "SELECT value, expires_at FROM sessions WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self._count("_misses")
+            return None
+
+        if row[1] <= now:
+            conn.execute("DELETE FROM sessions WHERE key = ?", (key,))
+            self._count("_expired")
+            self._count("_misses")
+            return None
+
+        if refresh:
+            conn.execute(
+                "UPDATE sessions SET expires_at = ?, last_access = ? WHERE key = ?",
+                (now + self.ttl_seconds, now, key))
+        else:
+            conn.execute(
+                "UPDATE sessions SET last_access = ? WHERE key = ?", (now, key))
+        self._count("_hits")
+        return self._loads(row[0])
+
+    def put(self, key: str, value: Any):
+        now = time.time()
+        self._connect().execute(
+            """INSERT INTO sessions (key, value, expires_at, last_access)
+               VALUES (?, ?, ?, ?)
+               ON CONFLICT(key) DO UPDATE SET
+                   value = excluded.value,
+                   expires_at = excluded.expires_at,
+                   last_access = excluded.last_access""",
+            (key, self._dumps(value), now + self.ttl_seconds, now))
+
+        with self._lock:
+            self._puts += 1
+            trim = self._puts % _TRIM_EVERY == 0
+        if trim:
+            self._trim()
+
+    def delete(self, key: str) -> bool:
+        if not key:
+            return False
+        cursor = self._connect().execute(
+            "DELETE FROM sessions WHERE key = ?", (key,))
+        return cursor.rowcount > 0
+
+    def __contains__(self, key: str) -> bool:
+        if not key:
+            return False
+        row = self._connect().execute(
+            "SELECT 1 FROM sessions WHERE key = ? AND expires_at > ?",
+            (key, time.time())).fetchone()
+        return row is not None
+
+    def __len__(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def _trim(self) -> int:
+        """Evict least recently used rows above the cap"""
+        overflow = len(self) - self.max_sessions
+        if overflow <= 0:
+            return 0
+        cursor = self._connect().execute(
+            """DELETE FROM sessions WHERE key IN (
+                   SELECT key FROM sessions ORDER BY last_access LIMIT ?)""",
+            (overflow,))
+        self._count("_evicted", cursor.rowcount)
+        return cursor.rowcount
+
+    def sweep(self) -> int:
+        cursor = self._connect().execute(
+            "DELETE FROM sessions WHERE expires_at <= ?", (time.time(),))
+        self._count("_expired", cursor.rowcount)
+        self._trim()
+        return cursor.rowcount
+
+    def _sweep_loop(self):
+        while not self._stop_event.wait(self.sweep_interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Error sweeping shared session store: {e}")
+
+    def start_sweeper(self):
+        if self._sweeper and self._sweeper.is_alive():
+            return
+        self._stop_event.clear()
+        self._sweeper = threading.Thread(
+            target=self._sweep_loop, name="shared-session-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def stop_sweeper(self):
+        self._stop_event.set()
+        if self._sweeper:
+            self._sweeper.join(timeout=self.sweep_interval)
+            self._sweeper = None
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._hits + self._misses
+        return {
+            "backend": "sqlite",
+            "size": len(self),
+            "max_sessions": self.max_sessions,
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+            "expired": self._expired,
+            "evicted": self._evicted
+        }
+
+
+class SharedCatalog(_SQLiteState):
+    """Catalog version shared by every worker.
+
+    The catalog is generated deterministically from a seed, so workers only
+    need to agree on (version, seed). The first worker to ask picks the seed
+    inside a write transaction; a reload in any worker bumps the version and
+    the others regenerate on their next call.
+    """
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self._connect().execute(
+            """CREATE TABLE IF NOT EXISTS catalog_version (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                version INTEGER NOT NULL,
+                seed INTEGER NOT NULL
+            )""")
+
+    def current(self, reload: bool = False) -> Tuple[int, int]:
+        """Return the shared (version, seed), creating or bumping it as needed"""
+        conn = self._connect()
+
+        if not reload:
+            row = conn.execute(
+                "SELECT version, seed FROM catalog_version WHERE id = 1").fetchone()
+            if row is not None:
+                return row[0], row[1]
+
+        # Serialize seeding across workers so they all end up on one catalog
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT version, seed FROM catalog_version WHERE id = 1").fetchone()
+            if row is None or reload:
+                version = (row[0] + 1) if row else 1
+                seed = secrets.randbits(63)
+                conn.execute(
+                    "INSERT OR REPLACE INTO catalog_version (id, version, seed) VALUES (1, ?, ?)",
+                    (version, seed))
+            else:
+                version, seed = row
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        return version, seed
@@ -1,8 +1,14 @@
 #!/bin/bash
 set -e
 
-echo "Starting FastAPI (Uvicorn) on port 8000..."
-ddtrace-run uvicorn main:app --host 0.0.0.0 --port 8000 &
+# More than one worker needs sessions and the catalog in shared state
+WEB_WORKERS=${WEB_WORKERS:-1}
+if [ "$WEB_WORKERS" -gt 1 ]; then
+  export SHARED_STATE_BACKEND=${SHARED_STATE_BACKEND:-sqlite}
+fi
+
+echo "Starting FastAPI (Uvicorn) on port 8000 with $WEB_WORKERS worker(s)..."
+ddtrace-run uvicorn main:app --host 0.0.0.0 --port 8000 --workers "$WEB_WORKERS" &
 
 echo "Starting Dash dashboard on port 8050..."
 ddtrace-run python dashboard.py &
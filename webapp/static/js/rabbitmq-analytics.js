@@ -6,6 +6,11 @@ function rabbitMQPlugin(userConfig = {}) {
     // Initialize with defaults
     const config = {
         endpoint: '/api/analytics',
+        // Buffer events and send them to batchEndpoint in one request
+        batching: true,
+        batchEndpoint: '/api/analytics/batch',
+        maxBatchSize: 20,
+        flushInterval: 2000, // ms
         trackPageViews: true,
         trackClicks: false,
         trackFormSubmissions: false,
@@ -25,6 +30,15 @@ function rabbitMQPlugin(userConfig = {}) {
             if (config.debug) {
                 console.log('[RabbitMQ Analytics] Initialized with config:', config);
             }
+            if (config.batching) {
+                // Pages can go away at any time; send what is buffered first
+                document.addEventListener('visibilitychange', () => {
+                    if (document.visibilityState === 'hidden') {
+                        flushRabbitMQBuffer(config);
+                    }
+                });
+                window.addEventListener('pagehide', () => flushRabbitMQBuffer(config));
+            }
             return { config };
         },
 
@@ -90,6 +104,12 @@ function sendToRabbitMQ(eventData, config) {
         eventData.sessionId = sessionId;
     }
 
+    // Unique per event, so the consumer can drop copies of it that arrive
+    // more than once
+    if (!eventData.eventId) {
+        eventData.eventId = generateSessionId();
+    }
+
     // Add queue name if configured
     if (config.queueName) {
         eventData.queueName = config.queueName;
@@ -100,6 +120,11 @@ function sendToRabbitMQ(eventData, config) {
         console.log('[RabbitMQ Analytics] Sending event:', eventData);
     }
 
+    if (config.batching) {
+        bufferEvent(eventData, config);
+        return;
+    }
+
     // Send to server endpoint
     fetch(config.endpoint, {
         method: 'POST',
@@ -116,7 +141,70 @@ function sendToRabbitMQ(eventData, config) {
     });
 }
 
-// Helper to generate a unique session ID
+// Events waiting for the next batch flush
+const rabbitMQBuffer = [];
+let rabbitMQFlushTimer = null;
+
+// sendBeacon payloads are capped at 64KB by browsers
+const BEACON_MAX_BYTES = 60000;
+
+function bufferEvent(eventData, config) {
+    rabbitMQBuffer.push(eventData);
+
+    if (rabbitMQBuffer.length >= config.maxBatchSize) {
+        flushRabbitMQBuffer(config);
+    } else if (!rabbitMQFlushTimer) {
+        rabbitMQFlushTimer = setTimeout(() => flushRabbitMQBuffer(config), config.flushInterval);
+    }
+}
+
+// Send buffered events as NDJSON, one request per beacon-sized chunk
+function flushRabbitMQBuffer(config) {
+    if (rabbitMQFlushTimer) {
+        clearTimeout(rabbitMQFlushTimer);
+        rabbitMQFlushTimer = null;
+    }
+    if (rabbitMQBuffer.length === 0) return;
+
+    const events = rabbitMQBuffer.splice(0, rabbitMQBuffer.length);
+    let chunk = '';
+    for (const event of events) {
+        const line = JSON.stringify(event) + '\n';
+        if (chunk && chunk.length + line.length > BEACON_MAX_BYTES) {
+            sendBatch(chunk, config);
+            chunk = '';
+        }
+        chunk += line;
+    }
+    sendBatch(chunk, config);
+}
+
+function sendBatch(body, config) {
+    if (config.debug) {
+        console.log('[RabbitMQ Analytics] Sending batch:', body.split('\n').length - 1, 'events');
+    }
+
+    const blob = new Blob([body], { type: 'application/x-ndjson' });
+    if (navigator.sendBeacon && navigator.sendBeacon(config.batchEndpoint, blob)) {
+        return;
+    }
+
+    // Beacon unavailable or refused (e.g. over quota): fall back to fetch
+    fetch(config.batchEndpoint, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/x-ndjson'
+        },
+        body,
+        keepalive: body.length <= BEACON_MAX_BYTES
+    }).catch(error => {
+        if (config.debug) {
+            console.error('[RabbitMQ Analytics] Error sending batch:', error);
+        }
+    });
+}
+
+// Helper to generate a unique session (or event) ID
 function generateSessionId() {
     return 'xxxxxxxx-xxxx-4xxx-yxxx-xxxxxxxxxxxx'.replace(/[xy]/g, function (c) {
         const r = Math.random() * 16 | 0;